@@ -0,0 +1,57 @@
+from django.core.exceptions import ImproperlyConfigured
+
+# backends de cache que da pra escolher pela variavel de ambiente UNICROSSED_CACHE
+CACHES_DISPONIVEIS = ('locmem', 'arquivo', 'redis')
+# e de sessao, pela UNICROSSED_SESSOES
+SESSOES_DISPONIVEIS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+# quantas entradas o locmem e o arquivo guardam antes de comecar a tirar as mais antigas, e quanto tiram de uma vez (1/10)
+MAX_ENTRADAS = 20000
+FRACAO_DESCARTE = 10
+
+
+def configurar_cache(tipo, local=None, redis_url=None, timeout=300):
+    """Monta o CACHES['default'] do tipo escolhido.
+
+    locmem: memoria de cada processo (so serve com um processo, ou pra dados que podem divergir entre processos).
+    arquivo: diretorio local compartilhado pelos processos da mesma maquina, sem precisar de servidor.
+    redis: servidor Redis (ou compativel), compartilhado entre maquinas.
+    """
+    if tipo == 'locmem':
+        return {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': local or 'unicrossed',
+            'TIMEOUT': timeout,
+            'OPTIONS': {'MAX_ENTRIES': MAX_ENTRADAS, 'CULL_FREQUENCY': FRACAO_DESCARTE},
+        }
+    if tipo == 'arquivo':
+        if not local:
+            raise ImproperlyConfigured('O cache em arquivo precisa de um diretório (UNICROSSED_CACHE_LOCAL).')
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(local),
+            'TIMEOUT': timeout,
+            'OPTIONS': {'MAX_ENTRIES': MAX_ENTRADAS, 'CULL_FREQUENCY': FRACAO_DESCARTE},
+        }
+    if tipo == 'redis':
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url or 'redis://127.0.0.1:6379/1',
+            'TIMEOUT': timeout,
+            'KEY_PREFIX': 'unicrossed',
+        }
+    raise ImproperlyConfigured(f'UNICROSSED_CACHE inválido: {tipo!r} (use {", ".join(CACHES_DISPONIVEIS)}).')
+
+
+def motor_sessao(tipo, tipo_cache):
+    """SESSION_ENGINE do tipo escolhido. Sem tipo, usa cached_db se o cache é compartilhado entre processos e db se nao"""
+    if not tipo:
+        # com locmem cada processo teria a sua copia da sessao (logout num processo nao valeria no outro)
+        tipo = 'db' if tipo_cache == 'locmem' else 'cached_db'
+    if tipo not in SESSOES_DISPONIVEIS:
+        raise ImproperlyConfigured(f'UNICROSSED_SESSOES inválido: {tipo!r} (use {", ".join(SESSOES_DISPONIVEIS)}).')
+    return SESSOES_DISPONIVEIS[tipo]
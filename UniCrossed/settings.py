@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from UniCrossed.cache_sessoes import configurar_cache, motor_sessao
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-1u4=1&w8gh5k7qz(-pie6fgv3l16=4n(jph2il$f2kb@-kddfv'
@@ -43,7 +45,10 @@ LOGIN_REDIRECT_URL = '/'
 ACCOUNT_LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 MIDDLEWARE = [
+    # primeiro da lista pra contar tambem as consultas dos outros middlewares (sessao, usuario, OTP)
+    'accounts.middleware.PerfiladorConsultasMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'accounts.middleware.FixarPrimarioMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,6 +62,10 @@ MIDDLEWARE = [
 INSTALLED_APPS += ['django_otp.plugins.otp_email']
 
 ROOT_URLCONF = 'UniCrossed.urls'
+# views async (accounts/views_async.py) no lugar das sync pro feed, swipes, linkeds e configuracoes. So faz sentido
+# rodando em ASGI (no WSGI cada view async ganha um event loop por request). Fica desligado por padrao: com o SQLite
+# local cada consulta do ORM async ainda pula pra uma thread e o benchmark_async mede as async mais lentas que as sync
+VIEWS_ASSINCRONAS = os.environ.get('UNICROSSED_VIEWS_ASYNC', '0') == '1'
 
 TEMPLATES = [
     {
@@ -76,13 +85,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'UniCrossed.wsgi.application'
 
+# SQLite em modo desempenho (ver accounts/management/commands/estresse_sqlite.py):
+#   - timeout: quanto tempo (s) uma conexao espera a trava de escrita antes de dar "database is locked"
+#   - transaction_mode IMMEDIATE: o atomic ja pega a trava de escrita no BEGIN. Com o DEFERRED padrao, uma transacao que
+#     leu e depois tenta escrever enquanto outra escreve falha na hora, sem esperar o timeout
+#   - os PRAGMAs rodam em toda conexao nova (init_command)
+#   - CONN_MAX_AGE: cada thread reaproveita a conexao entre requests em vez de abrir uma por request
+SQLITE_TIMEOUT = float(os.environ.get('UNICROSSED_SQLITE_TIMEOUT', 20))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # leitores nao bloqueiam o escritor e o escritor nao bloqueia os leitores
+    'synchronous': 'NORMAL',  # com WAL so fsync no checkpoint. queda de energia perde as ultimas transacoes, mas nao corrompe
+    'mmap_size': 134217728,  # ate 128 MB do arquivo lidos por mmap
+    'busy_timeout': int(SQLITE_TIMEOUT * 1000),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': SQLITE_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': '; '.join(f'PRAGMA {nome}={valor}' for nome, valor in SQLITE_PRAGMAS.items()),
+        },
+        'CONN_MAX_AGE': int(os.environ.get('UNICROSSED_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Replicas de leitura (ver accounts/roteador.py): caminhos (ou nomes) dos bancos replicados, separados por virgula em
+# UNICROSSED_REPLICAS. As leituras vao pra uma delas, as escritas pro default, e quem escreveu le do default por
+# REPLICAS_JANELA_PRIMARIO segundos. A replicacao em si (litestream, copia do arquivo etc) fica fora do Django
+REPLICAS_BANCO = []
+for numero, nome in enumerate(filter(None, os.environ.get('UNICROSSED_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{numero}'] = {**DATABASES['default'], 'NAME': nome.strip(), 'TEST': {'MIRROR': 'default'}}
+    REPLICAS_BANCO.append(f'replica{numero}')
+REPLICAS_JANELA_PRIMARIO = 5
+DATABASE_ROUTERS = ['accounts.roteador.RoteadorReplicas']
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',},
@@ -107,3 +148,83 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache e sessoes (ver UniCrossed/cache_sessoes.py), escolhidos por variavel de ambiente:
+#   UNICROSSED_CACHE = locmem (padrao) | arquivo | redis
+#   UNICROSSED_CACHE_LOCAL = diretorio do cache em arquivo (ou nome do locmem)
+#   UNICROSSED_REDIS_URL = url do servidor redis
+#   UNICROSSED_SESSOES = db | cached_db | cookies (padrao: cached_db com cache compartilhado, db com locmem)
+# Com cached_db ou cookies a leitura da sessao nao vai no SQLite a cada request, so a gravacao (e com cookies nem ela)
+CACHE_TIPO = os.environ.get('UNICROSSED_CACHE', 'locmem')
+CACHES = {
+    'default': configurar_cache(
+        CACHE_TIPO,
+        local=os.environ.get('UNICROSSED_CACHE_LOCAL') or (BASE_DIR / 'cache' if CACHE_TIPO == 'arquivo' else None),
+        redis_url=os.environ.get('UNICROSSED_REDIS_URL')),
+}
+SESSION_ENGINE = motor_sessao(os.environ.get('UNICROSSED_SESSOES'), CACHE_TIPO)
+
+# hub das notificacoes em tempo real (accounts/notificacoes.py): 'local' (so um processo) ou 'redis' (pub/sub no
+# UNICROSSED_REDIS_URL, pra varios processos)
+NOTIFICACOES_HUB = os.environ.get('UNICROSSED_NOTIFICACOES', 'local')
+NOTIFICACOES_REDIS_URL = os.environ.get('UNICROSSED_REDIS_URL')
+# o stream SSE fica aberto segurando quem atende: no ASGI é uma corrotina parada, no WSGI uma thread do servidor. Por
+# isso no WSGI ele so liga com UNICROSSED_STREAM_WSGI=1 (servidor com threads sobrando), senao as paginas fazem polling
+# do /api/linkeds/?since= a cada NOTIFICACOES_INTERVALO_POLLING segundos
+NOTIFICACOES_STREAM_WSGI = os.environ.get('UNICROSSED_STREAM_WSGI', '0') == '1'
+NOTIFICACOES_INTERVALO_POLLING = 30
+
+# Fila de tarefas em segundo plano (ver accounts/tarefas.py, worker: python manage.py processar_tarefas): tentativas
+# por tarefa, backoff entre elas (base dobrando ate o maximo, em segundos), de quanto em quanto tempo o worker renova o
+# lease das tarefas que ta executando e depois de quanto tempo sem renovar (worker que morreu) ela volta pra fila. As
+# prioritarias (SMS do 2FA) tem um laco proprio no worker, que olha a fila a cada TAREFAS_INTERVALO_PRIORITARIAS segundos
+TAREFAS_MAX_TENTATIVAS = 5
+TAREFAS_BACKOFF_BASE = 10
+TAREFAS_BACKOFF_MAXIMO = 3600
+TAREFAS_INTERVALO_RENOVACAO = 30
+TAREFAS_TEMPO_LIMITE = 120
+TAREFAS_INTERVALO_PRIORITARIAS = 0.2
+
+# segundos que o codigo do 2FA enviado por SMS vale (depois disso o SMS nem sai e o codigo nao confirma mais)
+SMS_VALIDADE_CODIGO = 300
+
+# Exportacao dos dados do usuario (ver accounts/exportacao.py): linhas lidas do banco por vez em cada lista, pasta dos
+# arquivos gerados em segundo plano (privada, fora do MEDIA_ROOT) e horas que eles esperam o download antes de apagar
+EXPORTACAO_TAMANHO_LOTE = 500
+EXPORTACOES_DIR = os.environ.get('UNICROSSED_EXPORTACOES_DIR') or BASE_DIR / 'exportacoes'
+EXPORTACAO_VALIDADE = 24
+
+# Miniaturas das fotos (ver accounts/imagens.py): formatos gerados (o primeiro é o que as APIs mandam, 'avif' precisa do
+# Pillow com libavif) e qualidade da compressao
+IMAGENS_FORMATOS = ['webp']
+IMAGENS_QUALIDADE = 80
+
+# Presenca (ver accounts/presenca.py): segundos sem heartbeat ate o usuario aparecer offline nos grupos
+PRESENCA_TTL = 90
+
+# Cartoes de perfil (ver accounts/cartoes.py): segundos que cada cartao fica no cache, e os de quem tem foto sem as
+# miniaturas ainda (a invalidacao do worker nao chega no cache locmem dos processos web)
+CARTOES_TTL = 600
+CARTOES_TTL_SEM_VARIANTES = 30
+
+# Feed: tamanho do lote da fila de candidatos de cada usuario e quando ela é recarregada
+FEED_TAMANHO_LOTE = 50
+FEED_LIMIAR_RECARGA = 10
+FEED_RECARGA_EM_SEGUNDO_PLANO = True
+
+# Ranking de compatibilidade do feed (ver accounts/compatibilidade.py): candidatos pontuados por bloco e pesos de cada
+# coisa em comum (sobrescreve so as chaves informadas)
+FEED_BLOCO_PONTUACAO = 5000
+FEED_PESOS_COMPATIBILIDADE = {}
+
+# Filtro por distancia do feed (ver accounts/geo.py): tamanho em graus da celula da grade usada como indice espacial e se
+# perfis sem coordenadas (cidade fora do gazetteer de municipios) continuam aparecendo pra quem tem
+GEO_TAMANHO_CELULA = 0.5
+FEED_INCLUIR_SEM_LOCALIZACAO = True
+
+# Perfilador de consultas: conta as consultas de cada request, manda no header Server-Timing e guarda um relatorio
+# em memoria (ver /api/relatorio-consultas/, so pra staff). Desligado ele nem entra na cadeia de middlewares. Liga com
+# UNICROSSED_PERFILADOR=1 (mesmo com DEBUG ele fica desligado por padrao)
+PERFILADOR_CONSULTAS = os.environ.get('UNICROSSED_PERFILADOR', '0') == '1'
+PERFILADOR_CONSULTAS_HISTORICO = 200
+PERFILADOR_CONSULTAS_LIMITE_DUPLICADAS = 2
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin
+from accounts.texto import normalizar
 from accounts.models import (
-    CustomUser, Habilidades, PreferenciasEstudo, Like, Superlike, 
+    CustomUser, Habilidades, PreferenciasEstudo, Interacao, Like, Superlike, 
     Dislike, Linkeds, GrupoDeEstudos, MembroGrupoEstudos, 
-    ConfiguracoesUsuario, AparelhoSMS, FotosUsuario, RelatorioProblema
+    ConfiguracoesUsuario, AparelhoSMS, FotosUsuario, RelatorioProblema,
+    FilaCandidatos, Conexao, Universidade, Curso, Municipio, Tarefa
 )
 
 # Custom User Admin
@@ -57,6 +60,13 @@ class PreferenciasEstudoAdmin(admin.ModelAdmin):
     get_metodos_display.short_description = 'Métodos Preferidos'
 
 # Interações Admin
+@admin.register(Interacao)
+class InteracaoAdmin(admin.ModelAdmin):
+    list_display = ('de_usuario', 'para_usuario', 'tipo', 'data_realizacao')
+    list_filter = ('tipo', 'data_realizacao')
+    search_fields = ('de_usuario__username', 'para_usuario__username', 'mensagem')
+    date_hierarchy = 'data_realizacao'
+
 @admin.register(Like)
 class LikeAdmin(admin.ModelAdmin):
     list_display = ('de_usuario', 'para_usuario', 'data_realizacao')
@@ -170,6 +180,54 @@ class RelatorioProblemaAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
 
+# Fila de candidatos do feed Admin
+@admin.register(FilaCandidatos)
+class FilaCandidatosAdmin(admin.ModelAdmin):
+    list_display = ('user', 'posicao', 'esgotada', 'data_atualizacao')
+    list_filter = ('esgotada',)
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('data_atualizacao',)
+
+# Conexoes (adjacencia dos linkeds) Admin, so leitura porque quem grava é o proprio Linkeds
+@admin.register(Conexao)
+class ConexaoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'conectado', 'data_realizacao')
+    search_fields = ('usuario__username', 'conectado__username')
+    readonly_fields = ('usuario', 'conectado', 'link', 'data_realizacao')
+
+    def has_add_permission(self, request):
+        return False
+
+# Catalogo de universidades Admin
+@admin.register(Universidade)
+class UniversidadeAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'sigla', 'cidade', 'estado', 'codigo')
+    list_filter = ('estado',)
+    search_fields = ('nome', 'sigla', 'cidade', 'codigo')
+
+# Catalogo de cursos Admin
+@admin.register(Curso)
+class CursoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'nome_normalizado')
+    search_fields = ('nome', 'nome_normalizado')
+    readonly_fields = ('nome_normalizado',)
+
+    def save_model(self, request, obj, form, change):
+        obj.nome_normalizado = Curso.normalizar_nome(obj.nome)
+        super().save_model(request, obj, form, change)
+
+# Gazetteer de municipios Admin
+@admin.register(Municipio)
+class MunicipioAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'uf', 'codigo', 'latitude', 'longitude')
+    list_filter = ('uf',)
+    search_fields = ('nome', 'codigo')
+    readonly_fields = ('nome_normalizado',)
+
+    def save_model(self, request, obj, form, change):
+        obj.nome_normalizado = normalizar(obj.nome).strip()
+        super().save_model(request, obj, form, change)
+
 # Register the models
 admin.site.register(CustomUser, CustomUserAdmin)
 
@@ -177,3 +235,17 @@ admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.site_header = "UniCrossed - Administração"
 admin.site.site_title = "UniCrossed Admin"
 admin.site.index_title = "Bem-vindo ao painel de administração do UniCrossed"
+
+# Fila de tarefas em segundo plano Admin. A acao recoloca na fila as que desistiram
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'funcao', 'status', 'tentativas', 'executar_em', 'usuario', 'data_atualizacao')
+    list_filter = ('status', 'funcao')
+    search_fields = ('funcao', 'usuario__username')
+    readonly_fields = ('data_criacao', 'data_atualizacao', 'iniciada_em', 'renovada_em', 'resultado', 'erro')
+    actions = ['reenfileirar']
+
+    @admin.action(description='Executar de novo')
+    def reenfileirar(self, request, queryset):
+        queryset.exclude(status=Tarefa.EXECUTANDO).update(
+            status=Tarefa.PENDENTE, tentativas=0, executar_em=timezone.now())
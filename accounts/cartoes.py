@@ -0,0 +1,163 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import imagens
+from .models import CustomUser
+
+# sobe quando o formato do cartao muda, assim os cartoes antigos que ainda tao no cache sao ignorados
+VERSAO_CARTAO = 2
+# quanto tempo um cartao fica no cache. os signals apagam o cartao quando o perfil muda, o TTL so cobre os updates em massa
+TTL_CARTAO = getattr(settings, 'CARTOES_TTL', 600)
+# cartao com foto que ainda nao tem as miniaturas: quem gera as variantes é o worker (outro processo), e o invalidar dele
+# nao chega no cache local (locmem) de cada processo web. Com o TTL curto o cartao se acerta sozinho quando elas saem
+TTL_CARTAO_PROVISORIO = getattr(settings, 'CARTOES_TTL_SEM_VARIANTES', 30)
+
+# foto que linkeds e grupos mostram pra quem nao tem foto de perfil
+FOTO_PADRAO = 'https://randomuser.me/api/portraits/men/32.jpg'
+
+CAMPOS_CARTAO = [
+    'id', 'username', 'first_name', 'last_name', 'cidade', 'estado', 'bio', 'curso', 'semestre', 'universidade_nome',
+    'habilidade_ids', 'is_staff', 'foto_principal']
+
+
+def chave_cartao(usuario_id):
+    return f'perfil:cartao:v{VERSAO_CARTAO}:{usuario_id}'
+
+
+def chave_perfil_completo(usuario_id):
+    return f'perfil:completo:v{VERSAO_CARTAO}:{usuario_id}'
+
+
+def chave_versao(usuario_id):
+    return f'perfil:versao:{usuario_id}'
+
+
+def montar_cartao(usuario):
+    """Dados publicos do perfil que os cards (feed, linkeds, grupos) usam, do jeito que tao no banco"""
+    foto = usuario.get_foto_perfil()
+    return {
+        'id': usuario.id,
+        'username': usuario.username,
+        'first_name': usuario.first_name,
+        'last_name': usuario.last_name,
+        'cidade': usuario.cidade,
+        'estado': usuario.estado,
+        'bio': usuario.bio,
+        'curso': usuario.curso,
+        'semestre': usuario.semestre,
+        'universidade_nome': usuario.universidade_nome,
+        'habilidades': usuario.nomes_habilidades(),
+        'foto': foto.imagem.url if foto else None,
+        'fotos': imagens.urls_variantes(foto) if foto else {},  # miniaturas, ver imagens.foto_para
+        'staff': usuario.is_staff,
+    }
+
+
+def provisorio(cartao):
+    return bool(cartao['foto']) and not cartao['fotos'] and bool(imagens.FORMATOS)
+
+
+def obter_cartoes(ids):
+    """Cartoes dos usuarios na ordem dos ids: um get_many no cache e uma consulta so pros que faltaram"""
+    ids = list(ids)
+    if not ids:
+        return []
+
+    em_cache = cache.get_many([chave_cartao(i) for i in ids])
+    cartoes = {cartao['id']: cartao for cartao in em_cache.values()}
+
+    faltando = [i for i in ids if i not in cartoes]
+    if faltando:
+        cartoes.update(_montar_e_guardar(faltando))
+
+    # usuario apagado nao volta
+    return [cartoes[i] for i in ids if i in cartoes]
+
+
+def _montar_e_guardar(ids):
+    # uma consulta so pros cartoes que nao tavam no cache, que ja voltam pro cache
+    novos = {}
+    for usuario in CustomUser.objects.com_foto_principal().filter(id__in=ids).only(*CAMPOS_CARTAO):
+        novos[usuario.id] = montar_cartao(usuario)
+    provisorios = [usuario_id for usuario_id, cartao in novos.items() if provisorio(cartao)]
+    cache.set_many(
+        {chave_cartao(usuario_id): cartao for usuario_id, cartao in novos.items() if usuario_id not in provisorios},
+        TTL_CARTAO)
+    if provisorios:
+        cache.set_many({chave_cartao(usuario_id): novos[usuario_id] for usuario_id in provisorios}, TTL_CARTAO_PROVISORIO)
+        # a versao (ETag do api_linkeds) vence junto, senao o 304 continuaria mandando a foto sem as miniaturas
+        cache.set_many({chave_versao(usuario_id): uuid.uuid4().hex for usuario_id in provisorios}, TTL_CARTAO_PROVISORIO)
+    return novos
+
+
+async def aobter_cartoes(ids):
+    """Versao async do obter_cartoes (views_async.py): o get_many pela API async do cache e a montagem dos que faltaram
+    (consulta + indice de habilidades) numa thread"""
+    ids = list(ids)
+    if not ids:
+        return []
+
+    em_cache = await cache.aget_many([chave_cartao(i) for i in ids])
+    cartoes = {cartao['id']: cartao for cartao in em_cache.values()}
+
+    faltando = [i for i in ids if i not in cartoes]
+    if faltando:
+        cartoes.update(await sync_to_async(_montar_e_guardar)(faltando))
+
+    return [cartoes[i] for i in ids if i in cartoes]
+
+
+def obter_cartao(usuario_id):
+    cartoes = obter_cartoes([usuario_id])
+    return cartoes[0] if cartoes else None
+
+
+async def aobter_cartao(usuario_id):
+    cartoes = await aobter_cartoes([usuario_id])
+    return cartoes[0] if cartoes else None
+
+
+def _versoes(ids, guardadas):
+    # versao que nao ta no cache (nunca lida, expirou ou foi apagada pelo invalidar) ganha um valor novo
+    novas = {chave_versao(i): uuid.uuid4().hex for i in ids if chave_versao(i) not in guardadas}
+    return [guardadas.get(chave_versao(i)) or novas[chave_versao(i)] for i in ids], novas
+
+
+def versoes(ids):
+    """Versao atual do cartao de cada usuario, na ordem dos ids. Muda a cada invalidar, entao entra no ETag de quem
+    responde com cartoes (api_linkeds) sem precisar montar a resposta"""
+    ids = list(ids)
+    atuais, novas = _versoes(ids, cache.get_many([chave_versao(i) for i in ids]))
+    if novas:
+        cache.set_many(novas, None)
+    return atuais
+
+
+async def aversoes(ids):
+    ids = list(ids)
+    atuais, novas = _versoes(ids, await cache.aget_many([chave_versao(i) for i in ids]))
+    if novas:
+        await cache.aset_many(novas, None)
+    return atuais
+
+
+def obter_perfil_completo(usuario, montar):
+    # perfil do proprio usuario (api_perfil_usuario), montado pela view so quando nao ta no cache
+    chave = chave_perfil_completo(usuario.id)
+    perfil = cache.get(chave)
+    if perfil is None:
+        perfil = montar(usuario)
+        cache.set(chave, perfil, TTL_CARTAO)
+    return perfil
+
+
+def invalidar(usuario_ids):
+    chaves = []
+    for usuario_id in usuario_ids:
+        chaves += [chave_cartao(usuario_id), chave_perfil_completo(usuario_id), chave_versao(usuario_id)]
+    if chaves:
+        cache.delete_many(chaves)
+
@@ -0,0 +1,278 @@
+import heapq
+from itertools import repeat
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BigIntegerField, ExpressionWrapper, Value
+from django.db.models.functions import Coalesce
+
+from .models import CustomUser, PreferenciasEstudo, ConfiguracoesUsuario
+from .texto import normalizar
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy o ranking cai no calculo em python puro (mesmo resultado, so mais lento)
+    np = None
+
+# cada usuario vira um inteiro de preferencias (as mascaras de dias, horarios e metodos do PreferenciasEstudo em faixas de
+# bits fixas) e um bitset de habilidades
+DESLOCAMENTO_DIAS = 0
+DESLOCAMENTO_HORARIOS = 8
+DESLOCAMENTO_METODOS = 12
+MASCARA_DIAS = ((1 << len(PreferenciasEstudo.DIAS_DISPONIVEIS)) - 1) << DESLOCAMENTO_DIAS
+MASCARA_HORARIOS = ((1 << len(PreferenciasEstudo.HORARIOS_DISPONIVEIS)) - 1) << DESLOCAMENTO_HORARIOS
+MASCARA_METODOS = ((1 << len(PreferenciasEstudo.METODOS_PREFERIDOS)) - 1) << DESLOCAMENTO_METODOS
+
+# a habilidade de id X liga o bit X, sem colisao entre habilidades. O bitset fica gravado em CustomUser.bits_habilidades
+# com so as palavras de 64 bits que precisa (cresce junto com o maior id que o usuario tem), entao cada usuario tem um
+# tamanho e habilidade nova nao exige regravar a coluna de ninguem
+
+# quantos candidatos sao carregados e pontuados por vez
+TAMANHO_BLOCO = getattr(settings, 'FEED_BLOCO_PONTUACAO', 5000)
+
+# peso de cada coisa em comum
+PESOS = {
+    'dia': 2,
+    'horario': 3,
+    'metodo': 2,
+    'habilidade': 4,
+    'universidade': 5,
+    'curso': 4,
+    'cidade': 3,
+    'estado': 1,
+    'fora_do_alcance': -4,
+    **getattr(settings, 'FEED_PESOS_COMPATIBILIDADE', {}),
+}
+
+# com distancia maxima menor que isso, perfil de outro estado perde pontos. so vale pra quem nao tem coordenadas, quem tem
+# ja chega aqui filtrado pelo raio (feed.candidatos_elegiveis)
+DISTANCIA_OUTRO_ESTADO = getattr(settings, 'FEED_DISTANCIA_OUTRO_ESTADO', 300)
+
+
+def expressao_preferencias():
+    # o inteiro de preferencias calculado no proprio SELECT (quem nao tem PreferenciasEstudo vem com None do LEFT JOIN e
+    # conta como 0). As faixas de bits nao se sobrepoem, entao somar os deslocados é igual ao OR
+    return ExpressionWrapper(
+        Coalesce('preferencias_estudo__dia_semana_bits', 0) * Value(1 << DESLOCAMENTO_DIAS)
+        + Coalesce('preferencias_estudo__horario_bits', 0) * Value(1 << DESLOCAMENTO_HORARIOS)
+        + Coalesce('preferencias_estudo__metodo_preferido_bits', 0) * Value(1 << DESLOCAMENTO_METODOS),
+        output_field=BigIntegerField())
+
+
+def codificar_habilidades(habilidade_ids):
+    bits = 0
+    for habilidade_id in habilidade_ids:
+        bits |= 1 << habilidade_id
+    return bits
+
+
+def bytes_habilidades(habilidade_ids):
+    """Valor de CustomUser.bits_habilidades: o bitset em little-endian, em palavras inteiras de 64 bits (vazio pra quem
+    nao tem habilidade)"""
+    bits = codificar_habilidades(habilidade_ids)
+    return bits.to_bytes(-(-bits.bit_length() // 64) * 8, 'little')
+
+
+def _texto_informado(texto):
+    texto = normalizar(texto).strip()
+    return '' if texto in ('', 'nao informado') else texto
+
+
+class CodigosTexto(dict):
+    """Universidade, cidade e estado viram codigos inteiros (0 = nao informado), iguais pra todos os blocos do ranking.
+    Chave: o texto como ta no banco. Cada texto diferente é normalizado uma vez so, no __missing__"""
+
+    def __init__(self):
+        super().__init__()
+        self.normalizados = {}
+
+    def __missing__(self, texto):
+        normalizado = _texto_informado(texto)
+        codigo = self.normalizados.setdefault(normalizado, len(self.normalizados) + 1) if normalizado else 0
+        self[texto] = codigo
+        return codigo
+
+
+class BlocoPerfis:
+    """Colunas de um bloco de candidatos como vieram do banco (mesma posicao = mesmo usuario).
+
+    Preferencias e habilidades ja vem codificadas (expressao_preferencias e CustomUser.bits_habilidades). Universidade,
+    cidade e estado sao texto e viram codigo na hora de pontuar, usando o dict `codigos` do ranking.
+    """
+
+    def __init__(self, linhas, codigos):
+        (self.ids, self.preferencias, self.bits_habilidades, self.universidades, self.cursos, self.cidades,
+         self.estados) = zip(*linhas)
+        self.codigos = codigos
+
+    def __len__(self):
+        return len(self.ids)
+
+    def como_listas(self):
+        # versao em python puro (sem numpy), um candidato por vez
+        estados = [self.codigos[estado] for estado in self.estados]
+        return {
+            'ids': list(self.ids),
+            'preferencias': list(self.preferencias),
+            'habilidades': [int.from_bytes(bits, 'little') for bits in self.bits_habilidades],
+            'universidades': [self.codigos[universidade] for universidade in self.universidades],
+            'cursos': list(self.cursos),
+            'cidades': [
+                (self.codigos[cidade] << 32) + estado if self.codigos[cidade] else 0
+                for cidade, estado in zip(self.cidades, estados)],
+            'estados': estados,
+        }
+
+    def _codigos_de(self, textos):
+        # o map com o __getitem__ do dict roda em C, so texto novo passa pelo python (CodigosTexto.__missing__)
+        return np.fromiter(map(self.codigos.__getitem__, textos), dtype=np.int64, count=len(self))
+
+    def como_arrays(self, largura=None):
+        # colunas do bloco em arrays do numpy, sem loop em python por candidato. o bitset de habilidades vira uma matriz
+        # (n, palavras) com `largura` bytes por linha (None: a do maior bitset do bloco, pro alvo). Os bytes alem da
+        # largura do alvo nao cruzam com nada e sao cortados, os bitsets menores sao completados com zero
+        bits = list(map(bytes, self.bits_habilidades))
+        if largura is None:
+            largura = max(map(len, bits))
+        if largura:
+            cortados = map(bytes.__getitem__, bits, repeat(slice(largura)))
+            ajustados = map(bytes.ljust, cortados, repeat(largura), repeat(b'\0'))
+            habilidades = np.frombuffer(b''.join(ajustados), dtype='<u8').reshape(len(self), largura // 8)
+        else:
+            habilidades = np.zeros((len(self), 0), dtype=np.uint64)
+
+        estados = self._codigos_de(self.estados)
+        cidades = self._codigos_de(self.cidades)
+        return {
+            'ids': np.array(self.ids, dtype=np.uint64),
+            'preferencias': np.array(self.preferencias, dtype=np.uint64),
+            'habilidades': habilidades,
+            'universidades': self._codigos_de(self.universidades),
+            'cursos': np.array(self.cursos, dtype=np.int64),
+            # a mesma cidade em estados diferentes é outra cidade
+            'cidades': np.where(cidades != 0, (cidades << 32) + estados, 0),
+            'estados': estados,
+        }
+
+
+def carregar_perfis(candidatos, codigos):
+    """Carrega os candidatos em blocos de TAMANHO_BLOCO (por faixa de id), com preferencias e habilidades ja codificadas.
+    codigos: o CodigosTexto do ranking"""
+    ultimo_id = 0
+    while True:
+        consulta = candidatos.filter(id__gt=ultimo_id).order_by('id').values_list(
+            'id', expressao_preferencias(), 'bits_habilidades', 'universidade', Coalesce('curso_canonico_id', 0),
+            'cidade', 'estado')[:TAMANHO_BLOCO]
+        # linhas cruas do cursor: o values_list passaria cada linha pelos conversores do ORM (um int() por expressao),
+        # que custa mais que a pontuacao do bloco inteiro. todas as colunas ja vem do banco no tipo certo
+        sql, parametros = consulta.query.sql_with_params()
+        with connections[consulta.db].cursor() as cursor:
+            cursor.execute(sql, parametros)
+            linhas = cursor.fetchall()
+        if not linhas:
+            return
+
+        yield BlocoPerfis(linhas, codigos)
+        ultimo_id = linhas[-1][0]
+
+
+def _desempate(usuario_id, candidato_id):
+    # permutacao fixa por usuario: empates nao caem sempre nos mesmos perfis (os ids mais antigos) pra todo mundo
+    return ((candidato_id * 2654435761 + usuario_id * 40503) & 0xffffffff) / 2 ** 32
+
+
+def _pontuar_python(alvo, penalizar_outro_estado, bloco, usuario_id):
+    # alvo e bloco vem de como_listas()
+    pontos = []
+    for i, candidato_id in enumerate(bloco['ids']):
+        comum = bloco['preferencias'][i] & alvo['preferencias'][0]
+        total = (
+            PESOS['dia'] * (comum & MASCARA_DIAS).bit_count()
+            + PESOS['horario'] * (comum & MASCARA_HORARIOS).bit_count()
+            + PESOS['metodo'] * (comum & MASCARA_METODOS).bit_count()
+            + PESOS['habilidade'] * (bloco['habilidades'][i] & alvo['habilidades'][0]).bit_count())
+        for campo, peso in (('universidades', 'universidade'), ('cursos', 'curso'), ('cidades', 'cidade')):
+            if alvo[campo][0] and bloco[campo][i] == alvo[campo][0]:
+                total += PESOS[peso]
+        if alvo['estados'][0]:
+            if bloco['estados'][i] == alvo['estados'][0]:
+                total += PESOS['estado']
+            elif penalizar_outro_estado and bloco['estados'][i]:
+                total += PESOS['fora_do_alcance']
+        pontos.append((total + _desempate(usuario_id, candidato_id), candidato_id))
+    return pontos
+
+
+if np is not None:
+    _TABELA_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(valores):
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(valores)
+        valores = np.ascontiguousarray(valores)
+        return _TABELA_POPCOUNT[valores.view(np.uint8)].reshape(valores.shape + (8,)).sum(axis=-1)
+
+    def _pontuar_numpy(alvo, penalizar_outro_estado, bloco, usuario_id):
+        # alvo e bloco vem de como_arrays(). tudo aqui é operacao sobre o bloco inteiro, sem loop por candidato
+        preferencias = bloco['preferencias'] & alvo['preferencias'][0]
+        habilidades = bloco['habilidades'] & alvo['habilidades'][0]
+
+        total = (
+            PESOS['dia'] * _popcount(preferencias & np.uint64(MASCARA_DIAS)).astype(np.int64)
+            + PESOS['horario'] * _popcount(preferencias & np.uint64(MASCARA_HORARIOS)).astype(np.int64)
+            + PESOS['metodo'] * _popcount(preferencias & np.uint64(MASCARA_METODOS)).astype(np.int64)
+            + PESOS['habilidade'] * _popcount(habilidades).astype(np.int64).sum(axis=1))
+
+        for campo, peso in (('universidades', 'universidade'), ('cursos', 'curso'), ('cidades', 'cidade')):
+            if alvo[campo][0]:
+                total += PESOS[peso] * (bloco[campo] == alvo[campo][0])
+
+        if alvo['estados'][0]:
+            estados = bloco['estados']
+            total += PESOS['estado'] * (estados == alvo['estados'][0])
+            if penalizar_outro_estado:
+                total += PESOS['fora_do_alcance'] * ((estados != alvo['estados'][0]) & (estados != 0))
+
+        ids = bloco['ids']
+        desempate = ((ids * np.uint64(2654435761) + np.uint64(usuario_id * 40503)) & np.uint64(0xffffffff)) / 2 ** 32
+        return total + desempate
+
+    def _top_k(pontos, ids, k):
+        if len(ids) > k:
+            escolhidos = np.argpartition(-pontos, k - 1)[:k]
+            pontos, ids = pontos[escolhidos], ids[escolhidos]
+        ordem = np.argsort(-pontos, kind='stable')
+        return pontos[ordem], ids[ordem]
+
+
+def ranquear(usuario, candidatos, k):
+    """Retorna os ids dos `k` candidatos mais compativeis com o usuario, do mais compativel pro menos"""
+    if k <= 0:
+        return []
+
+    codigos = CodigosTexto()
+    alvo = next(carregar_perfis(CustomUser.objects.filter(id=usuario.id), codigos), None)
+    if alvo is None:
+        return []
+    penalizar_outro_estado = (
+        usuario.latitude is None and ConfiguracoesUsuario.distancia_maxima_de(usuario) < DISTANCIA_OUTRO_ESTADO)
+
+    if np is None:
+        alvo = alvo.como_listas()
+        melhores = []
+        for bloco in carregar_perfis(candidatos, codigos):
+            melhores = heapq.nlargest(
+                k, melhores + _pontuar_python(alvo, penalizar_outro_estado, bloco.como_listas(), usuario.id))
+        return [candidato_id for pontos, candidato_id in melhores]
+
+    # cada bloco é pontuado de uma vez e so os k melhores dele seguem pra proxima rodada
+    alvo = alvo.como_arrays()
+    largura = alvo['habilidades'].shape[1] * 8
+    melhores_pontos = np.empty(0)
+    melhores_ids = np.empty(0, dtype=np.uint64)
+    for bloco in carregar_perfis(candidatos, codigos):
+        bloco = bloco.como_arrays(largura)
+        pontos = _pontuar_numpy(alvo, penalizar_outro_estado, bloco, usuario.id)
+        melhores_pontos, melhores_ids = _top_k(
+            np.concatenate([melhores_pontos, pontos]), np.concatenate([melhores_ids, bloco['ids']]), k)
+    return [int(candidato_id) for candidato_id in melhores_ids]
@@ -0,0 +1,62 @@
+from django.db import models, transaction
+
+from .models import Linkeds, Conexao
+
+TABELA_LINKEDS = Linkeds._meta.db_table
+TABELA_CONEXAO = Conexao._meta.db_table
+
+# cria as duas linhas de adjacencia do link (usuario1 -> usuario2 e usuario2 -> usuario1) direto do link gravado
+SQL_MATERIALIZAR_CONEXOES = f"""
+    INSERT INTO {TABELA_CONEXAO} (usuario_id, conectado_id, link_id, data_realizacao)
+    SELECT usuario1_id, usuario2_id, id, data_realizacao FROM {TABELA_LINKEDS} WHERE usuario1_id = %s AND usuario2_id = %s
+    UNION ALL
+    SELECT usuario2_id, usuario1_id, id, data_realizacao FROM {TABELA_LINKEDS} WHERE usuario1_id = %s AND usuario2_id = %s
+    ON CONFLICT (usuario_id, conectado_id) DO NOTHING
+"""
+
+
+def par_ordenado(usuario_a_id, usuario_b_id):
+    # o link é sempre gravado com o menor id no usuario1
+    return (usuario_a_id, usuario_b_id) if usuario_a_id < usuario_b_id else (usuario_b_id, usuario_a_id)
+
+
+def materializar_conexoes(links):
+    # grava as duas conexoes de cada link (se ja existirem, ignora)
+    Conexao.objects.bulk_create([
+        Conexao(usuario_id=usuario_id, conectado_id=conectado_id, link_id=link.id, data_realizacao=link.data_realizacao)
+        for link in links
+        for usuario_id, conectado_id in ((link.usuario1_id, link.usuario2_id), (link.usuario2_id, link.usuario1_id))],
+        ignore_conflicts=True)
+
+
+def materializar_conexoes_sql(cursor, usuario1_id, usuario2_id):
+    # mesma coisa, mas dentro do cursor do swipe (o par ja tem que vir ordenado)
+    cursor.execute(SQL_MATERIALIZAR_CONEXOES, [usuario1_id, usuario2_id, usuario1_id, usuario2_id])
+
+
+def criar_link(usuario_a_id, usuario_b_id):
+    """Cria o link entre os dois usuarios (se ainda nao existir) junto com as conexoes. Retorna (link, criado)"""
+    # as conexoes sao gravadas pelo post_save do Linkeds (signals.py), na mesma transacao
+    usuario1_id, usuario2_id = par_ordenado(usuario_a_id, usuario_b_id)
+    with transaction.atomic():
+        return Linkeds.objects.get_or_create(usuario1_id=usuario1_id, usuario2_id=usuario2_id)
+
+
+def criar_links_em_lote(usuario_id, alvo_ids):
+    # cria os links do usuario com todos os alvos de uma vez (usado nos swipes em lote). o bulk_create nao dispara o
+    # post_save, entao as conexoes sao gravadas aqui
+    if not alvo_ids:
+        return
+    with transaction.atomic():
+        Linkeds.objects.bulk_create([
+            Linkeds(usuario1_id=usuario1_id, usuario2_id=usuario2_id)
+            for usuario1_id, usuario2_id in (par_ordenado(usuario_id, alvo_id) for alvo_id in alvo_ids)],
+            ignore_conflicts=True)
+        # com ignore_conflicts os ids nao voltam, entao busca os links de novo
+        materializar_conexoes(Linkeds.objects.filter(
+            models.Q(usuario1_id=usuario_id, usuario2_id__in=alvo_ids) | models.Q(usuario2_id=usuario_id, usuario1_id__in=alvo_ids)))
+
+
+def conexoes_de(usuario):
+    """Conexoes do usuario, das mais recentes pras mais antigas (uma faixa so do indice conexao_usuario_recentes_idx)"""
+    return Conexao.objects.filter(usuario=usuario).order_by('-data_realizacao', '-id')
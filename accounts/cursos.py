@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db.models import Count
+
+from .indice_prefixos import IndicePrefixos
+from .indice_versionado import IndiceVersionado
+from .models import Curso
+from .texto import trigramas
+
+# quantos resultados o autocomplete devolve por padrao e de quanto em quanto tempo o indice é refeito a partir do banco
+TOP_K = getattr(settings, 'CURSOS_TOP_K', 10)
+TTL_INDICE = getattr(settings, 'CURSOS_TTL_INDICE', 300)
+
+# versao do indice no cache, mesmo esquema do universidades.CHAVE_VERSAO
+CHAVE_VERSAO = 'cursos:indice:versao'
+
+
+class IndiceCursos:
+    """Indice em memoria dos cursos (busca no IndicePrefixos), com os mais populares na frente dos empates"""
+
+    def __init__(self, cursos):
+        self.itens = []
+        self.normalizados = []
+        self.busca = IndicePrefixos()
+
+        for curso in cursos:
+            self.itens.append({'id': curso.id, 'nome': curso.nome})
+            self.normalizados.append(curso.nome_normalizado)
+            self.busca.adicionar(
+                curso.nome_normalizado, curso.nome_normalizado.split(), trigramas(curso.nome_normalizado),
+                popularidade=curso.total_alunos)
+
+    def buscar(self, termo, limite=TOP_K, preferidos=()):
+        """Top `limite` cursos pro termo. `preferidos` sao nomes normalizados que sobem no ranking (cursos da universidade)"""
+        preferidos = set(preferidos)
+        posicoes = self.busca.buscar(termo, limite, bonus=lambda posicao: self.normalizados[posicao] in preferidos)
+        return [self.itens[posicao] for posicao in posicoes]
+
+
+def _montar_indice():
+    return IndiceCursos(Curso.objects.annotate(total_alunos=Count('alunos')).order_by('id'))
+
+
+_indice = IndiceVersionado(CHAVE_VERSAO, _montar_indice, TTL_INDICE)
+versao_atual = _indice.versao_atual
+obter_indice = _indice.obter
+# chamado depois de carregar cursos novos, o proximo request de cada processo monta o indice de novo
+invalidar_indice = _indice.invalidar
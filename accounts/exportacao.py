@@ -0,0 +1,263 @@
+import json
+import os
+import secrets
+import tempfile
+import zipfile
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import tarefas
+from .models import (
+    CustomUser, ConfiguracoesUsuario, PreferenciasEstudo, FotosUsuario, MembroGrupoEstudos, Interacao, Conexao)
+
+# exportacao dos dados do usuario (LGPD) gerada em pedacos: as listas vem do banco com .iterator() e cada pedaco sai
+# assim que fica pronto, entao a memoria nao cresce com o tamanho da conta
+VERSAO = '2.0'
+# linhas trazidas do banco por vez em cada lista
+TAMANHO_LOTE = getattr(settings, 'EXPORTACAO_TAMANHO_LOTE', 500)
+# o texto é juntado ate esse tamanho antes de sair (um pedaco por linha seria muita escrita pequena no socket). Tambem é
+# o tamanho dos blocos lidos dos arquivos das fotos
+TAMANHO_PEDACO = 64 * 1024
+
+
+def _json(valor):
+    return json.dumps(valor, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def cabecalho(user):
+    # parte da exportacao que é uma linha so por usuario (perfil, configuracoes e preferencias)
+    config = ConfiguracoesUsuario.objects.filter(user=user).first()
+    preferencias = PreferenciasEstudo.objects.filter(user=user).first()
+
+    return {
+        'perfil': {
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'data_nascimento': user.data_nascimento.isoformat() if user.data_nascimento else None,
+            'genero': user.genero,
+            'estado': user.estado,
+            'cidade': user.cidade,
+            'universidade': user.universidade,
+            'universidade_nome': user.universidade_nome,
+            'curso': user.curso,
+            'semestre': user.semestre,
+            'celular': user.celular,
+            'bio': user.bio,
+            'data_cadastro': user.date_joined.isoformat(),
+            'ultimo_login': user.last_login.isoformat() if user.last_login else None,
+        },
+        'configuracoes': {
+            'notificacoes': {
+                'linkeds': config.notificacao_linkeds if config else True,
+                'mensagens': config.notificacao_mensagens if config else True,
+                'eventos': config.notificacao_eventos if config else False,
+                'sons': config.notificacao_sons if config else True,
+                'matchs': config.notificacao_matchs if config else True,
+                'eventos_grupos': config.notificacao_eventos_grupos if config else False,
+            },
+            'privacidade': {
+                'mostrar_status_online': config.mostrar_status_online if config else True,
+                'confirmacao_leitura': config.confirmacao_leitura if config else True,
+                'visibilidade_perfil': config.visibilidade_perfil if config else True,
+                'mostrar_curso': config.mostrar_curso if config else True,
+            },
+            'interface': {
+                'modo_escuro': config.modo_escuro if config else False,
+                'tamanho_fonte': config.tamanho_fonte if config else 'medium',
+                'idioma': config.idioma if config else 'pt-br',
+            },
+            'sistema': {
+                'backup_automatico': config.backup_automatico if config else True,
+                'distancia_maxima': config.distancia_maxima if config else 50,
+            }
+        },
+        'preferencias_estudo': {
+            'dias_semana': preferencias.dia_semana if preferencias else [],
+            'horarios': preferencias.horario if preferencias else [],
+            'metodos': preferencias.metodo_preferido if preferencias else [],
+        },
+    }
+
+
+def caminho_foto(foto):
+    # nome da foto dentro do zip
+    return f'fotos/{foto.id}-{os.path.basename(foto.imagem.name)}'
+
+
+def listas(user):
+    # (nome, linhas) de cada lista da exportacao, as linhas geradas sob demanda direto do cursor do banco
+    grupos = MembroGrupoEstudos.objects.filter(user=user, ativo=True).order_by('id').values_list(
+        'grupo__nome', 'grupo__materia', 'entrou_em', 'ativo')
+    fotos = FotosUsuario.objects.filter(user=user).order_by('ordem', 'id').only(
+        'id', 'imagem', 'descricao', 'foto_perfil', 'ordem', 'data_upload')
+    enviadas = Interacao.objects.filter(de_usuario=user).order_by('id')
+    likes = enviadas.filter(tipo=Interacao.LIKE).values_list('para_usuario__username', 'data_realizacao')
+    superlikes = enviadas.filter(tipo=Interacao.SUPERLIKE).values_list(
+        'para_usuario__username', 'mensagem', 'data_realizacao')
+    superlikes_recebidos = Interacao.objects.filter(para_usuario=user, tipo=Interacao.SUPERLIKE).order_by('id').values_list(
+        'de_usuario__username', 'mensagem', 'data_realizacao')
+    linkeds = Conexao.objects.filter(usuario=user).order_by('data_realizacao', 'id').values_list(
+        'conectado__username', 'data_realizacao')
+
+    return [
+        ('grupos_estudo', ({'nome': nome, 'materia': materia, 'entrou_em': entrou_em, 'ativo': ativo}
+                           for nome, materia, entrou_em, ativo in grupos.iterator(chunk_size=TAMANHO_LOTE))),
+        ('fotos', ({'arquivo': caminho_foto(foto), 'descricao': foto.descricao, 'foto_perfil': foto.foto_perfil,
+                    'ordem': foto.ordem, 'data_upload': foto.data_upload}
+                   for foto in fotos.iterator(chunk_size=TAMANHO_LOTE))),
+        ('likes', ({'usuario': username, 'data': data}
+                   for username, data in likes.iterator(chunk_size=TAMANHO_LOTE))),
+        ('superlikes', ({'usuario': username, 'mensagem': mensagem, 'data': data}
+                        for username, mensagem, data in superlikes.iterator(chunk_size=TAMANHO_LOTE))),
+        ('superlikes_recebidos', ({'usuario': username, 'mensagem': mensagem, 'data': data}
+                                  for username, mensagem, data in superlikes_recebidos.iterator(chunk_size=TAMANHO_LOTE))),
+        ('linkeds', ({'usuario': username, 'data': data}
+                     for username, data in linkeds.iterator(chunk_size=TAMANHO_LOTE))),
+    ]
+
+
+def _textos(user):
+    # o documento JSON em pedacinhos de texto, na ordem
+    yield '{'
+    for chave, valor in cabecalho(user).items():
+        yield f'{_json(chave)}: {_json(valor)}, '
+    for nome, linhas in listas(user):
+        yield f'{_json(nome)}: ['
+        for i, linha in enumerate(linhas):
+            yield (', ' if i else '') + _json(linha)
+        yield '], '
+    yield f'"data_exportacao": {_json(timezone.now())}, "versao_exportacao": {_json(VERSAO)}}}'
+
+
+def pedacos_json(user):
+    # a exportacao em JSON, em pedacos de bytes de ate ~TAMANHO_PEDACO
+    buffer, tamanho = [], 0
+    for texto in _textos(user):
+        buffer.append(texto)
+        tamanho += len(texto)
+        if tamanho >= TAMANHO_PEDACO:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, tamanho = [], 0
+    yield ''.join(buffer).encode('utf-8')
+
+
+def pedacos_resposta(user):
+    # corpo do GET /api/exportar-dados/: a exportacao dentro do {'status', 'data'} das outras APIs
+    yield b'{"status": "success", "data": '
+    yield from pedacos_json(user)
+    yield b'}'
+
+
+class _Saida:
+    # destino do ZipFile: so guarda o que foi escrito ate o gerador mandar pra frente. Sem seek, o zipfile escreve o
+    # tamanho de cada arquivo depois do conteudo (data descriptor), entao nada precisa ficar inteiro na memoria
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def _entrada(nome, compressao):
+    info = zipfile.ZipInfo(nome, date_time=timezone.localtime().timetuple()[:6])
+    info.compress_type = compressao
+    return info
+
+
+def pedacos_zip(user):
+    # zip com o dados.json e os arquivos das fotos (lidos do storage em blocos, sem carregar a foto inteira)
+    saida = _Saida()
+    with zipfile.ZipFile(saida, 'w') as arquivo_zip:
+        with arquivo_zip.open(_entrada('dados.json', zipfile.ZIP_DEFLATED), 'w') as destino:
+            for pedaco in pedacos_json(user):
+                destino.write(pedaco)
+                yield saida.esvaziar()
+
+        fotos = FotosUsuario.objects.filter(user=user).order_by('ordem', 'id').only('id', 'imagem')
+        for foto in fotos.iterator(chunk_size=TAMANHO_LOTE):
+            try:
+                origem = default_storage.open(foto.imagem.name, 'rb')
+            except OSError:
+                # arquivo sumiu do storage, a foto continua listada no dados.json
+                continue
+            # foto ja é comprimida (jpg/png/webp), comprimir de novo so gasta cpu
+            with origem, arquivo_zip.open(_entrada(caminho_foto(foto), zipfile.ZIP_STORED), 'w') as destino:
+                while bloco := origem.read(TAMANHO_PEDACO):
+                    destino.write(bloco)
+                    yield saida.esvaziar()
+    # o diretorio central do zip é escrito no close
+    yield saida.esvaziar()
+
+
+async def aiterar(pedacos):
+    # gerador sync (que consulta o banco) pra async, um pedaco por vez: no ASGI o StreamingHttpResponse com iterador
+    # sync junta tudo numa lista antes de mandar
+    fim = object()
+    while (pedaco := await sync_to_async(next)(pedacos, fim)) is not fim:
+        yield pedaco
+
+
+def armazenamento():
+    # storage das exportacoes da fila, fora do MEDIA_ROOT: o arquivo so sai pela view, que confere o dono (lido a cada
+    # chamada, assim override_settings vale nos testes)
+    return FileSystemStorage(location=getattr(settings, 'EXPORTACOES_DIR', settings.BASE_DIR / 'exportacoes'))
+
+
+def validade():
+    # horas que o arquivo fica esperando o download
+    return getattr(settings, 'EXPORTACAO_VALIDADE', 24)
+
+
+class ArquivoExportado(File):
+    # arquivo da exportacao aberto pro download, apagado quando a resposta termina de mandar (o FileResponse fecha)
+
+    def __init__(self, nome):
+        self.armazenamento = armazenamento()
+        super().__init__(self.armazenamento.open(nome, 'rb'), name=nome)
+
+    def close(self):
+        super().close()
+        self.armazenamento.delete(self.name)
+
+
+def gerar_arquivo(usuario_id):
+    # tarefa: grava a exportacao num arquivo e devolve o caminho dele no storage privado
+    user = CustomUser.objects.get(id=usuario_id)
+    # nome com parte aleatoria pra nao dar pra adivinhar o arquivo de outro usuario
+    nome = f'{usuario_id}-{secrets.token_urlsafe(16)}.json'
+    with tempfile.TemporaryFile() as temporario:
+        for pedaco in pedacos_json(user):
+            temporario.write(pedaco)
+        temporario.seek(0)
+        nome = armazenamento().save(nome, File(temporario))
+
+    # se ninguem baixar, a tarefa apaga quando vencer
+    horas = validade()
+    tarefas.enfileirar(apagar_arquivo, atraso=horas * 3600, nome=nome)
+    return {'arquivo': nome, 'expira_em': (timezone.now() + timedelta(hours=horas)).isoformat()}
+
+
+def apagar_arquivo(nome):
+    # tarefa: apaga a exportacao vencida (se ainda nao foi baixada)
+    pasta = armazenamento()
+    if not pasta.exists(nome):
+        return False
+    pasta.delete(nome)
+    return True
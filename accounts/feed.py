@@ -0,0 +1,227 @@
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import compatibilidade, roteador
+from .models import CustomUser, Interacao, FilaCandidatos, ConfiguracoesUsuario
+
+# as configuracoes FEED_* sao lidas a cada chamada (e nao na importacao), assim override_settings vale nos testes
+
+def tamanho_lote():
+    # quantos perfis entram na fila a cada recarga
+    return getattr(settings, 'FEED_TAMANHO_LOTE', 50)
+
+
+def limiar_recarga():
+    # com quantos perfis restantes a gente ja manda recarregar
+    return getattr(settings, 'FEED_LIMIAR_RECARGA', 10)
+
+
+def recarga_em_segundo_plano():
+    return getattr(settings, 'FEED_RECARGA_EM_SEGUNDO_PLANO', True)
+
+
+def incluir_sem_localizacao():
+    # perfis cuja cidade nao ta no gazetteer (sem coordenadas) continuam aparecendo no feed de quem tem distancia maxima
+    return getattr(settings, 'FEED_INCLUIR_SEM_LOCALIZACAO', True)
+
+
+# usuarios que ja tem uma recarga rodando nesse processo, pra nao disparar duas threads pro mesmo usuario
+_recargas_em_andamento = set()
+_trava_recargas = threading.Lock()
+
+
+def candidatos_elegiveis(usuario):
+    # tira quem o usuario ja curtiu, descurtiu ou supercurtiu. como a tabela de interacoes é unica e tem indice em
+    # (de_usuario, para_usuario), o "ja interagiu" vira uma varredura so no indice
+    ja_interagiu = Interacao.objects.filter(de_usuario=usuario).values('para_usuario_id')
+
+    candidatos = CustomUser.objects.filter(is_staff=False).exclude(id=usuario.id).exclude(id__in=ja_interagiu)
+
+    # com coordenadas, so entra quem ta dentro da distancia maxima (celulas da grade -> caixa -> haversine)
+    if usuario.latitude is not None and usuario.longitude is not None:
+        candidatos = candidatos.no_raio(
+            usuario.latitude, usuario.longitude, ConfiguracoesUsuario.distancia_maxima_de(usuario),
+            incluir_sem_localizacao=incluir_sem_localizacao())
+    return candidatos
+
+
+def recarregar_fila(usuario, fila=None):
+    """Completa a fila do usuario com o proximo lote de perfis elegiveis"""
+    if fila is None:
+        fila, criada = FilaCandidatos.objects.get_or_create(user=usuario)
+    # o horario é pego antes de montar o lote, assim quem se cadastrar durante a recarga ainda reabre a fila depois
+    recarregada_em = timezone.now()
+    restantes = fila.restantes()
+    base = candidatos_elegiveis(usuario)
+
+    # mantem na frente quem ainda ta na fila e continua elegivel, assim o perfil que ta na tela nao muda de lugar
+    mantidos = set(base.filter(id__in=restantes).values_list('id', flat=True)) if restantes else set()
+    ids = [i for i in restantes if i in mantidos]
+
+    # completa com os mais compativeis (preferencias de estudo, habilidades, universidade, curso e local), nao por ordem de id
+    lote = tamanho_lote()
+    faltam = lote - len(ids)
+    if faltam > 0:
+        ids += compatibilidade.ranquear(usuario, base.exclude(id__in=ids), faltam)
+
+    # so grava se ninguem mexeu na fila enquanto a gente calculava (senao a proxima leitura recarrega de novo)
+    # se nem deu pra completar o lote, nao tem mais ninguem elegivel alem de quem ja ta na fila
+    FilaCandidatos.objects.filter(pk=fila.pk, ids=fila.ids, posicao=fila.posicao).update(
+        ids=','.join(str(i) for i in ids),
+        posicao=0,
+        esgotada=len(ids) < lote,
+        data_atualizacao=recarregada_em)
+    return ids
+
+
+def _ultimo_cadastro():
+    # o maior id é o ultimo cadastro, entao sai pelo indice da chave primaria sem varrer a tabela
+    return CustomUser.objects.order_by('-id').values_list('date_joined', flat=True)
+
+
+def fila_esgotada(fila):
+    """A fila so continua esgotada se ninguem se cadastrou depois da ultima recarga. Assim o cadastro nao precisa
+    reabrir as filas de todo mundo: quem ficou sem perfis confere na proxima leitura"""
+    if not fila.esgotada:
+        return False
+    ultimo = _ultimo_cadastro().first()
+    return ultimo is None or ultimo < fila.data_atualizacao
+
+
+async def afila_esgotada(fila):
+    if not fila.esgotada:
+        return False
+    ultimo = await _ultimo_cadastro().afirst()
+    return ultimo is None or ultimo < fila.data_atualizacao
+
+
+def _recarregar_em_segundo_plano(usuario_id):
+    try:
+        # a thread nao herda o estado do request: sem fixar, as interacoes seriam lidas de uma replica que pode ainda nao
+        # ter o swipe que acabou de ser gravado, e o perfil ja curtido voltava pra fila
+        with roteador.fixar_primario():
+            usuario = CustomUser.objects.filter(id=usuario_id).first()
+            if usuario:
+                recarregar_fila(usuario)
+    finally:
+        with _trava_recargas:
+            _recargas_em_andamento.discard(usuario_id)
+        # a thread acaba aqui, entao fecha a conexao dela mesmo com CONN_MAX_AGE (ninguem mais vai reaproveitar)
+        connection.close()
+
+
+def agendar_recarga(usuario):
+    # dispara a recarga numa thread separada pra nao segurar o request
+    if not recarga_em_segundo_plano():
+        recarregar_fila(usuario)
+        return
+
+    with _trava_recargas:
+        if usuario.id in _recargas_em_andamento:
+            return
+        _recargas_em_andamento.add(usuario.id)
+
+    threading.Thread(target=_recarregar_em_segundo_plano, args=(usuario.id,), daemon=True).start()
+
+
+def proximo_candidato_id(usuario):
+    """Retorna o id do perfil que ta na frente da fila (sem tirar ele de la), ou None se acabaram os perfis"""
+    fila, criada = FilaCandidatos.objects.get_or_create(user=usuario)
+    restantes = fila.restantes()
+
+    # fila vazia: aqui nao tem jeito, precisa carregar na hora pra ter o que mostrar
+    if not restantes:
+        if fila_esgotada(fila):
+            return None
+        restantes = recarregar_fila(usuario, fila)
+        return restantes[0] if restantes else None
+
+    # ta acabando, entao ja pede mais em segundo plano
+    if len(restantes) <= limiar_recarga() and not fila_esgotada(fila):
+        agendar_recarga(usuario)
+
+    return restantes[0]
+
+
+async def aproximo_candidato_id(usuario):
+    """Versao async do proximo_candidato_id: o caso comum (fila com perfis) é uma consulta so pelo ORM async, a recarga
+    (ranking de compatibilidade) continua sync e vai pra uma thread"""
+    fila, criada = await FilaCandidatos.objects.aget_or_create(user=usuario)
+    restantes = fila.restantes()
+
+    if not restantes:
+        if await afila_esgotada(fila):
+            return None
+        restantes = await sync_to_async(recarregar_fila)(usuario, fila)
+        return restantes[0] if restantes else None
+
+    if len(restantes) <= limiar_recarga() and not await afila_esgotada(fila):
+        await sync_to_async(agendar_recarga)(usuario)
+
+    return restantes[0]
+
+
+def avancar_fila(usuario_id, alvo_id):
+    # chamado quando o usuario interage com alguem. se for o perfil da frente da fila, so anda uma posicao (O(1))
+    avancar_fila_varios(usuario_id, [alvo_id])
+
+
+def avancar_fila_varios(usuario_id, alvo_ids):
+    # mesma coisa pra varias interacoes de uma vez (swipes em lote): anda a fila enquanto a frente dela foi interagida
+    fila = FilaCandidatos.objects.filter(user_id=usuario_id).first()
+    if not fila:
+        return
+
+    alvos = set(alvo_ids)
+    restantes = fila.restantes()
+    andou = 0
+    while andou < len(restantes) and restantes[andou] in alvos:
+        andou += 1
+
+    if alvos.intersection(restantes[andou:]):
+        # interagiu com alguem fora de ordem, entao a fila nao vale mais e é recarregada na proxima leitura
+        invalidar_fila(usuario_id)
+    elif andou:
+        FilaCandidatos.objects.filter(pk=fila.pk, posicao=fila.posicao).update(posicao=fila.posicao + andou)
+
+
+def invalidar_fila(usuario_id):
+    FilaCandidatos.objects.filter(user_id=usuario_id).update(ids='', posicao=0, esgotada=False)
+
+
+async def ainvalidar_fila(usuario_id):
+    await FilaCandidatos.objects.filter(user_id=usuario_id).aupdate(ids='', posicao=0, esgotada=False)
+
+
+def proximos_candidatos_ids(usuario, quantidade, depois_de=None):
+    """Retorna (ids, reiniciou): ate `quantidade` ids da fila, comecando logo depois do id `depois_de` (cursor).
+
+    Se o cursor nao ta mais na fila (ela foi invalidada ou ja andou alem dele), a pagina vem do comeco da fila com
+    reiniciou=True: o front joga fora o buffer e fica com essa pagina, em vez de receber de novo perfis que ja tem"""
+    fila, criada = FilaCandidatos.objects.get_or_create(user=usuario)
+    restantes = fila.restantes()
+
+    def _fatia(ids):
+        if depois_de is None:
+            return ids[:quantidade], False
+        if depois_de in ids:
+            inicio = ids.index(depois_de) + 1
+            return ids[inicio:inicio + quantidade], False
+        return ids[:quantidade], True
+
+    pagina, reiniciou = _fatia(restantes)
+    esgotada = fila_esgotada(fila)
+
+    # a fila nao tem o suficiente pra encher a pagina, entao completa na hora (quem ainda ta na fila continua na frente,
+    # entao o cursor continua valendo)
+    if len(pagina) < quantidade and not esgotada:
+        restantes = recarregar_fila(usuario, fila)
+        pagina, reiniciou = _fatia(restantes)
+    elif len(restantes) <= limiar_recarga() and not esgotada:
+        agendar_recarga(usuario)
+
+    return pagina, reiniciou
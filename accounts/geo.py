@@ -0,0 +1,92 @@
+import math
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+from .texto import normalizar
+
+RAIO_TERRA_KM = 6371.0
+KM_POR_GRAU_LATITUDE = 111.32
+
+# tamanho (em graus) de cada celula da grade. a celula de um ponto é linha * COLUNAS + coluna, entao as celulas de uma
+# mesma linha sao inteiros seguidos e a busca por caixa vira um BETWEEN por linha no indice da geocelula
+TAMANHO_CELULA = getattr(settings, 'GEO_TAMANHO_CELULA', 0.5)
+COLUNAS = int(math.ceil(360 / TAMANHO_CELULA))
+
+# codigo IBGE do estado -> sigla, e sigla -> nome, pra aceitar "SP", "São Paulo" ou o codigo
+UFS = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP',
+    41: 'PR', 42: 'SC', 43: 'RS',
+    50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF'}
+NOMES_UFS = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+    'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão', 'MT': 'Mato Grosso',
+    'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+    'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte',
+    'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo',
+    'SE': 'Sergipe', 'TO': 'Tocantins'}
+_SIGLA_POR_NOME = {normalizar(nome): sigla for sigla, nome in NOMES_UFS.items()}
+
+
+def sigla_uf(estado):
+    """Converte o estado digitado ("sp", "São Paulo", 35) na sigla, ou '' se nao reconhecer"""
+    if isinstance(estado, int) or (isinstance(estado, str) and estado.strip().isdigit()):
+        return UFS.get(int(estado), '')
+    estado = normalizar(estado).strip()
+    if estado.upper() in NOMES_UFS:
+        return estado.upper()
+    return _SIGLA_POR_NOME.get(estado, '')
+
+
+def celula(latitude, longitude):
+    linha = int((latitude + 90) // TAMANHO_CELULA)
+    coluna = int((longitude + 180) // TAMANHO_CELULA) % COLUNAS
+    return linha * COLUNAS + coluna
+
+
+def caixa(latitude, longitude, raio_km):
+    # caixa (lat_min, lat_max, lon_min, lon_max) que contem o circulo de raio_km em volta do ponto
+    delta_latitude = raio_km / KM_POR_GRAU_LATITUDE
+    cos_latitude = max(math.cos(math.radians(latitude)), 0.01)
+    delta_longitude = min(raio_km / (KM_POR_GRAU_LATITUDE * cos_latitude), 180)
+    return (
+        max(latitude - delta_latitude, -90), min(latitude + delta_latitude, 90),
+        max(longitude - delta_longitude, -180), min(longitude + delta_longitude, 180))
+
+
+def faixas_de_celulas(latitude, longitude, raio_km):
+    """Faixas (celula_inicial, celula_final) que cobrem a caixa do raio, uma por linha da grade"""
+    lat_min, lat_max, lon_min, lon_max = caixa(latitude, longitude, raio_km)
+    primeira_coluna = int((lon_min + 180) // TAMANHO_CELULA)
+    ultima_coluna = min(int((lon_max + 180) // TAMANHO_CELULA), COLUNAS - 1)
+    return [
+        (linha * COLUNAS + primeira_coluna, linha * COLUNAS + ultima_coluna)
+        for linha in range(int((lat_min + 90) // TAMANHO_CELULA), int((lat_max + 90) // TAMANHO_CELULA) + 1)]
+
+
+def distancia_km(latitude1, longitude1, latitude2, longitude2):
+    # haversine
+    dlat = math.radians(latitude2 - latitude1)
+    dlon = math.radians(longitude2 - longitude1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(latitude1)) * math.cos(math.radians(latitude2)) * math.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(min(a, 1)))
+
+
+def expressao_distancia(latitude, longitude):
+    """Haversine em SQL do ponto ate (latitude, longitude) de cada linha. No SQLite as funcoes sao as que o Django registra"""
+    dlat = Radians(F('latitude') - latitude)
+    dlon = Radians(F('longitude') - longitude)
+    a = Power(Sin(dlat / 2), 2) + math.cos(math.radians(latitude)) * Cos(Radians(F('latitude'))) * Power(Sin(dlon / 2), 2)
+    return 2 * RAIO_TERRA_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def filtro_no_raio(latitude, longitude, raio_km):
+    """Q das linhas dentro do raio: faixas de celula (indice) e caixa primeiro, haversine exato (alias distancia_km) por ultimo"""
+    faixas = Q()
+    for inicio, fim in faixas_de_celulas(latitude, longitude, raio_km):
+        faixas |= Q(geocelula__range=(inicio, fim))
+    lat_min, lat_max, lon_min, lon_max = caixa(latitude, longitude, raio_km)
+    return faixas & Q(latitude__range=(lat_min, lat_max), longitude__range=(lon_min, lon_max)) & Q(distancia_km__lte=raio_km)
@@ -0,0 +1,113 @@
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import FotosUsuario
+
+# variantes das fotos de perfil, geradas pela tarefa processar_foto depois do upload e guardadas em
+# FotosUsuario.variantes. Enquanto a tarefa nao rodou (ou se der erro) as APIs mandam a URL do original
+
+# nome: (lado maximo em px, corta quadrado). mini é o avatar redondo de linkeds, grupos e notificacoes (128 = 64px em
+# tela retina), media o card do feed e grande a foto aberta
+VARIANTES = {
+    'mini': (128, True),
+    'media': (480, False),
+    'grande': (1080, False),
+}
+# formatos gerados, o primeiro é o que as APIs mandam. AVIF é menor mas mais lento pra gerar e precisa do Pillow com
+# libavif: ex IMAGENS_FORMATOS = ['avif', 'webp']
+FORMATOS = [formato for formato in getattr(settings, 'IMAGENS_FORMATOS', ['webp']) if features.check(formato)]
+QUALIDADE = getattr(settings, 'IMAGENS_QUALIDADE', 80)
+
+PASTA = 'fotos_usuario/variantes'
+
+
+def _pasta(foto_id):
+    return f'{PASTA}/{foto_id}'
+
+
+def _gravar(nome, imagem, formato, **opcoes):
+    conteudo = io.BytesIO()
+    imagem.save(conteudo, format=formato, **opcoes)
+    # a foto pode ser reprocessada: apaga a anterior, senao o storage grava com outro nome
+    if default_storage.exists(nome):
+        default_storage.delete(nome)
+    return default_storage.save(nome, ContentFile(conteudo.getvalue()))
+
+
+def _sem_exif(foto, original):
+    # regrava o original sem os metadados, no mesmo formato e no mesmo caminho
+    formato = original.format
+    imagem = ImageOps.exif_transpose(original)
+    opcoes = {'quality': 95} if formato == 'JPEG' else {}
+    nome = _gravar(foto.imagem.name, imagem, formato, **opcoes)
+    if nome != foto.imagem.name:  # storage que nao deixa reaproveitar o nome
+        FotosUsuario.objects.filter(id=foto.id).update(imagem=nome)
+    return imagem
+
+
+def processar_foto(foto_id):
+    # tarefa: gera as variantes da foto e tira o EXIF do original (tem GPS, modelo da camera...). Devolve o que foi
+    # gravado em variantes
+    foto = FotosUsuario.objects.filter(id=foto_id).only('id', 'user_id', 'imagem').first()
+    if foto is None:
+        return None
+
+    with default_storage.open(foto.imagem.name, 'rb') as arquivo:
+        original = Image.open(arquivo)
+        original.load()
+    imagem = _sem_exif(foto, original) if original.getexif() else original
+    if imagem.mode not in ('RGB', 'RGBA'):
+        imagem = imagem.convert('RGBA' if 'transparency' in imagem.info or imagem.mode in ('LA', 'PA') else 'RGB')
+
+    variantes = {}
+    for nome, (lado, quadrada) in VARIANTES.items():
+        if quadrada:
+            reduzida = ImageOps.fit(imagem, (lado, lado), Image.Resampling.LANCZOS)
+        else:
+            # so reduz, foto menor que o lado fica do tamanho que ta
+            reduzida = imagem.copy()
+            reduzida.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+
+        variantes[nome] = {'largura': reduzida.width}
+        for formato in FORMATOS:
+            variantes[nome][formato] = _gravar(
+                f'{_pasta(foto.id)}/{nome}.{formato}', reduzida, formato.upper(), quality=QUALIDADE)
+
+    # update direto: o save() do model mexe na ordem e na foto principal
+    FotosUsuario.objects.filter(id=foto.id).update(variantes=variantes)
+    from .signals import invalidar_cartoes
+    invalidar_cartoes([foto.user_id])
+    return variantes
+
+
+def remover_variantes(foto):
+    for variante in (foto.variantes or {}).values():
+        for formato, nome in variante.items():
+            if formato != 'largura' and default_storage.exists(nome):
+                default_storage.delete(nome)
+
+
+def urls_variantes(foto):
+    # {nome: {'url', 'largura'}} das variantes ja geradas, no formato preferido. Vai no cartao do perfil
+    urls = {}
+    for nome, variante in (foto.variantes or {}).items():
+        formato = next((formato for formato in FORMATOS if formato in variante), None)
+        if formato:
+            urls[nome] = {'url': default_storage.url(variante[formato]), 'largura': variante['largura']}
+    return urls
+
+
+def foto_para(cartao, tamanho):
+    # URL da foto do cartao pro tamanho pedido (nome de VARIANTES), ou a do original se a variante nao existe
+    variante = (cartao.get('fotos') or {}).get(tamanho)
+    return variante['url'] if variante else cartao['foto']
+
+
+def srcset(cartao):
+    # pro <img srcset>: com o sizes do <img> o navegador baixa so a menor que cobre o tamanho em tela
+    fotos = cartao.get('fotos') or {}
+    return ', '.join(f"{fotos[nome]['url']} {fotos[nome]['largura']}w" for nome in VARIANTES if nome in fotos)
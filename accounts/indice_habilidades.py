@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .compatibilidade import bytes_habilidades
+from .indice_versionado import IndiceVersionado
+from .models import CustomUser, Habilidades
+
+# o indice é atualizado na hora pelos signals, o TTL so garante que um processo que perdeu alguma alteracao se acerta
+TTL_INDICE = getattr(settings, 'HABILIDADES_TTL_INDICE', 3600)
+# versao do indice no cache: cada alteracao incrementa, e o processo que tiver uma versao diferente monta o indice de novo
+# (ver IndiceVersionado sobre o cache locmem)
+CHAVE_VERSAO = 'habilidades:indice:versao'
+
+TAMANHO_LOTE = 500
+
+
+class IndiceHabilidades:
+    """Indice invertido em memoria: habilidade -> ids dos usuarios que tem ela, mais o nome de cada habilidade"""
+
+    def __init__(self, usuarios, habilidades):
+        self.nomes = dict(habilidades)
+        self.usuarios = defaultdict(set)
+        for usuario_id, habilidade_ids in usuarios:
+            for habilidade_id in habilidade_ids or ():
+                self.usuarios[habilidade_id].add(usuario_id)
+
+    def nomes_de(self, habilidade_ids):
+        return [self.nomes[h] for h in habilidade_ids if h in self.nomes]
+
+    def buscar(self, habilidade_ids, todas=True):
+        """Ids dos usuarios com todas (AND) ou com qualquer uma (OR) das habilidades"""
+        conjuntos = sorted((self.usuarios.get(h, set()) for h in set(habilidade_ids)), key=len)
+        if not conjuntos:
+            return set()
+        if todas:
+            # comeca pelo menor conjunto, entao o custo é proporcional aos resultados e nao ao total de usuarios
+            return conjuntos[0].intersection(*conjuntos[1:])
+        return set().union(*conjuntos)
+
+    def aplicar(self, alteracoes):
+        # alteracoes: [(usuario_id, ids_antigos, ids_novos)]
+        for usuario_id, antigos, novos in alteracoes:
+            for habilidade_id in set(antigos) - set(novos):
+                self.usuarios[habilidade_id].discard(usuario_id)
+            for habilidade_id in set(novos) - set(antigos):
+                self.usuarios[habilidade_id].add(usuario_id)
+
+
+def _montar_indice():
+    return IndiceHabilidades(
+        CustomUser.objects.exclude(habilidade_ids=[]).values_list('id', 'habilidade_ids').iterator(chunk_size=2000),
+        Habilidades.objects.values_list('id', 'nome'))
+
+
+_indice = IndiceVersionado(CHAVE_VERSAO, _montar_indice, TTL_INDICE)
+versao_atual = _indice.versao_atual
+obter_indice = _indice.obter
+# habilidade renomeada ou apagada: todo mundo monta de novo
+invalidar_indice = _indice.invalidar
+
+
+def registrar_alteracoes(alteracoes):
+    # aplica no indice desse processo e sobe a versao pros outros processos remontarem o deles
+    _indice.atualizar(lambda indice: indice.aplicar(alteracoes))
+
+
+def sincronizar_usuarios(usuario_ids):
+    """Refaz as colunas habilidade_ids e bits_habilidades dos usuarios a partir do M2M e atualiza o indice.
+    Retorna {usuario_id: ids}"""
+    Relacao = CustomUser.habilidades.through
+    usuario_ids = list(set(usuario_ids))
+    atuais = {}
+    alteracoes = []
+    for inicio in range(0, len(usuario_ids), TAMANHO_LOTE):
+        lote = usuario_ids[inicio:inicio + TAMANHO_LOTE]
+        novos = {usuario_id: [] for usuario_id in lote}
+        for usuario_id, habilidade_id in Relacao.objects.filter(customuser_id__in=lote).order_by(
+                'habilidades_id').values_list('customuser_id', 'habilidades_id'):
+            novos[usuario_id].append(habilidade_id)
+
+        alterados = []
+        for usuario in CustomUser.objects.filter(id__in=lote).only('id', 'habilidade_ids'):
+            if usuario.habilidade_ids != novos[usuario.id]:
+                alteracoes.append((usuario.id, usuario.habilidade_ids or [], novos[usuario.id]))
+                usuario.habilidade_ids = novos[usuario.id]
+                usuario.bits_habilidades = bytes_habilidades(novos[usuario.id])
+                alterados.append(usuario)
+        CustomUser.objects.bulk_update(alterados, ['habilidade_ids', 'bits_habilidades'], batch_size=TAMANHO_LOTE)
+        atuais.update(novos)
+
+    if alteracoes:
+        # so mexe no indice se a transacao for confirmada
+        transaction.on_commit(lambda: registrar_alteracoes(alteracoes))
+    return atuais
@@ -0,0 +1,95 @@
+import heapq
+from collections import Counter, defaultdict
+
+from .texto import palavras, trigramas
+
+# prefixos maiores que isso nao entram no indice (a busca corta o termo e confere o resto na hora)
+TAMANHO_MAXIMO_PREFIXO = 12
+# similaridade minima de trigramas pra aceitar um resultado aproximado (erro de digitacao)
+SIMILARIDADE_MINIMA = 0.3
+
+
+class IndicePrefixos:
+    """Busca dos catalogos (universidades, cursos): prefixo de palavra pra busca exata e trigramas pra aproximada.
+
+    Guarda so as posicoes, quem usa mantem a lista dos itens na mesma ordem em que chamou adicionar()"""
+
+    def __init__(self):
+        self.nomes = []
+        self.populares = []
+        self.palavras_por_item = []
+        self.prefixos = defaultdict(set)
+        self.trigramas = defaultdict(set)
+        self.trigramas_por_item = []
+
+    def adicionar(self, nome, palavras_item, trigramas_item, popularidade=0):
+        # nome (normalizado) é o que entra no ranking, palavras_item e trigramas_item o que a busca encontra
+        posicao = len(self.nomes)
+        self.nomes.append(nome)
+        self.populares.append(popularidade)
+
+        self.palavras_por_item.append(palavras_item)
+        for palavra in palavras_item:
+            for tamanho in range(1, min(len(palavra), TAMANHO_MAXIMO_PREFIXO) + 1):
+                self.prefixos[palavra[:tamanho]].add(posicao)
+
+        self.trigramas_por_item.append(len(trigramas_item))
+        for trigrama in trigramas_item:
+            self.trigramas[trigrama].add(posicao)
+        return posicao
+
+    def _pontuar(self, posicao, termo_normalizado, palavras_termo, bonus):
+        # nome igual ao termo > comeca com o termo > bonus do catalogo > tem todas as palavras > mais popular > mais curto
+        nome = self.nomes[posicao]
+        return (
+            nome == termo_normalizado,
+            nome.startswith(termo_normalizado),
+            bonus(posicao) if bonus else 0,
+            all(palavra in nome for palavra in palavras_termo),
+            self.populares[posicao],
+            -len(nome))
+
+    def buscar(self, termo, limite, bonus=None):
+        """Posicoes dos `limite` melhores itens pro termo. `bonus(posicao)` sobe no ranking os itens que o catalogo
+        prefere (sigla igual ao termo, curso oferecido na universidade do usuario)"""
+        palavras_termo = palavras(termo)
+        if not palavras_termo:
+            return []
+        termo_normalizado = ' '.join(palavras_termo)
+
+        # 1) todas as palavras do termo tem que ser prefixo de alguma palavra do item
+        candidatos = None
+        for palavra in palavras_termo:
+            encontrados = self.prefixos.get(palavra[:TAMANHO_MAXIMO_PREFIXO], set())
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                break
+        candidatos = candidatos or set()
+
+        # prefixo cortado no tamanho maximo: confere a palavra inteira
+        palavras_longas = [p for p in palavras_termo if len(p) > TAMANHO_MAXIMO_PREFIXO]
+        if palavras_longas:
+            candidatos = {c for c in candidatos if all(
+                any(w.startswith(p) for w in self.palavras_por_item[c]) for p in palavras_longas)}
+
+        melhores = heapq.nlargest(
+            limite, candidatos, key=lambda c: self._pontuar(c, termo_normalizado, palavras_termo, bonus))
+
+        # 2) nao achou o suficiente: completa com os mais parecidos por trigrama ("engenaria" acha "engenharia")
+        if len(melhores) < limite:
+            trigramas_termo = trigramas(termo_normalizado)
+            comuns = Counter()
+            for trigrama in trigramas_termo:
+                comuns.update(self.trigramas.get(trigrama, ()))
+
+            ja_escolhidos = set(melhores)
+            similares = []
+            for posicao, quantidade in comuns.items():
+                if posicao in ja_escolhidos:
+                    continue
+                similaridade = quantidade / (len(trigramas_termo) + self.trigramas_por_item[posicao] - quantidade)
+                if similaridade >= SIMILARIDADE_MINIMA:
+                    similares.append((similaridade, posicao))
+            melhores += [posicao for similaridade, posicao in heapq.nlargest(limite - len(melhores), similares)]
+
+        return melhores
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+
+class IndiceVersionado:
+    """Guarda um indice montado na memoria do processo (universidades, cursos, habilidades) com a versao dele no cache.
+
+    Quem altera os dados incrementa a versao e cada processo que tiver montado outra versao (ou ha mais de `ttl`
+    segundos) chama montar() de novo no proximo obter(). Entre processos isso precisa do cache compartilhado
+    (UNICROSSED_CACHE=arquivo ou redis): com o locmem cada processo tem o seu, a versao incrementada nao sai do processo
+    que alterou e os outros so se acertam pelo `ttl`
+    """
+
+    def __init__(self, chave_versao, montar, ttl):
+        self.chave_versao = chave_versao
+        self.montar = montar
+        self.ttl = ttl
+        # (indice, versao, criado_em) numa tupla so, pra leitura sem trava nao pegar um pedaco de cada montagem
+        self._atual = None
+        self._trava = threading.Lock()
+
+    @property
+    def indice(self):
+        return self._atual[0] if self._atual else None
+
+    @property
+    def versao(self):
+        return self._atual[1] if self._atual else None
+
+    def versao_atual(self):
+        return cache.get(self.chave_versao, 0)
+
+    def incrementar_versao(self):
+        try:
+            return cache.incr(self.chave_versao)
+        except ValueError:
+            # chave ainda nao existe (ou expirou do cache)
+            cache.add(self.chave_versao, 1, timeout=None)
+            return self.versao_atual()
+
+    def _valido(self, atual, versao):
+        return atual is not None and atual[1] == versao and time.monotonic() - atual[2] < self.ttl
+
+    def obter(self):
+        """Retorna o indice da memoria do processo, montando de novo se ainda nao existe, passou do TTL ou mudou de
+        versao"""
+        versao = self.versao_atual()
+        atual = self._atual
+        if self._valido(atual, versao):
+            return atual[0]
+
+        with self._trava:
+            # outra thread pode ter montado enquanto essa esperava a trava
+            if not self._valido(self._atual, versao):
+                self._atual = (self.montar(), versao, time.monotonic())
+            return self._atual[0]
+
+    def invalidar(self):
+        # todo processo (esse inclusive) monta de novo no proximo obter()
+        with self._trava:
+            self.incrementar_versao()
+            self._atual = None
+
+    def atualizar(self, aplicar):
+        """Aplica uma alteracao no indice desse processo (aplicar(indice)) e sobe a versao pros outros processos
+        remontarem o deles"""
+        with self._trava:
+            versao = self.incrementar_versao()
+            # o incr é atomico: so da pra aplicar se foi o nosso incremento que saiu da versao do indice. se outro
+            # processo incrementou no meio, o indice perdeu a alteracao dele e tem que ser montado de novo
+            if self._atual is not None and versao == self._atual[1] + 1:
+                indice, _, criado_em = self._atual
+                aplicar(indice)
+                self._atual = (indice, versao, criado_em)
+            else:
+                self._atual = None
@@ -0,0 +1,172 @@
+import asyncio
+import statistics
+import tempfile
+import threading
+import time
+import types
+from pathlib import Path
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from UniCrossed.cache_sessoes import configurar_cache
+from accounts import conexoes, feed
+from accounts.models import CustomUser
+from accounts.urls import rotas_feed
+
+# cada cenario: metodo e caminho do request. {alvo} é trocado por um usuario diferente a cada swipe
+CENARIOS = {
+    'proximo_perfil': ('get', '/pegar-proximo-perfil/'),
+    'linkeds': ('get', '/api/linkeds/'),
+    'configuracoes': ('get', '/api/configuracoes/'),
+    'swipe': ('post', '/dislike/{alvo}/'),
+}
+
+# quantos links cada usuario do benchmark ja comeca tendo (pro /api/linkeds/ ter o que listar)
+LINKS_POR_USUARIO = 10
+
+
+def _urlconf(assincronas):
+    # so as rotas do feed, com as views sync ou as async (igual ao VIEWS_ASSINCRONAS desligado ou ligado)
+    modulo = types.ModuleType(f'benchmark_{"async" if assincronas else "sync"}')
+    modulo.urlpatterns = rotas_feed(assincronas)
+    return modulo
+
+
+def _popular(clientes, alvos):
+    # usuarios criados direto (sem hash de senha por usuario), o login é pelo force_login
+    senha = make_password(None)
+    CustomUser.objects.bulk_create([
+        CustomUser(username=f'benchmark{i}', email=f'benchmark{i}@teste.com', password=senha)
+        for i in range(clientes + alvos)])
+    ids = list(CustomUser.objects.order_by('id').values_list('id', flat=True))
+    usuarios, alvo_ids = ids[:clientes], ids[clientes:]
+    for usuario_id in usuarios:
+        conexoes.criar_links_em_lote(usuario_id, alvo_ids[:LINKS_POR_USUARIO])
+    return usuarios, alvo_ids[LINKS_POR_USUARIO:]
+
+
+def _caminhos(cenario, quantidade, alvos):
+    metodo, caminho = CENARIOS[cenario]
+    return [(metodo, caminho.format(alvo=alvo)) for alvo in alvos[:quantidade]]
+
+
+def _rodar_sync(clientes, listas):
+    # uma thread por cliente, como os workers de um servidor WSGI com threads
+    latencias = []
+
+    def trabalhador(cliente, lista):
+        try:
+            for metodo, caminho in lista:
+                inicio = time.perf_counter()
+                resposta = getattr(cliente, metodo)(caminho)
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    raise RuntimeError(f'{caminho} respondeu {resposta.status_code}')
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=trabalhador, args=par) for par in zip(clientes, listas)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - inicio, latencias
+
+
+async def _rodar_async(clientes, listas):
+    # todos os clientes no mesmo event loop. Cada um tem o seu ThreadSensitiveContext, como o ASGIHandler faz por request,
+    # entao o que ainda é sync (ORM) roda numa thread por cliente
+    latencias = []
+
+    async def trabalhador(cliente, lista):
+        async with ThreadSensitiveContext():
+            try:
+                for metodo, caminho in lista:
+                    inicio = time.perf_counter()
+                    resposta = await getattr(cliente, metodo)(caminho)
+                    latencias.append(time.perf_counter() - inicio)
+                    if resposta.status_code != 200:
+                        raise RuntimeError(f'{caminho} respondeu {resposta.status_code}')
+            finally:
+                # lambda pra pegar a conexao da thread do cliente (connection.close direto seria a da thread do loop)
+                await sync_to_async(lambda: connection.close())()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador(cliente, lista) for cliente, lista in zip(clientes, listas)))
+    return time.perf_counter() - inicio, latencias
+
+
+def _resumo(duracao, latencias):
+    latencias = sorted(latencias)
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if latencias else 0
+    return f'{len(latencias) / duracao:7.0f} req/s (p50 {statistics.median(latencias) * 1000:6.1f} ms, p95 {p95 * 1000:6.1f} ms)'
+
+
+class Command(BaseCommand):
+    help = ('Compara o throughput das views sync (handler WSGI) com o das async (handler ASGI) no feed, swipes, linkeds e '
+            'configuracoes, num banco de teste temporario')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes simultaneos')
+        parser.add_argument('--requisicoes', type=int, default=50, help='Requests por cliente em cada cenario')
+        parser.add_argument('--cenarios', nargs='+', choices=list(CENARIOS), default=list(CENARIOS))
+
+    def handle(self, *args, **options):
+        por_cliente = options['requisicoes']
+        with tempfile.TemporaryDirectory() as diretorio:
+            # banco de teste num arquivo (o padrao do SQLite é em memoria) pra ter o mesmo WAL/locks do banco de verdade
+            connection.settings_dict['TEST']['NAME'] = str(Path(diretorio) / 'benchmark.sqlite3')
+            nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                # cache so desse processo, pra nao misturar os cartoes dos usuarios do benchmark com os de verdade
+                with override_settings(
+                        DEBUG=False, ALLOWED_HOSTS=['testserver'], REPLICAS_BANCO=[],
+                        CACHES={'default': configurar_cache('locmem', local='benchmark')}):
+                    self.comparar(options['clientes'], por_cliente, options['cenarios'])
+            finally:
+                # espera as recargas de fila em segundo plano antes de apagar o banco
+                while feed._recargas_em_andamento:
+                    time.sleep(0.05)
+                connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+    def comparar(self, quantidade_clientes, por_cliente, cenarios):
+        # os swipes de cada rodada vao pra alvos diferentes (sync e async), senao a segunda so acharia "ja interagiu"
+        usuarios, alvos = _popular(quantidade_clientes, 2 * por_cliente)
+        alvos_por_rodada = {False: alvos[:por_cliente], True: alvos[por_cliente:]}
+
+        clientes_sync, clientes_async = [], []
+        for usuario in CustomUser.objects.filter(id__in=usuarios):
+            cliente = Client()
+            cliente.force_login(usuario)
+            cliente_async = AsyncClient()
+            cliente_async.cookies = cliente.cookies
+            clientes_sync.append(cliente)
+            clientes_async.append(cliente_async)
+
+        self.stdout.write(f'{quantidade_clientes} clientes simultaneos, {por_cliente} requests por cliente')
+        for cenario in cenarios:
+            resultados = {}
+            for assincronas in (False, True):
+                listas = [_caminhos(cenario, por_cliente, alvos_por_rodada[assincronas])] * quantidade_clientes
+                with override_settings(ROOT_URLCONF=_urlconf(assincronas)):
+                    # uma volta sem medir pra montar as filas e esquentar o cache dos cartoes (menos no swipe, que grava)
+                    if cenario != 'swipe':
+                        self.rodar(assincronas, clientes_sync, clientes_async, [lista[:1] for lista in listas])
+                    resultados[assincronas] = self.rodar(assincronas, clientes_sync, clientes_async, listas)
+
+            (duracao_sync, latencias_sync), (duracao_async, latencias_async) = resultados[False], resultados[True]
+            razao = (len(latencias_async) / duracao_async) / (len(latencias_sync) / duracao_sync)
+            self.stdout.write(
+                f'{cenario:>15}: sync {_resumo(duracao_sync, latencias_sync)} | '
+                f'async {_resumo(duracao_async, latencias_async)} | async/sync {razao:.2f}x')
+
+    def rodar(self, assincronas, clientes_sync, clientes_async, listas):
+        if assincronas:
+            return asyncio.run(_rodar_async(clientes_async, listas))
+        return _rodar_sync(clientes_sync, listas)
@@ -0,0 +1,90 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts import geo
+from accounts.models import CustomUser, Municipio
+from accounts.texto import normalizar
+
+TAMANHO_LOTE = 1000
+CAMPOS = ['nome', 'nome_normalizado', 'uf', 'latitude', 'longitude']
+
+
+def ler_json(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    # aceita tanto a lista direto quanto {"municipios": [...]}
+    return dados.get('municipios', []) if isinstance(dados, dict) else dados
+
+
+def ler_csv(caminho):
+    # colunas: codigo_ibge, nome, latitude, longitude e uf (sigla) ou codigo_uf
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        yield from csv.DictReader(arquivo)
+
+
+def recalcular_coordenadas_usuarios():
+    """Refaz latitude/longitude/geocelula de todos os usuarios pelo gazetteer atual, sem passar pelo save de cada um"""
+    coordenadas = {
+        (uf, nome): (latitude, longitude)
+        for uf, nome, latitude, longitude in Municipio.objects.values_list('uf', 'nome_normalizado', 'latitude', 'longitude')}
+
+    alterados = []
+    for usuario in CustomUser.objects.only('id', 'cidade', 'estado', 'latitude', 'longitude', 'geocelula').iterator(chunk_size=2000):
+        latitude, longitude = coordenadas.get((geo.sigla_uf(usuario.estado), normalizar(usuario.cidade).strip()), (None, None))
+        geocelula = geo.celula(latitude, longitude) if latitude is not None else None
+        if (usuario.latitude, usuario.longitude, usuario.geocelula) != (latitude, longitude, geocelula):
+            usuario.latitude, usuario.longitude, usuario.geocelula = latitude, longitude, geocelula
+            alterados.append(usuario)
+
+    CustomUser.objects.bulk_update(alterados, ['latitude', 'longitude', 'geocelula'], batch_size=TAMANHO_LOTE)
+    return len(alterados)
+
+
+class Command(BaseCommand):
+    help = 'Carrega (ou atualiza) o gazetteer de municipios a partir de um arquivo JSON ou CSV e recalcula as coordenadas dos usuarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .json ou .csv')
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f'Arquivo {caminho} não encontrado.')
+
+        if caminho.suffix.lower() == '.json':
+            registros = ler_json(caminho)
+        elif caminho.suffix.lower() == '.csv':
+            registros = ler_csv(caminho)
+        else:
+            raise CommandError('Formato não suportado, use .json ou .csv.')
+
+        municipios = {}
+        ignorados = 0
+        for registro in registros:
+            codigo = str(registro.get('codigo_ibge') or registro.get('codigo') or '').strip()
+            nome = (registro.get('nome') or '').strip()
+            uf = geo.sigla_uf(registro.get('uf') or registro.get('codigo_uf') or '')
+            try:
+                latitude, longitude = float(registro['latitude']), float(registro['longitude'])
+            except (KeyError, TypeError, ValueError):
+                latitude = longitude = None
+            if not codigo or not nome or not uf or latitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                ignorados += 1
+                continue
+            municipios[codigo] = Municipio(
+                codigo=codigo, nome=nome, nome_normalizado=normalizar(nome).strip(), uf=uf,
+                latitude=latitude, longitude=longitude)
+
+        with transaction.atomic():
+            # upsert pelo codigo IBGE
+            Municipio.objects.bulk_create(
+                municipios.values(), batch_size=TAMANHO_LOTE,
+                update_conflicts=True, unique_fields=['codigo'], update_fields=CAMPOS)
+            atualizados = recalcular_coordenadas_usuarios()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(municipios)} municípios carregados, {ignorados} ignorados, {atualizados} usuários com localização atualizada.'))
@@ -0,0 +1,105 @@
+import csv
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from accounts import cartoes, cursos
+from accounts.models import CustomUser, Curso, Universidade
+from accounts.universidades import TTL_INDICE, invalidar_indice
+
+TAMANHO_LOTE = 1000
+CAMPOS = ['nome', 'sigla', 'cidade', 'estado', 'cursos']
+
+
+def ler_json(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+    # aceita tanto a lista direto quanto {"universidades": [...]}
+    return dados.get('universidades', []) if isinstance(dados, dict) else dados
+
+
+def ler_csv(caminho):
+    # colunas: id, nome, sigla, cidade, estado, cursos (cursos separados por ";")
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        for linha in csv.DictReader(arquivo):
+            linha['cursos'] = [c.strip() for c in (linha.get('cursos') or '').split(';') if c.strip()]
+            yield linha
+
+
+class Command(BaseCommand):
+    help = 'Carrega (ou atualiza) o catalogo de universidades a partir de um arquivo JSON ou CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .json ou .csv')
+        parser.add_argument('--limpar', action='store_true', help='Apaga as universidades que nao estao no arquivo')
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f'Arquivo {caminho} não encontrado.')
+
+        if caminho.suffix.lower() == '.json':
+            registros = ler_json(caminho)
+        elif caminho.suffix.lower() == '.csv':
+            registros = ler_csv(caminho)
+        else:
+            raise CommandError('Formato não suportado, use .json ou .csv.')
+
+        universidades = {}
+        for registro in registros:
+            codigo = str(registro.get('id') or '').strip()
+            nome = (registro.get('nome') or '').strip()
+            if not codigo or not nome:
+                continue
+            universidades[codigo] = Universidade(
+                codigo=codigo,
+                nome=nome,
+                sigla=(registro.get('sigla') or '').strip(),
+                cidade=(registro.get('cidade') or '').strip(),
+                estado=(registro.get('estado') or '').strip(),
+                cursos=list(registro.get('cursos') or []))
+
+        with transaction.atomic():
+            # upsert pelo codigo: insere as novas e atualiza as que ja existem
+            Universidade.objects.bulk_create(
+                universidades.values(), batch_size=TAMANHO_LOTE,
+                update_conflicts=True, unique_fields=['codigo'], update_fields=CAMPOS)
+
+            apagadas = 0
+            if options['limpar']:
+                # compara em python pra nao mandar milhares de codigos num NOT IN
+                obsoletas = [i for i, codigo in Universidade.objects.values_list('id', 'codigo') if codigo not in universidades]
+                apagadas, _ = Universidade.objects.filter(id__in=obsoletas).delete()
+
+            # preenche o nome da universidade de quem so tinha o id salvo (o que a migration 0009 fazia pelo servico externo)
+            nome_universidade = Universidade.objects.filter(codigo=OuterRef('universidade')).values('nome')[:1]
+            sem_nome = CustomUser.objects.filter(
+                universidade__in=Universidade.objects.values('codigo'),
+                universidade_nome__in=['Não informado', 'Universidade não identificada', ''])
+            # o update nao passa pelos signals, entao os cartoes desses usuarios sao apagados na mao
+            usuarios_sem_nome = list(sem_nome.values_list('id', flat=True))
+            atualizados = sem_nome.update(universidade_nome=Subquery(nome_universidade))
+
+            # os cursos oferecidos entram no catalogo de cursos (o autocomplete de curso usa ele)
+            novos_cursos = {}
+            for universidade in universidades.values():
+                for nome_curso in universidade.cursos:
+                    normalizado = Curso.normalizar_nome(nome_curso)
+                    if normalizado:
+                        novos_cursos.setdefault(normalizado, Curso(nome=nome_curso.strip(), nome_normalizado=normalizado))
+            Curso.objects.bulk_create(novos_cursos.values(), batch_size=TAMANHO_LOTE, ignore_conflicts=True)
+
+        invalidar_indice()
+        cursos.invalidar_indice()
+        cartoes.invalidar(usuarios_sem_nome)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(universidades)} universidades carregadas, {apagadas} apagadas, {atualizados} usuários atualizados.'))
+        if settings.CACHE_TIPO == 'locmem':
+            # a versao dos indices fica no cache desse processo, o servidor nao ve a invalidacao
+            self.stderr.write(self.style.WARNING(
+                'Com UNICROSSED_CACHE=locmem o servidor só vê as universidades e cursos novos depois de '
+                f'{max(TTL_INDICE, cursos.TTL_INDICE)} segundos (ou reiniciando). Use UNICROSSED_CACHE=arquivo ou redis.'))
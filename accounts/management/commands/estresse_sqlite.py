@@ -0,0 +1,93 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+
+ALIAS = 'estresse_sqlite'
+
+# configuracao que o Django usa sem nada no OPTIONS (rollback journal, BEGIN DEFERRED, 5s de timeout) e a do settings
+CONFIGURACOES = {
+    'padrao': {},
+    'otimizada': settings.DATABASES['default'].get('OPTIONS', {}),
+}
+
+
+def _conectar(caminho, opcoes):
+    config = {**connections['default'].settings_dict, 'NAME': str(caminho), 'OPTIONS': dict(opcoes), 'CONN_MAX_AGE': None}
+    return DatabaseWrapper(config, alias=ALIAS)
+
+
+def _preparar_banco(caminho, opcoes):
+    conexao = _conectar(caminho, opcoes)
+    with conexao.cursor() as cursor:
+        cursor.execute('CREATE TABLE interacao (id INTEGER PRIMARY KEY, de INTEGER, para INTEGER, UNIQUE (de, para))')
+        cursor.execute('CREATE TABLE fila (usuario INTEGER PRIMARY KEY, posicao INTEGER)')
+        cursor.executemany('INSERT INTO fila VALUES (%s, 0)', [(i,) for i in range(64)])
+    conexao.close()
+
+
+def _escritor(caminho, opcoes, usuario, escritas, resultado, largada):
+    # cada thread tem a sua conexao (igual a um request do runserver) e faz transacoes no formato de um swipe:
+    # le se ja existe a interacao, grava ela e anda a fila do usuario, tudo num atomic
+    conexao = _conectar(caminho, opcoes)
+    connections[ALIAS] = conexao
+    largada.wait()
+    ok = travadas = 0
+    try:
+        for alvo in range(escritas):
+            try:
+                with transaction.atomic(using=ALIAS), conexao.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM interacao WHERE de = %s AND para = %s', [usuario, alvo])
+                    if not cursor.fetchone()[0]:
+                        cursor.execute('INSERT INTO interacao (de, para) VALUES (%s, %s)', [usuario, alvo])
+                    cursor.execute('UPDATE fila SET posicao = posicao + 1 WHERE usuario = %s', [usuario])
+                ok += 1
+            except OperationalError as erro:
+                if 'locked' not in str(erro):
+                    raise
+                travadas += 1
+    finally:
+        conexao.close()
+        resultado.append((ok, travadas))
+
+
+def medir_travamentos(opcoes, threads=8, escritas=100):
+    """Roda `threads` escritores em paralelo num SQLite temporario. Retorna (transacoes ok, transacoes com "database is locked")"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = Path(diretorio) / 'estresse.sqlite3'
+        _preparar_banco(caminho, opcoes)
+
+        resultado = []
+        largada = threading.Barrier(threads)
+        escritores = [
+            threading.Thread(target=_escritor, args=(caminho, opcoes, usuario, escritas, resultado, largada))
+            for usuario in range(threads)]
+        for escritor in escritores:
+            escritor.start()
+        for escritor in escritores:
+            escritor.join()
+
+    return sum(ok for ok, travadas in resultado), sum(travadas for ok, travadas in resultado)
+
+
+class Command(BaseCommand):
+    help = 'Mede a taxa de "database is locked" com escritores em paralelo, na configuracao padrao do SQLite e na do settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--escritas', type=int, default=200, help='Transacoes por thread')
+
+    def handle(self, *args, **options):
+        for nome, opcoes in CONFIGURACOES.items():
+            inicio = time.perf_counter()
+            ok, travadas = medir_travamentos(opcoes, options['threads'], options['escritas'])
+            duracao = time.perf_counter() - inicio
+            total = ok + travadas
+            self.stdout.write(
+                f'{nome:>10}: {ok}/{total} transações ok, {travadas} travadas ({travadas / total:.1%}), '
+                f'{ok / duracao:.0f} transações/s')
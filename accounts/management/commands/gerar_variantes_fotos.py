@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts import imagens, tarefas
+from accounts.models import FotosUsuario
+
+
+class Command(BaseCommand):
+    help = ('Coloca na fila de tarefas a geracao das miniaturas (accounts/imagens.py) das fotos que ainda nao tem, ex: '
+            'fotos enviadas antes das variantes existirem. Quem executa é o processar_tarefas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Regera tambem as que ja tem variantes (ex: depois de mudar tamanhos ou formatos)')
+
+    def handle(self, *args, **options):
+        fotos = FotosUsuario.objects.all() if options['todas'] else FotosUsuario.objects.filter(variantes={})
+        total = 0
+        for foto_id in fotos.values_list('id', flat=True).iterator(chunk_size=1000):
+            tarefas.enfileirar(imagens.processar_foto, foto_id=foto_id)
+            total += 1
+        self.stdout.write(f'{total} fotos na fila')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts import tarefas
+
+
+class Command(BaseCommand):
+    help = ('Worker da fila de tarefas em segundo plano (accounts/tarefas.py): executa as tarefas pendentes num pool de '
+            'threads e fica esperando as novas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Tarefas executadas ao mesmo tempo')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera quando a fila ta vazia antes de olhar de novo')
+        parser.add_argument('--uma-vez', action='store_true', help='Executa o que ta vencido e sai (pra cron)')
+
+    def handle(self, *args, **options):
+        def terminou(tarefa):
+            if tarefa.status == tarefa.FALHOU:
+                self.stderr.write(f'{tarefa} desistiu depois de {tarefa.tentativas} tentativas')
+
+        tarefas.processar(
+            max(options['threads'], 1), intervalo=options['intervalo'], uma_vez=options['uma_vez'], ao_terminar=terminou)
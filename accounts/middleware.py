@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import roteador
+
+# relatorio em memoria com os ultimos requests perfilados (o mais antigo sai quando enche)
+HISTORICO_CONSULTAS = deque(maxlen=getattr(settings, 'PERFILADOR_CONSULTAS_HISTORICO', 200))
+_trava_historico = threading.Lock()
+
+# a partir de quantas repeticoes da mesma consulta a gente considera N+1
+LIMITE_DUPLICADAS = getattr(settings, 'PERFILADOR_CONSULTAS_LIMITE_DUPLICADAS', 2)
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_RE_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+
+
+def impressao_digital_sql(sql):
+    # tira os valores do SQL pra que a mesma consulta com parametros diferentes caia no mesmo "fingerprint"
+    sql = _RE_SAVEPOINT.sub('"sp"', sql)
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class ColetorConsultas:
+    # execute_wrapper que anota cada consulta feita durante o request
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, time.perf_counter() - inicio))
+
+    def tempo_total(self):
+        return sum(duracao for sql, duracao in self.consultas)
+
+    def duplicadas(self):
+        contagem = Counter(impressao_digital_sql(sql) for sql, duracao in self.consultas)
+        return [{'sql': sql, 'vezes': vezes} for sql, vezes in contagem.most_common() if vezes >= LIMITE_DUPLICADAS]
+
+
+class PerfiladorConsultasMiddleware:
+    """Mede as consultas de cada request (quantidade, tempo no banco e SQL repetido) quando PERFILADOR_CONSULTAS esta ligado"""
+
+    # funciona nas duas cadeias: um middleware so sync faria o ASGI rodar o request inteiro numa thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADOR_CONSULTAS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+
+        with ExitStack() as pilha:
+            self.instalar_coletor(pilha, coletor)
+            response = self.get_response(request)
+
+        return self.registrar(request, response, coletor, inicio)
+
+    async def __acall__(self, request):
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+
+        # as conexoes sao por thread e as consultas das views async rodam na thread do sync_to_async (a mesma pro request
+        # inteiro), entao o coletor é instalado e tirado la
+        pilha = ExitStack()
+        await sync_to_async(self.instalar_coletor)(pilha, coletor)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pilha.close)()
+
+        return self.registrar(request, response, coletor, inicio)
+
+    @staticmethod
+    def instalar_coletor(pilha, coletor):
+        for alias in connections:
+            pilha.enter_context(connections[alias].execute_wrapper(coletor))
+
+    def registrar(self, request, response, coletor, inicio):
+        tempo_total = time.perf_counter() - inicio
+        tempo_db = coletor.tempo_total()
+        duplicadas = coletor.duplicadas()
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={tempo_db * 1000:.2f};desc="{len(coletor.consultas)} consultas"',
+            f'dup;desc="{len(duplicadas)} consultas repetidas"',
+            f'total;dur={tempo_total * 1000:.2f}'])
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        with _trava_historico:
+            HISTORICO_CONSULTAS.append({
+                'view': resolver_match.view_name if resolver_match else None,
+                'path': request.path,
+                'metodo': request.method,
+                'status': response.status_code,
+                'consultas': len(coletor.consultas),
+                'tempo_db_ms': round(tempo_db * 1000, 2),
+                'tempo_total_ms': round(tempo_total * 1000, 2),
+                'duplicadas': duplicadas,
+                'quando': time.time(),
+            })
+
+        return response
+
+
+class FixarPrimarioMiddleware:
+    """Read-your-writes com replicas: depois que um request escreve no banco, as leituras daquele usuario vao pro primario
+    por REPLICAS_JANELA_PRIMARIO segundos (marcado num cookie, entao vale pra qualquer processo). Sem replicas nem entra"""
+
+    COOKIE = 'primario_ate'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REPLICAS_BANCO', []):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.janela = getattr(settings, 'REPLICAS_JANELA_PRIMARIO', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = roteador.iniciar_request(self.fixado(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            estado = roteador.finalizar_request(token)
+        return self.marcar(request, response, estado)
+
+    async def __acall__(self, request):
+        # o estado fica numa ContextVar, que o sync_to_async leva junto pra thread onde o ORM roda
+        token = roteador.iniciar_request(self.fixado(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            estado = roteador.finalizar_request(token)
+        return self.marcar(request, response, estado)
+
+    def fixado(self, request):
+        # POST/PUT/DELETE le tudo do primario: o swipe, por exemplo, grava por SQL direto (sem passar pelo roteador) e
+        # depois le a fila do feed
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return True
+        try:
+            return float(request.COOKIES.get(self.COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def marcar(self, request, response, estado):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or estado.escreveu:
+            response.set_cookie(self.COOKIE, f'{time.time() + self.janela:.3f}', max_age=self.janela, httponly=True, samesite='Lax')
+        return response
+
+
+def relatorio_consultas():
+    """Resume o historico por view: quantos requests, media e maximo de consultas e quantos tiveram SQL repetido"""
+    with _trava_historico:
+        historico = list(HISTORICO_CONSULTAS)
+
+    por_view = {}
+    for registro in historico:
+        resumo = por_view.setdefault(registro['view'] or registro['path'], {
+            'requests': 0, 'consultas_total': 0, 'consultas_max': 0, 'tempo_db_ms_total': 0, 'requests_com_duplicadas': 0})
+        resumo['requests'] += 1
+        resumo['consultas_total'] += registro['consultas']
+        resumo['consultas_max'] = max(resumo['consultas_max'], registro['consultas'])
+        resumo['tempo_db_ms_total'] += registro['tempo_db_ms']
+        if registro['duplicadas']:
+            resumo['requests_com_duplicadas'] += 1
+
+    for resumo in por_view.values():
+        resumo['consultas_media'] = round(resumo['consultas_total'] / resumo['requests'], 2)
+        resumo['tempo_db_ms_medio'] = round(resumo.pop('tempo_db_ms_total') / resumo['requests'], 2)
+
+    return {'por_view': por_view, 'recentes': historico[-50:][::-1]}
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_configuracoesusuario_notificacao_eventos_grupos_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilaCandidatos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ids', models.TextField(blank=True, default='', help_text='Comma-separated list of candidate user ids')),
+                ('posicao', models.PositiveIntegerField(default=0)),
+                ('esgotada', models.BooleanField(default=False)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fila_candidatos', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Tabela unica de interacoes, com os dados copiados de Like, Superlike e Dislike
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# se o mesmo par tiver mais de uma interacao (as tabelas antigas nao tinham unique), fica a mais "forte"
+PRIORIDADE = {'superlike': 0, 'like': 1, 'dislike': 2}
+
+
+def copiar_interacoes(apps, schema_editor):
+    Interacao = apps.get_model('accounts', 'Interacao')
+    origens = [
+        ('superlike', apps.get_model('accounts', 'Superlike')),
+        ('like', apps.get_model('accounts', 'Like')),
+        ('dislike', apps.get_model('accounts', 'Dislike')),
+    ]
+
+    por_par = {}
+    for tipo, modelo in origens:
+        for linha in modelo.objects.all().iterator(chunk_size=2000):
+            par = (linha.de_usuario_id, linha.para_usuario_id)
+            atual = por_par.get(par)
+            if atual is None or PRIORIDADE[tipo] < PRIORIDADE[atual[0]]:
+                por_par[par] = (tipo, getattr(linha, 'mensagem', ''), linha.data_realizacao)
+
+    novas = [
+        Interacao(de_usuario_id=de, para_usuario_id=para, tipo=tipo, mensagem=mensagem, data_realizacao=data)
+        for (de, para), (tipo, mensagem, data) in por_par.items()]
+    Interacao.objects.bulk_create(novas, batch_size=2000)
+
+    # auto_now_add sobrescreve a data no insert, entao restaura a data original: um UPDATE por tabela antiga, com a data
+    # da linha de origem do par (a primeira, igual ao por_par quando o par tinha repetida do mesmo tipo)
+    for tipo, modelo in origens:
+        Interacao.objects.filter(tipo=tipo).update(data_realizacao=Subquery(modelo.objects.filter(
+            de_usuario_id=OuterRef('de_usuario_id'), para_usuario_id=OuterRef('para_usuario_id')
+        ).order_by('pk').values('data_realizacao')[:1]))
+
+
+def voltar_interacoes(apps, schema_editor):
+    Interacao = apps.get_model('accounts', 'Interacao')
+    destinos = {
+        'like': apps.get_model('accounts', 'Like'),
+        'superlike': apps.get_model('accounts', 'Superlike'),
+        'dislike': apps.get_model('accounts', 'Dislike'),
+    }
+    # as tabelas antigas voltam vazias (a volta da 0015 recria elas), entao o UPDATE da data pode pegar a tabela inteira
+    for tipo, modelo in destinos.items():
+        interacoes = Interacao.objects.filter(tipo=tipo)
+        novas = []
+        for interacao in interacoes.iterator(chunk_size=2000):
+            campos = {'de_usuario_id': interacao.de_usuario_id, 'para_usuario_id': interacao.para_usuario_id}
+            if tipo == 'superlike':
+                campos['mensagem'] = interacao.mensagem
+            novas.append(modelo(**campos))
+        modelo.objects.bulk_create(novas, batch_size=2000)
+        modelo.objects.update(data_realizacao=Subquery(interacoes.filter(
+            de_usuario_id=OuterRef('de_usuario_id'), para_usuario_id=OuterRef('para_usuario_id')
+        ).values('data_realizacao')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_filacandidatos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Interacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('like', 'Like'), ('superlike', 'Superlike'), ('dislike', 'Dislike')], max_length=10)),
+                ('mensagem', models.CharField(blank=True, default='', max_length=500)),
+                ('data_realizacao', models.DateTimeField(auto_now_add=True)),
+                ('de_usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='interacoes_feitas', to=settings.AUTH_USER_MODEL)),
+                ('para_usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='interacoes_recebidas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['para_usuario', 'de_usuario'], name='interacao_par_inverso_idx')],
+                'constraints': [models.UniqueConstraint(fields=('de_usuario', 'para_usuario'), name='interacao_unica_por_par')],
+            },
+        ),
+        migrations.RunPython(copiar_interacoes, voltar_interacoes),
+    ]
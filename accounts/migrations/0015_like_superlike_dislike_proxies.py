@@ -0,0 +1,55 @@
+# Like, Superlike e Dislike viram proxies da tabela unica de interacoes
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_interacao'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Dislike',
+        ),
+        migrations.DeleteModel(
+            name='Like',
+        ),
+        migrations.DeleteModel(
+            name='Superlike',
+        ),
+        migrations.CreateModel(
+            name='Dislike',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('accounts.interacao',),
+        ),
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('accounts.interacao',),
+        ),
+        migrations.CreateModel(
+            name='Superlike',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('accounts.interacao',),
+        ),
+    ]
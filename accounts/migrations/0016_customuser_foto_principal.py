@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+import accounts.models
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_foto_principal(apps, schema_editor):
+    # aponta cada usuario pra foto marcada como foto de perfil (a primeira pela ordem, se tiver mais de uma)
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    FotosUsuario = apps.get_model('accounts', 'FotosUsuario')
+    foto_perfil = FotosUsuario.objects.filter(
+        user=OuterRef('pk'), foto_perfil=True).order_by('ordem', '-data_upload').values('pk')[:1]
+    CustomUser.objects.update(foto_principal=Subquery(foto_perfil))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_like_superlike_dislike_proxies'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', accounts.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='foto_principal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.fotosusuario'),
+        ),
+        migrations.RunPython(preencher_foto_principal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalizar_links(apps, schema_editor):
+    # deixa todo link com o menor id no usuario1, apaga os repetidos (joao e maria + maria e joao, fica o mais antigo)
+    # e os links de um usuario com ele mesmo, e grava as duas conexoes de cada link
+    Linkeds = apps.get_model('accounts', 'Linkeds')
+    Conexao = apps.get_model('accounts', 'Conexao')
+
+    mantidos = {}
+    repetidos = []
+    for link in Linkeds.objects.order_by('data_realizacao', 'id'):
+        par = tuple(sorted([link.usuario1_id, link.usuario2_id]))
+        if par in mantidos or par[0] == par[1]:
+            repetidos.append(link.id)
+        else:
+            mantidos[par] = link
+    Linkeds.objects.filter(id__in=repetidos).delete()
+
+    for (usuario1_id, usuario2_id), link in mantidos.items():
+        if link.usuario1_id != usuario1_id:
+            Linkeds.objects.filter(id=link.id).update(usuario1_id=usuario1_id, usuario2_id=usuario2_id)
+
+    Conexao.objects.bulk_create([
+        Conexao(usuario_id=usuario_id, conectado_id=conectado_id, link_id=link.id, data_realizacao=link.data_realizacao)
+        for (usuario1_id, usuario2_id), link in mantidos.items()
+        for usuario_id, conectado_id in ((usuario1_id, usuario2_id), (usuario2_id, usuario1_id))], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_customuser_foto_principal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conexao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_realizacao', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conexao',
+            name='conectado',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conexao',
+            name='link',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conexoes', to='accounts.linkeds'),
+        ),
+        migrations.AddField(
+            model_name='conexao',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='conexoes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='conexao',
+            index=models.Index(fields=['usuario', '-data_realizacao', '-id'], name='conexao_usuario_recentes_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conexao',
+            constraint=models.UniqueConstraint(fields=('usuario', 'conectado'), name='conexao_unica_por_par'),
+        ),
+        migrations.RunPython(normalizar_links, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='linkeds',
+            constraint=models.CheckConstraint(condition=models.Q(('usuario1__lt', models.F('usuario2'))), name='linkeds_par_ordenado'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_conexao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Universidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=100, unique=True)),
+                ('nome', models.CharField(max_length=300)),
+                ('sigla', models.CharField(blank=True, default='', max_length=50)),
+                ('cidade', models.CharField(max_length=150)),
+                ('estado', models.CharField(max_length=50)),
+                ('cursos', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'cidade'], name='universidade_local_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:48
+
+import django.db.models.deletion
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+
+
+def normalizar_curso(nome):
+    # copia do accounts.texto da epoca (migracao nao importa codigo do app, que pode mudar depois): sem acento,
+    # minusculo e so letras/numeros separados por um espaco
+    nome = unicodedata.normalize('NFKD', nome or '')
+    nome = ''.join(c for c in nome if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in nome).split())
+
+
+def preencher_cursos(apps, schema_editor):
+    # junta os cursos digitados que so mudam por acento/maiuscula/pontuacao num curso so do catalogo. o nome que fica
+    # é a grafia mais usada do grupo
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Curso = apps.get_model('accounts', 'Curso')
+
+    usuarios_por_curso = defaultdict(list)
+    grafias = defaultdict(Counter)
+    for usuario_id, curso in CustomUser.objects.values_list('id', 'curso').iterator():
+        normalizado = normalizar_curso(curso)
+        if not normalizado or normalizado == 'nao informado':
+            continue
+        usuarios_por_curso[normalizado].append(usuario_id)
+        grafias[normalizado][curso.strip()] += 1
+
+    Curso.objects.bulk_create([
+        Curso(nome=grafias[normalizado].most_common(1)[0][0], nome_normalizado=normalizado)
+        for normalizado in usuarios_por_curso], batch_size=500)
+
+    for curso in Curso.objects.all():
+        CustomUser.objects.filter(id__in=usuarios_por_curso[curso.nome_normalizado]).update(curso_canonico=curso)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_universidade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Curso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('nome_normalizado', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='curso_canonico',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alunos', to='accounts.curso'),
+        ),
+        migrations.RunPython(preencher_cursos, migrations.RunPython.noop),
+    ]
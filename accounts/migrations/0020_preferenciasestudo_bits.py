@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+import accounts.models
+from django.db import migrations
+
+# ordem das choices no momento da migration (bit i = i-esima opcao)
+CAMPOS_BITS = {
+    'dia_semana': ('dia_semana_bits', ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']),
+    'horario': ('horario_bits', ['manha', 'tarde', 'noite']),
+    'metodo_preferido': ('metodo_preferido_bits', ['online', 'presencial', 'grupo'])}
+
+
+def preencher_mascaras(apps, schema_editor):
+    PreferenciasEstudo = apps.get_model('accounts', 'PreferenciasEstudo')
+
+    campos = [campo_bits for campo_bits, escolhas in CAMPOS_BITS.values()]
+    alteradas = []
+    for preferencias in PreferenciasEstudo.objects.iterator(chunk_size=1000):
+        for campo, (campo_bits, escolhas) in CAMPOS_BITS.items():
+            valores = getattr(preferencias, campo) or []
+            if isinstance(valores, str):
+                valores = valores.split(',')
+            setattr(preferencias, campo_bits, sum(1 << i for i, valor in enumerate(escolhas) if valor in valores))
+        alteradas.append(preferencias)
+        if len(alteradas) == 1000:
+            PreferenciasEstudo.objects.bulk_update(alteradas, campos)
+            alteradas = []
+
+    PreferenciasEstudo.objects.bulk_update(alteradas, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_curso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='preferenciasestudo',
+            name='dia_semana_bits',
+            field=accounts.models.MascaraBitsField(default=0),
+        ),
+        migrations.AddField(
+            model_name='preferenciasestudo',
+            name='horario_bits',
+            field=accounts.models.MascaraBitsField(default=0),
+        ),
+        migrations.AddField(
+            model_name='preferenciasestudo',
+            name='metodo_preferido_bits',
+            field=accounts.models.MascaraBitsField(default=0),
+        ),
+        migrations.RunPython(preencher_mascaras, migrations.RunPython.noop),
+    ]
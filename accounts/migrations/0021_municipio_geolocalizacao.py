@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_preferenciasestudo_bits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='geocelula',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Municipio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=20, unique=True)),
+                ('nome', models.CharField(max_length=150)),
+                ('nome_normalizado', models.CharField(max_length=150)),
+                ('uf', models.CharField(max_length=2)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['uf', 'nome_normalizado'], name='municipio_uf_nome_idx')],
+            },
+        ),
+    ]
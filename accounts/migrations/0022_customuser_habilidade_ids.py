@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+def preencher_habilidade_ids(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Relacao = CustomUser.habilidades.through
+
+    habilidades = {}
+    for usuario_id, habilidade_id in Relacao.objects.order_by('customuser_id', 'habilidades_id').values_list(
+            'customuser_id', 'habilidades_id').iterator(chunk_size=2000):
+        habilidades.setdefault(usuario_id, []).append(habilidade_id)
+
+    usuarios = [CustomUser(id=usuario_id, habilidade_ids=ids) for usuario_id, ids in habilidades.items()]
+    CustomUser.objects.bulk_update(usuarios, ['habilidade_ids'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_municipio_geolocalizacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='habilidade_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(preencher_habilidade_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fotosusuario',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
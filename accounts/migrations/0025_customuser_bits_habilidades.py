@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+def preencher_bits_habilidades(apps, schema_editor):
+    # mesmo bitset do compatibilidade.bytes_habilidades (habilidade X liga o bit X, em palavras de 64 bits), copiado aqui
+    # porque a migracao nao pode depender do codigo do app
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    usuarios = []
+    for usuario in CustomUser.objects.exclude(habilidade_ids=[]).only('id', 'habilidade_ids').iterator(chunk_size=2000):
+        bits = 0
+        for habilidade_id in usuario.habilidade_ids or ():
+            bits |= 1 << habilidade_id
+        usuario.bits_habilidades = bits.to_bytes(-(-bits.bit_length() // 64) * 8, 'little')
+        usuarios.append(usuario)
+    CustomUser.objects.bulk_update(usuarios, ['bits_habilidades'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_fotosusuario_variantes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='bits_habilidades',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(preencher_bits_habilidades, migrations.RunPython.noop),
+    ]
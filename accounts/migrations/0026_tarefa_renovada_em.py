@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copiar_iniciada_em(apps, schema_editor):
+    # as que ja tao executando comecam com o lease de quando foram reservadas
+    Tarefa = apps.get_model('accounts', 'Tarefa')
+    Tarefa.objects.filter(status='executando').update(renovada_em=F('iniciada_em'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_customuser_bits_habilidades'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='renovada_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copiar_iniciada_em, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_tarefa_renovada_em'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aparelhosms',
+            name='token_valido_ate',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='prioridade',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['status', 'prioridade', 'executar_em'], name='tarefa_prioritaria_idx'),
+        ),
+    ]
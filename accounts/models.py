@@ -1,12 +1,19 @@
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.cache import cache
+from django.core.mail import mail_admins
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django_otp.models import Device
 from django_otp.oath import hotp
 import secrets
+from datetime import timedelta
 from multiselectfield import MultiSelectField
+from .texto import normalizar, palavras
+from . import geo
 
 class Habilidades(models.Model):
     # user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='habilidades')
@@ -16,6 +23,77 @@ class Habilidades(models.Model):
     def __str__(self):
         return self.nome
 
+class Curso(models.Model):
+    # catalogo de cursos, um por nome normalizado (sem acento, minusculo), pra "Ciência da Computação" e
+    # "ciencia da computacao" serem o mesmo curso
+    nome = models.CharField(max_length=100)
+    nome_normalizado = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.nome
+
+    @staticmethod
+    def normalizar_nome(nome):
+        normalizado = ' '.join(palavras(nome))
+        return '' if normalizado == 'nao informado' else normalizado
+
+    @classmethod
+    def do_texto(cls, nome):
+        # pega (ou cria) o curso do catalogo pro texto digitado, None se nao tiver curso
+        normalizado = cls.normalizar_nome(nome)
+        if not normalizado:
+            return None
+        curso, criado = cls.objects.get_or_create(nome_normalizado=normalizado, defaults={'nome': nome.strip()})
+        return curso
+
+class Municipio(models.Model):
+    # gazetteer local dos municipios (carregado pelo comando carregar_municipios), de onde saem as coordenadas dos usuarios
+    codigo = models.CharField(max_length=20, unique=True)  # codigo IBGE
+    nome = models.CharField(max_length=150)
+    nome_normalizado = models.CharField(max_length=150)
+    uf = models.CharField(max_length=2)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['uf', 'nome_normalizado'], name='municipio_uf_nome_idx')]
+
+    def __str__(self):
+        return f"{self.nome}/{self.uf}"
+
+    @classmethod
+    def coordenadas(cls, cidade, estado):
+        # (latitude, longitude) da cidade digitada, ou None se nao estiver no gazetteer
+        uf = geo.sigla_uf(estado)
+        nome = normalizar(cidade).strip()
+        if not uf or not nome or nome == 'nao informado':
+            return None
+        return cls.objects.filter(uf=uf, nome_normalizado=nome).values_list('latitude', 'longitude').first()
+
+class CustomUserQuerySet(models.QuerySet):
+    def com_foto_principal(self):
+        # traz a foto principal junto no mesmo SELECT (JOIN), pra listar varios usuarios sem uma consulta por foto
+        return self.select_related('foto_principal')
+
+    def disponiveis_junto_com(self, preferencias):
+        # usuarios com pelo menos um dia e um horario de estudo em comum (ex: "tem alguma noite livre comigo")
+        return self.filter(
+            preferencias_estudo__dia_semana_bits__algum_bit=preferencias.dia_semana_bits,
+            preferencias_estudo__horario_bits__algum_bit=preferencias.horario_bits)
+
+    def no_raio(self, latitude, longitude, raio_km, incluir_sem_localizacao=False):
+        # usuarios a ate raio_km do ponto. a geocelula (indexada) corta a maior parte antes do calculo da distancia
+        filtro = geo.filtro_no_raio(latitude, longitude, raio_km)
+        if incluir_sem_localizacao:
+            filtro |= models.Q(geocelula__isnull=True)
+        return self.alias(distancia_km=geo.expressao_distancia(latitude, longitude)).filter(filtro)
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
     username = models.CharField(max_length=150, unique=True, default='Não informado')
     data_nascimento = models.DateField(blank=True, null=True)
@@ -26,10 +104,25 @@ class CustomUser(AbstractUser):
     universidade = models.CharField(max_length=100, default='Não informado')  
     universidade_nome = models.CharField(max_length=200, default='Não informado') 
     curso = models.CharField(max_length=100, default='Não informado')
+    # curso do catalogo que corresponde ao texto do curso, mantido pelo save
+    curso_canonico = models.ForeignKey(Curso, on_delete=models.SET_NULL, null=True, blank=True, related_name='alunos')
     bio = models.TextField(blank=True, null=True)
     habilidades = models.ManyToManyField(Habilidades, blank=True)
+    # ids das habilidades (ordenados), copia do M2M mantida pelo signal m2m_changed, pro card nao precisar consultar o M2M
+    habilidade_ids = models.JSONField(default=list, blank=True)
+    # as mesmas habilidades no bitset do ranking do feed (compatibilidade.bytes_habilidades), mantido junto com a coluna
+    # acima, pro ranking carregar milhares de candidatos sem decodificar JSON nem codificar nada em python
+    bits_habilidades = models.BinaryField(default=b'', blank=True)
     semestre = models.PositiveIntegerField(blank=True, null=True, default=1)
     celular = models.CharField(max_length=20, blank=True, default='Não informado')
+    # ponteiro pra foto de perfil atual, mantido pelo FotosUsuario.save e pelo signal de delete das fotos
+    foto_principal = models.ForeignKey('FotosUsuario', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # coordenadas da cidade (do gazetteer de municipios) e a celula da grade delas, mantidas pelo save
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geocelula = models.IntegerField(null=True, blank=True, db_index=True)
+
+    objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -38,13 +131,51 @@ class CustomUser(AbstractUser):
         return self.username
     
     def get_foto_perfil(self):
-        return self.fotos.filter(foto_perfil=True).first()
+        # usa o ponteiro denormalizado, se o usuario veio com select_related('foto_principal') nao faz nenhuma consulta
+        return self.foto_principal if self.foto_principal_id else None
+
+    def nomes_habilidades(self):
+        # nomes pela coluna habilidade_ids e pelo indice em memoria, sem consulta no M2M
+        from .indice_habilidades import obter_indice
+        return obter_indice().nomes_de(self.habilidade_ids or [])
     
     def save(self, *args, **kwargs):
         # Handle empty phone number
         if not self.celular or self.celular.strip() == '':
             self.celular = 'Não Informado'
+        self.sincronizar_curso(kwargs)
+        self.sincronizar_localizacao(kwargs)
         super().save(*args, **kwargs)
+
+    def sincronizar_localizacao(self, kwargs_save):
+        # resolve a cidade/estado nas coordenadas do gazetteer (so quando a cidade ou o estado vao ser salvos)
+        # o signal de post_save olha isso pra refazer a fila de quem mudou de cidade
+        self._localizacao_alterada = False
+        update_fields = kwargs_save.get('update_fields')
+        if update_fields is not None and not {'cidade', 'estado'} & set(update_fields):
+            return
+
+        coordenadas = Municipio.coordenadas(self.cidade, self.estado) or (None, None)
+        self._localizacao_alterada = self.pk is not None and (self.latitude, self.longitude) != tuple(coordenadas)
+        self.latitude, self.longitude = coordenadas
+        self.geocelula = geo.celula(*coordenadas) if self.latitude is not None else None
+        if update_fields is not None:
+            kwargs_save['update_fields'] = set(kwargs_save['update_fields']) | {'latitude', 'longitude', 'geocelula'}
+
+    def sincronizar_curso(self, kwargs_save):
+        # so mexe no curso_canonico se o curso vai ser salvo (save com update_fields sem o curso nao conta)
+        update_fields = kwargs_save.get('update_fields')
+        if update_fields is not None and 'curso' not in update_fields:
+            return
+
+        # se o curso do catalogo ja ta carregado e bate com o texto, nao precisa consultar
+        if CustomUser.curso_canonico.is_cached(self) and self.curso_canonico and \
+                self.curso_canonico.nome_normalizado == Curso.normalizar_nome(self.curso):
+            return
+
+        self.curso_canonico = Curso.do_texto(self.curso)
+        if update_fields is not None:
+            kwargs_save['update_fields'] = set(update_fields) | {'curso_canonico'}
     
     def get_formatted_phone(self):
         """Returns formatted phone or None if not provided"""
@@ -56,6 +187,49 @@ class CustomUser(AbstractUser):
         """Check if user has provided a phone number"""
         return self.celular and self.celular != 'Não Informado'
 
+class MascaraBitsField(models.PositiveSmallIntegerField):
+    # inteiro usado como conjunto de bits (bit i ligado = i-esima opcao marcada), com os lookups algum_bit e todos_bits
+    pass
+
+
+@MascaraBitsField.register_lookup
+class AlgumBit(models.Lookup):
+    # campo__algum_bit=mascara -> (campo & mascara) != 0, ou seja, tem pelo menos uma opcao da mascara
+    lookup_name = 'algum_bit'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) != 0', [*lhs_params, *rhs_params]
+
+
+@MascaraBitsField.register_lookup
+class TodosBits(models.Lookup):
+    # campo__todos_bits=mascara -> (campo & mascara) = mascara, ou seja, tem todas as opcoes da mascara
+    lookup_name = 'todos_bits'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) = {rhs}', [*lhs_params, *rhs_params, *rhs_params]
+
+
+class PreferenciasEstudoQuerySet(models.QuerySet):
+    # filtros de disponibilidade em cima das mascaras, viram "&" no SQL em vez de LIKE no texto separado por virgula
+    def com_dia_em_comum(self, mascara):
+        return self.filter(dia_semana_bits__algum_bit=mascara)
+
+    def com_horario_em_comum(self, mascara):
+        return self.filter(horario_bits__algum_bit=mascara)
+
+    def com_metodo_em_comum(self, mascara):
+        return self.filter(metodo_preferido_bits__algum_bit=mascara)
+
+    def compativeis_com(self, preferencias):
+        # pelo menos um dia e um horario em comum com as preferencias informadas
+        return self.com_dia_em_comum(preferencias.dia_semana_bits).com_horario_em_comum(preferencias.horario_bits)
+
+
 class PreferenciasEstudo(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='preferencias_estudo')
     DIAS_DISPONIVEIS = [
@@ -77,32 +251,115 @@ class PreferenciasEstudo(models.Model):
         ('presencial', 'Encontros presenciais'),
         ('grupo', 'Grupos de estudo')]
     metodo_preferido = MultiSelectField(choices=METODOS_PREFERIDOS, max_choices=3, blank=True)
+
+    # as mesmas escolhas em bits (na ordem das choices acima), mantidas pelo save
+    dia_semana_bits = MascaraBitsField(default=0)
+    horario_bits = MascaraBitsField(default=0)
+    metodo_preferido_bits = MascaraBitsField(default=0)
+
+    # campo de texto -> (campo de bits, choices)
+    CAMPOS_BITS = {
+        'dia_semana': ('dia_semana_bits', DIAS_DISPONIVEIS),
+        'horario': ('horario_bits', HORARIOS_DISPONIVEIS),
+        'metodo_preferido': ('metodo_preferido_bits', METODOS_PREFERIDOS)}
+
+    objects = PreferenciasEstudoQuerySet.as_manager()
     
     def __str__(self):
         return f"Preferências de estudo de {self.user.username}"
+
+    @classmethod
+    def mascara(cls, campo, valores):
+        # ex: PreferenciasEstudo.mascara('horario', ['noite']) -> 0b100
+        if isinstance(valores, str):
+            valores = valores.split(',') if valores else []
+        campo_bits, escolhas = cls.CAMPOS_BITS[campo]
+        return sum(1 << posicao for posicao, (valor, nome) in enumerate(escolhas) if valor in valores)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        for campo, (campo_bits, escolhas) in self.CAMPOS_BITS.items():
+            setattr(self, campo_bits, self.mascara(campo, getattr(self, campo) or []))
+            if update_fields is not None and campo in update_fields:
+                update_fields = {*update_fields, campo_bits}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
 
-class Like(models.Model):
-    de_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='like_dado')
-    para_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='like_recebido')
+class InteracaoPorTipoManager(models.Manager):
+    # manager dos proxies (Like, Superlike, Dislike), que so enxerga as interacoes do tipo dele
+    def __init__(self, tipo):
+        super().__init__()
+        self.tipo = tipo
+
+    def get_queryset(self):
+        return super().get_queryset().filter(tipo=self.tipo)
+
+
+class Interacao(models.Model):
+    # tabela unica de interacoes (like, superlike e dislike), uma linha por par de usuarios
+    LIKE = 'like'
+    SUPERLIKE = 'superlike'
+    DISLIKE = 'dislike'
+    TIPOS = [
+        (LIKE, 'Like'),
+        (SUPERLIKE, 'Superlike'),
+        (DISLIKE, 'Dislike')]
+    TIPOS_POSITIVOS = [LIKE, SUPERLIKE]  # tipos que contam pra formar um link
+
+    # os indices dos FKs sozinhos nao sao criados, os indices compostos abaixo ja cobrem as duas colunas
+    de_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='interacoes_feitas', db_index=False)
+    para_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='interacoes_recebidas', db_index=False)
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    mensagem = models.CharField(max_length=500, blank=True, default='')  # so usado no superlike
     data_realizacao = models.DateTimeField(auto_now_add=True)
 
+    # tipo que o proxy preenche sozinho ao salvar
+    tipo_padrao = None
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['de_usuario', 'para_usuario'], name='interacao_unica_por_par')]
+        indexes = [
+            models.Index(fields=['para_usuario', 'de_usuario'], name='interacao_par_inverso_idx')]
+
+    def __str__(self):
+        return f"{self.de_usuario} deu {self.get_tipo_display()} em {self.para_usuario}"
+
+    def save(self, *args, **kwargs):
+        if not self.tipo and self.tipo_padrao:
+            self.tipo = self.tipo_padrao
+        super().save(*args, **kwargs)
+
+
+# proxies de compatibilidade, mantem Like/Superlike/Dislike (admin, shell etc) funcionando em cima da tabela unica
+class Like(Interacao):
+    tipo_padrao = Interacao.LIKE
+    objects = InteracaoPorTipoManager(Interacao.LIKE)
+
+    class Meta:
+        proxy = True
+
     def __str__(self):
         return f"{self.de_usuario} curtiu {self.para_usuario}!"
 
-class Superlike(models.Model):
-    de_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='superlike_dado')
-    para_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='superlike_recebido')
-    mensagem = models.CharField(max_length=500)
-    data_realizacao = models.DateTimeField(auto_now_add=True)
+class Superlike(Interacao):
+    tipo_padrao = Interacao.SUPERLIKE
+    objects = InteracaoPorTipoManager(Interacao.SUPERLIKE)
+
+    class Meta:
+        proxy = True
 
     def __str__(self):
         return f"{self.de_usuario} curtiu e enviou uma mensagem para {self.para_usuario}!"
 
-class Dislike(models.Model):
-    de_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='dislike_dado')
-    para_usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='dislike_recebido')
-    data_realizacao = models.DateTimeField(auto_now_add=True)
+class Dislike(Interacao):
+    tipo_padrao = Interacao.DISLIKE
+    objects = InteracaoPorTipoManager(Interacao.DISLIKE)
+
+    class Meta:
+        proxy = True
 
     def __str__(self):
         return f"{self.de_usuario} não curtiu {self.para_usuario}!"
@@ -114,11 +371,32 @@ class Linkeds(models.Model):
 
     class Meta:
         unique_together = ['usuario1','usuario2']
+        # o par é sempre guardado ordenado (menor id no usuario1), entao cada link existe uma vez so
+        constraints = [
+            models.CheckConstraint(condition=models.Q(usuario1__lt=models.F('usuario2')), name='linkeds_par_ordenado')]
     
     def __str__(self):
         return f"{self.usuario1} se linkou com {self.usuario2}"
 
 
+class Conexao(models.Model):
+    # adjacencia materializada dos linkeds: duas linhas por link, uma pra cada lado. assim "meus linkeds" vira uma
+    # varredura so no indice (usuario, data) em vez do OR entre usuario1 e usuario2
+    usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='conexoes', db_index=False)
+    conectado = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    link = models.ForeignKey(Linkeds, on_delete=models.CASCADE, related_name='conexoes')
+    data_realizacao = models.DateTimeField()  # copia da data do link, pra ordenar direto pelo indice
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'conectado'], name='conexao_unica_por_par')]
+        indexes = [
+            models.Index(fields=['usuario', '-data_realizacao', '-id'], name='conexao_usuario_recentes_idx')]
+
+    def __str__(self):
+        return f"{self.usuario} -> {self.conectado}"
+
+
 class GrupoDeEstudos(models.Model):
     nome = models.CharField(max_length=200)
     materia = models.CharField(max_length=200)
@@ -202,29 +480,83 @@ class ConfiguracoesUsuario(models.Model):
     
     def __str__(self):
         return f"Configurações de {self.user.username}"
+
+    @staticmethod
+    def chave_cache(usuario_id):
+        return f'configuracoes:v1:{usuario_id}'
+
+    @classmethod
+    def do_usuario(cls, usuario):
+        """Configuracoes do usuario (criadas se ainda nao existem), lidas do cache. O post_save tira do cache"""
+        return cls.do_usuario_id(usuario.id)
+
+    @classmethod
+    def do_usuario_id(cls, usuario_id):
+        chave = cls.chave_cache(usuario_id)
+        config = cache.get(chave)
+        if config is None:
+            config, criado = cls.objects.get_or_create(user_id=usuario_id)
+            cache.set(chave, config, getattr(settings, 'CONFIGURACOES_TTL', 600))
+        return config
+
+    @classmethod
+    async def ado_usuario(cls, usuario):
+        # mesma coisa pras views async, pela API async do cache e do ORM
+        chave = cls.chave_cache(usuario.id)
+        config = await cache.aget(chave)
+        if config is None:
+            config, criado = await cls.objects.aget_or_create(user=usuario)
+            await cache.aset(chave, config, getattr(settings, 'CONFIGURACOES_TTL', 600))
+        return config
+
+    @classmethod
+    def distancia_maxima_de(cls, usuario):
+        config = cache.get(cls.chave_cache(usuario.id))
+        if config is not None:
+            return config.distancia_maxima
+        # quem nunca abriu as configuracoes fica com o padrao do campo
+        distancia = cls.objects.filter(user=usuario).values_list('distancia_maxima', flat=True).first()
+        return distancia if distancia is not None else cls._meta.get_field('distancia_maxima').default
     
 class AparelhoSMS(Device):
     numero_celular = models.CharField(max_length=15, unique=True)
     token = models.CharField(max_length=6, blank=True, null=True)
+    token_valido_ate = models.DateTimeField(blank=True, null=True)
     
     def gerar_desafio(self):
         token = str(secrets.randbelow(10**6)).zfill(6)
         
         # Store token in the device database field
         self.token = token
+        self.token_valido_ate = timezone.now() + timedelta(seconds=getattr(settings, 'SMS_VALIDADE_CODIGO', 300))
         self.save()
         
-        # Send SMS with the token
-        self.send_sms(token)
+        # o envio do SMS vai pra fila de tarefas, o request nao espera o provedor. Vai com prioridade alta (o worker
+        # tem um laco so pras prioritarias, nao espera a fila normal) e sem muita insistencia: o codigo vence rapido
+        from . import tarefas
+        tarefas.enfileirar(enviar_sms_desafio, prioridade=tarefas.ALTA, max_tentativas=3, aparelho_id=self.id)
         
         return token
 
+    def token_expirado(self):
+        return self.token_valido_ate is not None and self.token_valido_ate <= timezone.now()
+
     def verificar_token(self, token):
-        return self.token == token
+        return self.token == token and not self.token_expirado()
     
     def send_sms(self, token):
         print(f"Enviando SMS para {self.numero_celular}: Seu código de verificação é {token}")
         # In production, this would integrate with an SMS service like Twilio
+
+
+def enviar_sms_desafio(aparelho_id):
+    # tarefa: manda o token atual do aparelho (se gerou outro nesse meio tempo, vai o novo). Codigo que ja venceu
+    # (fila atrasada, retentativas) nao é mandado, o usuario pede outro
+    aparelho = AparelhoSMS.objects.filter(id=aparelho_id).first()
+    if not aparelho or not aparelho.token or aparelho.token_expirado():
+        return False
+    aparelho.send_sms(aparelho.token)
+    return True
         
 class FotosUsuario(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='fotos')
@@ -233,6 +565,8 @@ class FotosUsuario(models.Model):
     foto_perfil = models.BooleanField(default=False)
     ordem = models.PositiveIntegerField(default=0)
     data_upload = models.DateTimeField(auto_now_add=True)
+    # miniaturas geradas em segundo plano (ver accounts/imagens.py): {nome: {'largura': px, 'webp': caminho, ...}}
+    variantes = models.JSONField(default=dict, blank=True)
     
     class Meta:
         ordering = ['ordem', '-data_upload']
@@ -247,6 +581,16 @@ class FotosUsuario(models.Model):
         elif self.ordem == 0:
             self.ordem = self.user.fotos.count()
         super().save(*args, **kwargs)
+        self.sincronizar_foto_principal()
+
+    def sincronizar_foto_principal(self):
+        # mantem o CustomUser.foto_principal apontando pra foto marcada como foto de perfil
+        if self.foto_perfil and self.user.foto_principal_id != self.id:
+            CustomUser.objects.filter(pk=self.user_id).update(foto_principal=self)
+            self.user.foto_principal = self
+        elif not self.foto_perfil and self.user.foto_principal_id == self.id:
+            CustomUser.objects.filter(pk=self.user_id).update(foto_principal=None)
+            self.user.foto_principal = None
 
 
 class RelatorioProblema(models.Model):
@@ -307,4 +651,92 @@ class RelatorioProblema(models.Model):
         return f"#{self.id} - {self.titulo} ({self.get_tipo_problema_display()})"
     
     def get_short_description(self):
-        return self.descricao[:100] + '...' if len(self.descricao) > 100 else self.descricao
\ No newline at end of file
+        return self.descricao[:100] + '...' if len(self.descricao) > 100 else self.descricao
+
+
+def avisar_admins_relatorio(relatorio_id):
+    # tarefa: email pros ADMINS com o relatorio novo. fail_silently=False pra falha do SMTP virar nova tentativa
+    relatorio = RelatorioProblema.objects.filter(id=relatorio_id).first()
+    if relatorio:
+        contato = f"{relatorio.nome_usuario} <{relatorio.email_usuario}>" if relatorio.incluir_contato else 'sem contato'
+        mail_admins(
+            f"Relatório de problema {relatorio}",
+            f"Prioridade: {relatorio.get_prioridade_display() or '-'}\n"
+            f"Frequência: {relatorio.get_frequencia_display() or '-'}\n"
+            f"Dispositivo: {relatorio.dispositivo or '-'}\n"
+            f"Contato: {contato}\n\n{relatorio.descricao}",
+            fail_silently=False)
+
+class FilaCandidatos(models.Model):
+    # fila pre-calculada de perfis pro feed de cada usuario, assim o feed nao precisa varrer a tabela de usuarios a cada request
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='fila_candidatos')
+    ids = models.TextField(blank=True, default='', help_text="Comma-separated list of candidate user ids")
+    posicao = models.PositiveIntegerField(default=0)
+    esgotada = models.BooleanField(default=False)  # true quando a ultima recarga nao achou mais ninguem
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Fila de candidatos de {self.user.username}"
+
+    def get_ids(self):
+        return [int(i) for i in self.ids.split(',')] if self.ids else []
+
+    def restantes(self):
+        return self.get_ids()[self.posicao:]
+
+
+class Universidade(models.Model):
+    # catalogo local de universidades (carregado pelo comando carregar_universidades), substitui o servico externo
+    codigo = models.CharField(max_length=100, unique=True)  # o id que fica salvo em CustomUser.universidade
+    nome = models.CharField(max_length=300)
+    sigla = models.CharField(max_length=50, blank=True, default='')
+    cidade = models.CharField(max_length=150)
+    estado = models.CharField(max_length=50)
+    cursos = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'cidade'], name='universidade_local_idx')]
+
+    def __str__(self):
+        return f"{self.nome} ({self.cidade}/{self.estado})"
+
+
+class Tarefa(models.Model):
+    # fila de trabalho em segundo plano (ver accounts/tarefas.py), processada pelo comando processar_tarefas
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Pendente'),
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    funcao = models.CharField(max_length=200)  # caminho da funcao, ex: accounts.exportacao.gerar_arquivo
+    argumentos = models.JSONField(default=dict, blank=True)
+    # dono da tarefa (ex: quem pediu a exportacao), pra ele poder consultar o andamento
+    usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='tarefas')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=5)
+    executar_em = models.DateTimeField()  # proxima tentativa (empurrado pra frente pelo backoff quando falha)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    # lease de quem ta executando: o worker renova enquanto a tarefa roda, parou de renovar (morreu) ela volta pra fila
+    renovada_em = models.DateTimeField(null=True, blank=True)
+    # maior roda antes (ver tarefas.ALTA)
+    prioridade = models.SmallIntegerField(default=0)
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'executar_em'], name='tarefa_proxima_idx'),
+            models.Index(fields=['status', 'prioridade', 'executar_em'], name='tarefa_prioritaria_idx')]
+
+    def __str__(self):
+        return f"#{self.id} {self.funcao} ({self.status})"
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import cartoes, imagens, tarefas
+from .models import ConfiguracoesUsuario, MembroGrupoEstudos
+
+# notificacoes em tempo real pelo stream SSE: quem gera o evento chama notificar_* e o hub (NOTIFICACOES_HUB: local,
+# redis ou o caminho de uma classe com publicar/assinar/aassinar) entrega pros streams abertos do usuario
+
+# preferencia (ConfiguracoesUsuario) que liga cada tipo de evento
+PREFERENCIAS = {
+    'link': 'notificacao_linkeds',
+    'superlike': 'notificacao_matchs',
+    'grupo': 'notificacao_eventos_grupos',
+}
+
+# eventos guardados por stream enquanto o cliente nao le. Se encher, os novos sao descartados (na reconexao o front
+# busca o que perdeu pelo since do /api/linkeds/)
+TAMANHO_FILA = 100
+# comentario mandado quando nao tem evento, pra proxies nao fecharem a conexao parada
+INTERVALO_PING = getattr(settings, 'NOTIFICACOES_INTERVALO_PING', 15)
+# o stream fecha sozinho depois disso e o EventSource reconecta (no WSGI cada stream aberto segura uma thread)
+DURACAO_MAXIMA = getattr(settings, 'NOTIFICACOES_DURACAO_MAXIMA', 300)
+RECONEXAO_MS = 3000
+
+
+def stream_disponivel(request):
+    # no WSGI cada stream aberto prende uma thread do servidor por ate DURACAO_MAXIMA, entao so com
+    # NOTIFICACOES_STREAM_WSGI. Sem stream o front cai pro polling do since
+    return isinstance(request, ASGIRequest) or getattr(settings, 'NOTIFICACOES_STREAM_WSGI', False)
+
+
+def contexto_pagina(request):
+    # vai pro template das paginas que recebem eventos (home e linkeds), o JS escolhe entre stream e polling por isso
+    return {
+        'notificacoes_stream': stream_disponivel(request),
+        'notificacoes_intervalo_polling': getattr(settings, 'NOTIFICACOES_INTERVALO_POLLING', 30),
+    }
+
+
+class AssinaturaLocal:
+    def __init__(self, hub, usuario_id, loop=None):
+        self.hub = hub
+        self.usuario_id = usuario_id
+        # stream async: fila do asyncio, alimentada pelo loop dele (o publicar pode vir de qualquer thread)
+        self.loop = loop
+        self.fila = asyncio.Queue(TAMANHO_FILA) if loop else queue.Queue(TAMANHO_FILA)
+
+    def entregar(self, evento):
+        if self.loop is None:
+            try:
+                self.fila.put_nowait(evento)
+            except queue.Full:
+                pass
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._entregar_no_loop, evento)
+        except RuntimeError:  # loop ja fechado, o stream acabou
+            pass
+
+    def _entregar_no_loop(self, evento):
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass
+
+    def proximo(self, timeout):
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aproximo(self, timeout):
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def fechar(self):
+        self.hub.remover(self)
+
+    async def afechar(self):
+        self.fechar()
+
+
+class HubLocal:
+    """Pub/sub em memoria: entrega os eventos pros streams abertos nesse processo"""
+
+    def __init__(self):
+        self._assinaturas = defaultdict(set)
+        self._trava = threading.Lock()
+
+    def assinar(self, usuario_id):
+        return self._adicionar(AssinaturaLocal(self, usuario_id))
+
+    async def aassinar(self, usuario_id):
+        return self._adicionar(AssinaturaLocal(self, usuario_id, asyncio.get_running_loop()))
+
+    def _adicionar(self, assinatura):
+        with self._trava:
+            self._assinaturas[assinatura.usuario_id].add(assinatura)
+        return assinatura
+
+    def remover(self, assinatura):
+        with self._trava:
+            assinaturas = self._assinaturas.get(assinatura.usuario_id)
+            if assinaturas:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.usuario_id]
+
+    def publicar(self, usuario_id, evento):
+        with self._trava:
+            assinaturas = list(self._assinaturas.get(usuario_id, ()))
+        for assinatura in assinaturas:
+            assinatura.entregar(evento)
+
+
+class AssinaturaRedis:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def proximo(self, timeout):
+        mensagem = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(mensagem['data']) if mensagem else None
+
+    async def aproximo(self, timeout):
+        mensagem = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(mensagem['data']) if mensagem else None
+
+    def fechar(self):
+        self.pubsub.close()
+
+    async def afechar(self):
+        await self.pubsub.aclose()
+
+
+class HubRedis:
+    """Pub/sub pelo Redis, um canal por usuario. Funciona com varios processos e maquinas (precisa do pacote redis)"""
+
+    def __init__(self, url=None, cliente=None, cliente_async=None):
+        import redis
+        import redis.asyncio
+
+        url = url or getattr(settings, 'NOTIFICACOES_REDIS_URL', None) or 'redis://127.0.0.1:6379/1'
+        self.cliente = cliente or redis.Redis.from_url(url)
+        self.cliente_async = cliente_async or redis.asyncio.Redis.from_url(url)
+
+    @staticmethod
+    def canal(usuario_id):
+        return f'unicrossed:notificacoes:{usuario_id}'
+
+    def assinar(self, usuario_id):
+        pubsub = self.cliente.pubsub()
+        pubsub.subscribe(self.canal(usuario_id))
+        return AssinaturaRedis(pubsub)
+
+    async def aassinar(self, usuario_id):
+        pubsub = self.cliente_async.pubsub()
+        await pubsub.subscribe(self.canal(usuario_id))
+        return AssinaturaRedis(pubsub)
+
+    def publicar(self, usuario_id, evento):
+        self.cliente.publish(self.canal(usuario_id), json.dumps(evento))
+
+
+HUBS = {'local': HubLocal, 'redis': HubRedis}
+
+_hub = None
+_trava_hub = threading.Lock()
+
+
+def obter_hub():
+    global _hub
+    with _trava_hub:
+        if _hub is None:
+            tipo = getattr(settings, 'NOTIFICACOES_HUB', 'local')
+            _hub = (HUBS.get(tipo) or import_string(tipo))()
+        return _hub
+
+
+def trocar_hub(hub):
+    # usado pelos testes (e por quem quiser montar o hub na mao). Retorna o anterior
+    global _hub
+    with _trava_hub:
+        anterior, _hub = _hub, hub
+    return anterior
+
+
+def _evento(tipo, **dados):
+    return {'tipo': tipo, 'quando': timezone.now().isoformat(), **dados}
+
+
+def _resumos(usuario_ids):
+    # nome e foto de quem aparece no evento, pelos cartoes em cache
+    return {cartao['id']: {'id': cartao['id'], 'name': cartao['username'], 'image': imagens.foto_para(cartao, 'mini') or cartoes.FOTO_PADRAO}
+            for cartao in cartoes.obter_cartoes(usuario_ids)}
+
+
+def notificar_link(usuario_id, alvo_id):
+    # cada um recebe o outro, voce_iniciou marca quem fez o swipe que fechou o link
+    def enviar():
+        resumos = _resumos([usuario_id, alvo_id])
+        if len(resumos) < 2:
+            return
+        hub = obter_hub()
+        hub.publicar(usuario_id, _evento('link', usuario=resumos[alvo_id], voce_iniciou=True))
+        hub.publicar(alvo_id, _evento('link', usuario=resumos[usuario_id], voce_iniciou=False))
+    transaction.on_commit(enviar)
+
+
+def notificar_superlike(usuario_id, alvo_id, mensagem):
+    def enviar():
+        resumo = _resumos([usuario_id]).get(usuario_id)
+        if resumo:
+            obter_hub().publicar(alvo_id, _evento('superlike', usuario=resumo, mensagem=mensagem))
+    transaction.on_commit(enviar)
+
+
+def notificar_grupo(grupo, usuario_id, acao):
+    # avisa os membros ativos (e a propria pessoa). Grupo grande sao muitos avisos, entao com hub compartilhado (redis)
+    # a entrega vai pela fila de tarefas
+    argumentos = {'grupo_id': grupo.id, 'grupo_nome': grupo.nome, 'usuario_id': usuario_id, 'acao': acao,
+                  'quando': timezone.now().isoformat()}
+    if isinstance(obter_hub(), HubLocal):
+        # hub local: os streams abertos tao na memoria desse processo, o worker da fila (outro processo) nao alcanca
+        transaction.on_commit(lambda: entregar_aviso_grupo(**argumentos))
+    else:
+        tarefas.enfileirar(entregar_aviso_grupo, **argumentos)
+
+
+def entregar_aviso_grupo(grupo_id, grupo_nome, usuario_id, acao, quando):
+    # tarefa: o nome do grupo vem junto porque ele pode ter sido apagado antes da entrega
+    membros = set(MembroGrupoEstudos.objects.filter(grupo_id=grupo_id, ativo=True).values_list('user_id', flat=True))
+    membros.add(usuario_id)
+    resumo = _resumos([usuario_id]).get(usuario_id)
+    evento = _evento('grupo', acao=acao, grupo={'id': grupo_id, 'name': grupo_nome}, usuario=resumo, quando=quando)
+    hub = obter_hub()
+    for membro_id in membros:
+        hub.publicar(membro_id, evento)
+
+
+def quer_receber(usuario_id, tipo):
+    # a preferencia é checada na entrega (no stream de quem recebe), entao quem nao ta conectado nao custa nada
+    campo = PREFERENCIAS.get(tipo)
+    return campo is None or getattr(ConfiguracoesUsuario.do_usuario_id(usuario_id), campo)
+
+
+def formatar_sse(evento):
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+
+def stream(usuario_id, intervalo_ping=INTERVALO_PING, duracao=DURACAO_MAXIMA):
+    # corpo do stream SSE no WSGI
+    assinatura = obter_hub().assinar(usuario_id)
+    fim = time.monotonic() + duracao
+    try:
+        yield f'retry: {RECONEXAO_MS}\n\n'
+        while time.monotonic() < fim:
+            evento = assinatura.proximo(timeout=min(intervalo_ping, max(fim - time.monotonic(), 0)))
+            if evento is None:
+                yield ': ping\n\n'
+            elif quer_receber(usuario_id, evento['tipo']):
+                yield formatar_sse(evento)
+    finally:
+        assinatura.fechar()
+
+
+async def astream(usuario_id, intervalo_ping=INTERVALO_PING, duracao=DURACAO_MAXIMA):
+    # mesmo stream no ASGI, esperar evento nao ocupa thread
+    assinatura = await obter_hub().aassinar(usuario_id)
+    fim = time.monotonic() + duracao
+    try:
+        yield f'retry: {RECONEXAO_MS}\n\n'
+        while time.monotonic() < fim:
+            evento = await assinatura.aproximo(timeout=min(intervalo_ping, max(fim - time.monotonic(), 0)))
+            if evento is None:
+                yield ': ping\n\n'
+            elif await sync_to_async(quer_receber)(usuario_id, evento['tipo']):
+                yield formatar_sse(evento)
+    finally:
+        await assinatura.afechar()
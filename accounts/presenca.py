@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ConfiguracoesUsuario
+
+# presenca mostrada nos grupos: cada heartbeat do front (POST /api/presenca/) é so um cache.set com validade de TTL, entao
+# nao encosta no banco e quem para de mandar some sozinho quando a chave expira
+ONLINE = 'online'
+AUSENTE = 'away'  # pagina aberta mas em outra aba
+OFFLINE = 'offline'
+
+# segundos sem heartbeat ate o usuario virar offline. O front manda a cada 60s, entao da pra perder um
+TTL = getattr(settings, 'PRESENCA_TTL', 90)
+
+
+def _chave(usuario_id):
+    return f'presenca:{usuario_id}'
+
+
+def registrar(usuario_id, ativo=True):
+    # ativo=False: a pagina ta aberta mas escondida (aparece como ausente)
+    cache.set(_chave(usuario_id), (ONLINE if ativo else AUSENTE, time.time()), TTL)
+
+
+def remover(usuario_id):
+    # logout: sai na hora em vez de esperar a chave expirar
+    cache.delete(_chave(usuario_id))
+
+
+def presentes(usuario_ids):
+    # {usuario_id: ONLINE ou AUSENTE} de quem mandou heartbeat nos ultimos TTL segundos (um get_many so), sem filtro de
+    # privacidade
+    usuario_ids = list(usuario_ids)
+    guardados = cache.get_many([_chave(usuario_id) for usuario_id in usuario_ids])
+    limite = time.time() - TTL
+    resultado = {}
+    for usuario_id in usuario_ids:
+        valor = guardados.get(_chave(usuario_id))
+        # o horario confere a validade tambem em backend que nao expira chave na hora certa
+        if valor and valor[1] >= limite:
+            resultado[usuario_id] = valor[0]
+    return resultado
+
+
+def status_de(usuario_ids):
+    # {usuario_id: ONLINE, AUSENTE ou OFFLINE} pra todos os ids. Quem desligou mostrar_status_online aparece offline
+    usuario_ids = set(usuario_ids)
+    ativos = presentes(usuario_ids)
+    if ativos:
+        # so quem ta presente precisa da preferencia (quem nao tem configuracao ainda usa o padrao, que mostra)
+        ocultos = ConfiguracoesUsuario.objects.filter(
+            user_id__in=ativos, mostrar_status_online=False).values_list('user_id', flat=True)
+        for usuario_id in ocultos:
+            del ativos[usuario_id]
+    return {usuario_id: ativos.get(usuario_id, OFFLINE) for usuario_id in usuario_ids}
@@ -0,0 +1,72 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# estado do request atual (o middleware FixarPrimarioMiddleware cria um por request). Fora de request (comandos) fica
+# None e as leituras vao pras replicas normalmente, a nao ser dentro de fixar_primario()
+_estado_request = ContextVar('estado_request_banco', default=None)
+
+
+class EstadoRequest:
+    def __init__(self, fixado):
+        # fixado: o usuario escreveu ha pouco (cookie do middleware), entao le tudo do primario
+        self.fixado = fixado
+        # escreveu: esse request escreveu no banco, entao o proximo le do primario tambem
+        self.escreveu = False
+
+
+def iniciar_request(fixado):
+    return _estado_request.set(EstadoRequest(fixado))
+
+
+def finalizar_request(token):
+    estado = _estado_request.get()
+    _estado_request.reset(token)
+    return estado
+
+
+@contextmanager
+def fixar_primario():
+    """Tudo que for lido dentro do bloco vem do primario. Pra codigo fora de request que depende de uma escrita que
+    acabou de acontecer (ex: recarga do feed em segundo plano logo depois do swipe, que a replica ainda nao tem)"""
+    token = iniciar_request(True)
+    try:
+        yield
+    finally:
+        finalizar_request(token)
+
+
+class RoteadorReplicas:
+    """Manda as leituras pra uma das replicas (REPLICAS_BANCO) e as escritas pro primario.
+
+    Le do primario quando ta dentro de uma transacao, quando o request ja escreveu alguma coisa e quando o usuario escreveu
+    ha menos de REPLICAS_JANELA_PRIMARIO segundos (read-your-writes, ex: swipe que vira link e depois /api/linkeds/).
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'REPLICAS_BANCO', [])
+        if not replicas:
+            return 'default'
+
+        estado = _estado_request.get()
+        if estado is not None and (estado.fixado or estado.escreveu):
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        estado = _estado_request.get()
+        if estado is not None:
+            estado.escreveu = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica e primario tem os mesmos dados, entao objetos lidos de um e de outro podem se relacionar
+        bancos = {'default', *getattr(settings, 'REPLICAS_BANCO', [])}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
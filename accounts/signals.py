@@ -0,0 +1,150 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+
+from . import feed, compatibilidade, conexoes, indice_habilidades, cartoes, notificacoes, imagens, tarefas
+from .models import CustomUser, Interacao, Like, Dislike, Superlike, FotosUsuario, Linkeds, Habilidades, PreferenciasEstudo, ConfiguracoesUsuario, MembroGrupoEstudos
+
+
+# os proxies mandam o signal com eles mesmos como sender, entao escuta todos
+@receiver(post_save, sender=Interacao)
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Dislike)
+@receiver(post_save, sender=Superlike)
+def atualizar_fila_apos_interacao(sender, instance, created, **kwargs):
+    # quando entra uma interacao nova, o perfil alvo sai da fila de quem interagiu
+    if created:
+        feed.avancar_fila(instance.de_usuario_id, instance.para_usuario_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidar_fila_apos_mudar_de_cidade(sender, instance, created, **kwargs):
+    # usuario novo nao mexe nas filas dos outros: as esgotadas conferem o ultimo cadastro na leitura (feed.fila_esgotada)
+    if not created and getattr(instance, '_localizacao_alterada', False):
+        # mudou de cidade: a fila foi montada com o raio em volta da cidade antiga
+        feed.invalidar_fila(instance.id)
+
+
+@receiver(post_delete, sender=FotosUsuario)
+def promover_nova_foto_principal(sender, instance, **kwargs):
+    # se apagou a foto de perfil, a proxima foto (pela ordem) vira a foto de perfil. o ponteiro antigo ja foi
+    # zerado pelo SET_NULL do CustomUser.foto_principal
+    if not instance.foto_perfil:
+        return
+
+    proxima = FotosUsuario.objects.filter(user_id=instance.user_id).first()
+    if proxima:
+        proxima.foto_perfil = True
+        proxima.save()
+
+
+@receiver(post_save, sender=Linkeds)
+def materializar_conexoes_do_link(sender, instance, created, **kwargs):
+    # todo link salvo pelo ORM (get_or_create, admin, shell) grava as duas conexoes. se um link existente foi editado
+    # (admin), refaz as conexoes dele
+    if not created:
+        instance.conexoes.all().delete()
+    conexoes.materializar_conexoes([instance])
+    if created:
+        # os swipes gravam o link por SQL direto e avisam la (swipes.py), aqui so chega link do ORM (admin, criar_link)
+        notificacoes.notificar_link(instance.usuario1_id, instance.usuario2_id)
+
+
+@receiver(m2m_changed, sender=CustomUser.habilidades.through)
+def sincronizar_habilidade_ids(sender, instance, action, reverse, pk_set, **kwargs):
+    # mantem as colunas habilidade_ids e bits_habilidades e o indice invertido iguais ao M2M, dos dois lados da relacao
+    if reverse and action == 'pre_clear':
+        # no clear do lado da habilidade o pk_set vem vazio, entao guarda antes quem tinha ela
+        instance._usuarios_afetados = list(instance.customuser_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        instance.habilidade_ids = indice_habilidades.sincronizar_usuarios([instance.id])[instance.id]
+        instance.bits_habilidades = compatibilidade.bytes_habilidades(instance.habilidade_ids)
+        usuario_ids = [instance.id]
+    else:
+        usuario_ids = getattr(instance, '_usuarios_afetados', []) if action == 'post_clear' else pk_set
+        indice_habilidades.sincronizar_usuarios(usuario_ids)
+    invalidar_cartoes(usuario_ids)
+
+
+@receiver(pre_delete, sender=Habilidades)
+def guardar_usuarios_da_habilidade(sender, instance, **kwargs):
+    # o delete em cascata do M2M nao dispara m2m_changed, entao guarda quem tinha a habilidade pra sincronizar depois
+    instance._usuarios_afetados = list(instance.customuser_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Habilidades)
+def remover_habilidade_apagada(sender, instance, **kwargs):
+    indice_habilidades.sincronizar_usuarios(getattr(instance, '_usuarios_afetados', []))
+    indice_habilidades.invalidar_indice()
+
+
+@receiver(post_save, sender=Habilidades)
+def atualizar_nomes_habilidades(sender, instance, created, **kwargs):
+    # nome novo (ou habilidade nova) so precisa remontar o mapa de nomes do indice, e os cartoes de quem tem ela
+    indice_habilidades.invalidar_indice()
+    if not created:
+        invalidar_cartoes(CustomUser.habilidades.through.objects.filter(
+            habilidades_id=instance.id).values_list('customuser_id', flat=True))
+
+
+def invalidar_cartoes(usuario_ids):
+    # so apaga depois do commit, senao outro request pode guardar no cache o perfil de antes da alteracao
+    usuario_ids = list(usuario_ids)
+    transaction.on_commit(lambda: cartoes.invalidar(usuario_ids))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidar_cartao_do_usuario(sender, instance, **kwargs):
+    invalidar_cartoes([instance.id])
+
+
+@receiver(post_save, sender=FotosUsuario)
+def gerar_variantes_da_foto(sender, instance, created, **kwargs):
+    if created:
+        tarefas.enfileirar(imagens.processar_foto, foto_id=instance.id)
+
+
+@receiver(post_delete, sender=FotosUsuario)
+def apagar_variantes_da_foto(sender, instance, **kwargs):
+    transaction.on_commit(lambda: imagens.remover_variantes(instance))
+
+
+@receiver(post_save, sender=PreferenciasEstudo)
+@receiver(post_save, sender=FotosUsuario)
+@receiver(post_delete, sender=FotosUsuario)
+def invalidar_cartao_do_dono(sender, instance, **kwargs):
+    invalidar_cartoes([instance.user_id])
+
+
+@receiver(post_save, sender=ConfiguracoesUsuario)
+@receiver(post_delete, sender=ConfiguracoesUsuario)
+def invalidar_configuracoes_em_cache(sender, instance, **kwargs):
+    chave = ConfiguracoesUsuario.chave_cache(instance.user_id)
+    transaction.on_commit(lambda: cache.delete(chave))
+
+
+@receiver(pre_save, sender=MembroGrupoEstudos)
+def guardar_ativo_anterior(sender, instance, **kwargs):
+    # o post_save so avisa quando o ativo muda, nao a cada save do membro
+    instance._ativo_anterior = (
+        sender.objects.filter(pk=instance.pk).values_list('ativo', flat=True).first() if instance.pk else None)
+
+
+@receiver(post_save, sender=MembroGrupoEstudos)
+def avisar_entrada_no_grupo(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_ativo_anterior', None)
+    if instance.ativo and (created or anterior is False):
+        notificacoes.notificar_grupo(instance.grupo, instance.user_id, 'entrou')
+    elif not created and not instance.ativo and anterior:
+        notificacoes.notificar_grupo(instance.grupo, instance.user_id, 'saiu')
+
+
+@receiver(post_delete, sender=MembroGrupoEstudos)
+def avisar_saida_do_grupo(sender, instance, **kwargs):
+    if instance.ativo:
+        notificacoes.notificar_grupo(instance.grupo, instance.user_id, 'saiu')
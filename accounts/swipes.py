@@ -0,0 +1,252 @@
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import feed, conexoes, notificacoes
+from .models import CustomUser, Interacao, Linkeds
+
+# resultados possiveis de um swipe
+NAO_ENCONTRADO = 'nao_encontrado'
+PROPRIO_USUARIO = 'proprio_usuario'
+JA_INTERAGIU = 'ja_interagiu'
+REGISTRADO = 'registrado'
+LINKED = 'linked'
+INVALIDO = 'invalido'
+
+TABELA_INTERACAO = Interacao._meta.db_table
+TABELA_LINKEDS = Linkeds._meta.db_table
+TABELA_USUARIO = CustomUser._meta.db_table
+
+# insert-or-ignore: so insere se o alvo existir e se o par ainda nao tiver interacao (indice unico do par)
+SQL_INSERIR_INTERACAO = f"""
+    INSERT INTO {TABELA_INTERACAO} (de_usuario_id, para_usuario_id, tipo, mensagem, data_realizacao)
+    SELECT %s, id, %s, %s, %s FROM {TABELA_USUARIO} WHERE id = %s
+    ON CONFLICT (de_usuario_id, para_usuario_id) DO NOTHING
+"""
+
+# a mesma coisa pra varias linhas num comando so (swipes em lote): os alvos vem num VALUES (alvo, tipo, mensagem) e o
+# RETURNING diz quais pares foram gravados por esse insert. O WHERE true é exigido pelo SQLite num INSERT ... SELECT com
+# JOIN e ON CONFLICT (senao o ON do JOIN e o do upsert ficam ambiguos)
+SQL_INSERIR_INTERACOES = f"""
+    INSERT INTO {TABELA_INTERACAO} (de_usuario_id, para_usuario_id, tipo, mensagem, data_realizacao)
+    SELECT %s, u.id, v.column2, v.column3, %s FROM (VALUES {{valores}}) AS v
+    JOIN {TABELA_USUARIO} u ON u.id = v.column1
+    WHERE true
+    ON CONFLICT (de_usuario_id, para_usuario_id) DO NOTHING
+    RETURNING para_usuario_id
+"""
+
+# cria o link ja com o par ordenado (menor id primeiro), mas so se o alvo ja tiver dado like ou superlike de volta
+SQL_CRIAR_LINK_SE_MUTUO = f"""
+    INSERT INTO {TABELA_LINKEDS} (usuario1_id, usuario2_id, data_realizacao)
+    SELECT %s, %s, %s WHERE EXISTS (
+        SELECT 1 FROM {TABELA_INTERACAO}
+        WHERE de_usuario_id = %s AND para_usuario_id = %s AND tipo IN (%s, %s))
+    ON CONFLICT (usuario1_id, usuario2_id) DO NOTHING
+"""
+
+
+# maximo de acoes aceitas num lote
+TAMANHO_MAXIMO_LOTE = 100
+# linhas por INSERT do lote (3 parametros por linha, abaixo do limite de 999 parametros dos SQLite antigos)
+LINHAS_POR_INSERT = 300
+
+
+def erro_mensagem_superlike(mensagem):
+    # a mensagem do superlike precisa ter entre 10 e 500 caracteres
+    if len(mensagem) < 10:
+        return 'Limite mínimo de caracteres não atingido! Você precisa adicionar no mínimo 10.'
+    if len(mensagem) > 500:
+        return 'Limite máximo de caracteres alcançado! Você pode adicionar no máximo 500.'
+    return None
+
+
+def registrar_swipe(usuario, alvo_id, tipo, mensagem=''):
+    """Grava o like/superlike/dislike e cria o link se for mutuo, em no maximo dois comandos no banco (tres quando vira link)"""
+    if alvo_id == usuario.id:
+        return PROPRIO_USUARIO
+
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    # a transacao fica curta de proposito: so os dois inserts seguram o lock de escrita
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_INSERIR_INTERACAO, [usuario.id, tipo, mensagem if tipo == Interacao.SUPERLIKE else '', agora, alvo_id])
+            inserida = cursor.rowcount == 1
+
+            linked = False
+            if inserida and tipo in Interacao.TIPOS_POSITIVOS:
+                linked = _criar_link_se_mutuo(cursor, usuario.id, alvo_id, agora)
+
+    if not inserida:
+        # caminho raro: descobre se o alvo nao existe ou se ja tinha interacao
+        if not CustomUser.objects.filter(id=alvo_id).exists():
+            return NAO_ENCONTRADO
+        return JA_INTERAGIU
+
+    # o insert direto nao dispara o post_save, entao anda a fila do feed e avisa o alvo aqui (fora da transacao)
+    feed.avancar_fila(usuario.id, alvo_id)
+    if tipo == Interacao.SUPERLIKE:
+        notificacoes.notificar_superlike(usuario.id, alvo_id, mensagem)
+    if linked:
+        notificacoes.notificar_link(usuario.id, alvo_id)
+
+    return LINKED if linked else REGISTRADO
+
+
+def _criar_link_se_mutuo(cursor, usuario_id, alvo_id, agora):
+    # o insert so acontece se o alvo ja curtiu de volta, entao a checagem e a gravacao sao um comando so
+    usuario1_id, usuario2_id = conexoes.par_ordenado(usuario_id, alvo_id)
+    cursor.execute(SQL_CRIAR_LINK_SE_MUTUO, [
+        usuario1_id, usuario2_id, agora,
+        alvo_id, usuario_id, Interacao.LIKE, Interacao.SUPERLIKE])
+    if cursor.rowcount != 1:
+        return False
+    # so quando deu link: grava as duas conexoes (adjacencia) do par
+    conexoes.materializar_conexoes_sql(cursor, usuario1_id, usuario2_id)
+    return True
+
+
+def criar_link_se_mutuo(usuario_id, alvo_id):
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        linked = _criar_link_se_mutuo(cursor, usuario_id, alvo_id, agora)
+    if linked:
+        notificacoes.notificar_link(usuario_id, alvo_id)
+    return linked
+
+
+async def aregistrar_swipe(usuario, alvo_id, tipo, mensagem=''):
+    """Versao async do registrar_swipe (views_async.py), com os mesmos resultados"""
+    if alvo_id == usuario.id:
+        return PROPRIO_USUARIO
+
+    # o alvo existe? ja tinha interacao? numa consulta so: o ORM async roda uma consulta depois da outra na mesma thread,
+    # entao duas seriam duas idas ao banco mesmo com gather. None: o alvo nao existe
+    ja_interagiu = await CustomUser.objects.filter(id=alvo_id).annotate(ja_interagiu=Exists(
+        Interacao.objects.filter(de_usuario_id=usuario.id, para_usuario_id=OuterRef('id')))
+    ).values_list('ja_interagiu', flat=True).afirst()
+    if ja_interagiu is None:
+        return NAO_ENCONTRADO
+    if ja_interagiu:
+        return JA_INTERAGIU
+
+    try:
+        # o post_save da interacao ja anda a fila do feed (signals.py)
+        await Interacao.objects.acreate(
+            de_usuario_id=usuario.id, para_usuario_id=alvo_id, tipo=tipo,
+            mensagem=mensagem if tipo == Interacao.SUPERLIKE else '')
+    except IntegrityError:
+        # outro request gravou a mesma interacao entre a validacao e o insert
+        return JA_INTERAGIU
+
+    if tipo == Interacao.SUPERLIKE:
+        await sync_to_async(notificacoes.notificar_superlike)(usuario.id, alvo_id, mensagem)
+
+    # o like de volta é conferido no insert condicional do link, depois da interacao gravada: se fosse junto com as
+    # validacoes, dois usuarios se curtindo ao mesmo tempo nao veriam o like um do outro e o link se perderia
+    if tipo in Interacao.TIPOS_POSITIVOS and await sync_to_async(criar_link_se_mutuo)(usuario.id, alvo_id):
+        return LINKED
+    return REGISTRADO
+
+
+def _inserir_interacoes(cursor, usuario_id, novos, agora):
+    # grava as interacoes do lote em um INSERT por bloco de LINHAS_POR_INSERT e retorna os alvos que esse insert gravou
+    inseridos = set()
+    linhas = list(novos.items())
+    for inicio in range(0, len(linhas), LINHAS_POR_INSERT):
+        bloco = linhas[inicio:inicio + LINHAS_POR_INSERT]
+        parametros = [usuario_id, agora]
+        for alvo_id, (tipo, mensagem) in bloco:
+            parametros += [alvo_id, tipo, mensagem]
+        cursor.execute(SQL_INSERIR_INTERACOES.format(valores=', '.join(['(%s, %s, %s)'] * len(bloco))), parametros)
+        inseridos.update(alvo_id for alvo_id, in cursor.fetchall())
+    return inseridos
+
+
+def registrar_swipes_em_lote(usuario, acoes):
+    """Grava uma lista ordenada de swipes de uma vez so. Cada acao é um dict com tipo, user_id e mensagem (opcional).
+
+    Retorna uma lista com o resultado de cada acao, na mesma ordem. Acoes invalidas voltam com o erro em 'message'.
+    """
+    resultados = []
+    validas = {}  # alvo_id -> (tipo, mensagem), a primeira acao pra cada alvo é a que vale
+
+    for acao in acoes:
+        acao = acao if isinstance(acao, dict) else {}
+        tipo = acao.get('tipo')
+        try:
+            alvo_id = int(acao.get('user_id'))
+        except (TypeError, ValueError):
+            alvo_id = None
+        resultado = {'user_id': alvo_id, 'tipo': tipo, 'resultado': None, 'message': None}
+        resultados.append(resultado)
+
+        if tipo not in dict(Interacao.TIPOS) or alvo_id is None:
+            resultado['resultado'] = INVALIDO
+            resultado['message'] = 'Ação inválida.'
+            continue
+
+        mensagem = ''
+        if tipo == Interacao.SUPERLIKE:
+            mensagem = str(acao.get('mensagem', '')).strip()
+            erro = erro_mensagem_superlike(mensagem)
+            if erro:
+                resultado['resultado'] = INVALIDO
+                resultado['message'] = erro
+                continue
+
+        if alvo_id == usuario.id:
+            resultado['resultado'] = PROPRIO_USUARIO
+        elif alvo_id in validas:
+            resultado['resultado'] = JA_INTERAGIU
+        else:
+            validas[alvo_id] = (tipo, mensagem)
+
+    if validas:
+        # validacao em conjunto: uma consulta pros alvos que existem e outra pros que ja tinham interacao
+        existentes = set(CustomUser.objects.filter(id__in=validas).values_list('id', flat=True))
+        ja_interagidos = set(Interacao.objects.filter(
+            de_usuario=usuario, para_usuario_id__in=existentes).values_list('para_usuario_id', flat=True))
+        novos = {alvo_id: dados for alvo_id, dados in validas.items() if alvo_id in existentes and alvo_id not in ja_interagidos}
+
+        linkados = set()
+        if novos:
+            agora = connection.ops.adapt_datetimefield_value(timezone.now())
+            with transaction.atomic():
+                # o mesmo insert-or-ignore do swipe unico, com todas as linhas num comando. O par que outro request
+                # gravou depois da validacao nao volta no RETURNING e vira ja_interagiu, sem link nem notificacao
+                with connection.cursor() as cursor:
+                    inseridos = _inserir_interacoes(cursor, usuario.id, novos, agora)
+                ja_interagidos.update(set(novos) - inseridos)
+                novos = {alvo_id: dados for alvo_id, dados in novos.items() if alvo_id in inseridos}
+
+                # todos os links que saem desse lote de uma vez: quem recebeu like/superlike e ja tinha curtido de volta
+                positivos = [alvo_id for alvo_id, (tipo, mensagem) in novos.items() if tipo in Interacao.TIPOS_POSITIVOS]
+                if positivos:
+                    linkados = set(Interacao.objects.filter(
+                        de_usuario_id__in=positivos,
+                        para_usuario=usuario,
+                        tipo__in=Interacao.TIPOS_POSITIVOS).values_list('de_usuario_id', flat=True))
+                    conexoes.criar_links_em_lote(usuario.id, list(linkados))
+
+            feed.avancar_fila_varios(usuario.id, list(novos))
+            for alvo_id, (tipo, mensagem) in novos.items():
+                if tipo == Interacao.SUPERLIKE:
+                    notificacoes.notificar_superlike(usuario.id, alvo_id, mensagem)
+            for alvo_id in linkados:
+                notificacoes.notificar_link(usuario.id, alvo_id)
+
+        for resultado in resultados:
+            alvo_id = resultado['user_id']
+            if resultado['resultado'] is not None or alvo_id not in validas:
+                continue
+            if alvo_id not in existentes:
+                resultado['resultado'] = NAO_ENCONTRADO
+            elif alvo_id in ja_interagidos:
+                resultado['resultado'] = JA_INTERAGIU
+            else:
+                resultado['resultado'] = LINKED if alvo_id in linkados else REGISTRADO
+
+    return resultados
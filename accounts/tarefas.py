@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+# fila de tarefas em segundo plano: a view chama enfileirar(funcao, **argumentos) e responde na hora. A Tarefa é gravada
+# na transacao do request (rollback leva ela junto) e o comando processar_tarefas roda as pendentes. A funcao vai pelo
+# caminho, os argumentos tem que ser serializaveis em JSON e o retorno fica em Tarefa.resultado
+
+# espera antes da 2a tentativa, dobrando a cada falha ate o maximo (segundos)
+BACKOFF_BASE = getattr(settings, 'TAREFAS_BACKOFF_BASE', 10)
+BACKOFF_MAXIMO = getattr(settings, 'TAREFAS_BACKOFF_MAXIMO', 3600)
+MAX_TENTATIVAS = getattr(settings, 'TAREFAS_MAX_TENTATIVAS', 5)
+# tarefa 'executando' sem renovar o lease ha mais que isso é de um worker que morreu no meio, volta pra fila
+TEMPO_LIMITE = getattr(settings, 'TAREFAS_TEMPO_LIMITE', 120)
+# de quanto em quanto tempo o worker renova o lease das tarefas que ta executando (bem menor que o TEMPO_LIMITE)
+INTERVALO_RENOVACAO = getattr(settings, 'TAREFAS_INTERVALO_RENOVACAO', 30)
+# de quanto em quanto tempo o laco das prioritarias olha a fila (segundos)
+INTERVALO_PRIORITARIAS = getattr(settings, 'TAREFAS_INTERVALO_PRIORITARIAS', 0.2)
+
+# prioridade da tarefa: as ALTA (ex: SMS do 2FA, que o usuario ta esperando na tela) passam na frente da fila e tem um
+# laco proprio no worker, que nao espera thread livre no pool nem o intervalo da fila normal
+NORMAL = 0
+ALTA = 10
+
+# tarefas rodando nesse processo, {id: tentativa}, as que a thread de renovacao mantem vivas
+_em_execucao = {}
+_trava_execucao = threading.Lock()
+
+
+def caminho(funcao):
+    return funcao if isinstance(funcao, str) else f'{funcao.__module__}.{funcao.__qualname__}'
+
+
+def enfileirar(funcao, usuario=None, atraso=0, max_tentativas=MAX_TENTATIVAS, prioridade=NORMAL, **argumentos):
+    # funcao: a propria funcao ou o caminho dela. atraso: segundos ate poder rodar
+    return Tarefa.objects.create(
+        funcao=caminho(funcao), argumentos=argumentos, usuario=usuario, max_tentativas=max_tentativas,
+        prioridade=prioridade, executar_em=timezone.now() + timedelta(seconds=atraso))
+
+
+def backoff(tentativas):
+    return min(BACKOFF_BASE * 2 ** (tentativas - 1), BACKOFF_MAXIMO)
+
+
+def reservar(limite, prioridade_minima=None):
+    # marca ate `limite` tarefas vencidas como executando e devolve os ids, as de maior prioridade primeiro. Com varios
+    # workers cada tarefa so fica com quem conseguiu mudar o status dela
+    agora = timezone.now()
+    candidatas = Tarefa.objects.filter(status=Tarefa.PENDENTE, executar_em__lte=agora)
+    if prioridade_minima is None:
+        # devolver pra fila as de worker morto fica com o laco normal, o das prioritarias roda muito mais vezes
+        Tarefa.objects.filter(status=Tarefa.EXECUTANDO, renovada_em__lt=agora - timedelta(seconds=TEMPO_LIMITE)).update(
+            status=Tarefa.PENDENTE)
+    else:
+        candidatas = candidatas.filter(prioridade__gte=prioridade_minima)
+
+    candidatas = candidatas.order_by('-prioridade', 'executar_em', 'id')
+    reservadas = []
+    for tarefa_id in candidatas.values_list('id', flat=True)[:limite]:
+        if Tarefa.objects.filter(id=tarefa_id, status=Tarefa.PENDENTE).update(
+                status=Tarefa.EXECUTANDO, iniciada_em=agora, renovada_em=agora, tentativas=F('tentativas') + 1):
+            reservadas.append(tarefa_id)
+    return reservadas
+
+
+def renovar_leases():
+    # lease: enquanto a tarefa roda o worker renova renovada_em. Se ele morre o lease vence depois de TEMPO_LIMITE e
+    # outro worker pega a tarefa. Devolve quantas ainda eram desse processo
+    with _trava_execucao:
+        em_execucao = list(_em_execucao.items())
+    renovadas = 0
+    for tarefa_id, tentativa in em_execucao:
+        renovadas += Tarefa.objects.filter(id=tarefa_id, status=Tarefa.EXECUTANDO, tentativas=tentativa).update(
+            renovada_em=timezone.now())
+    return renovadas
+
+
+@contextmanager
+def renovando_leases(intervalo=INTERVALO_RENOVACAO):
+    # thread que renova os leases enquanto o bloco roda (o worker fica dentro dela o tempo todo)
+    parar = threading.Event()
+
+    def renovar():
+        try:
+            while not parar.wait(intervalo):
+                try:
+                    renovar_leases()
+                except Exception:
+                    logger.exception('Erro ao renovar o lease das tarefas')
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=renovar, name='tarefas-lease', daemon=True)
+    thread.start()
+    try:
+        yield thread
+    finally:
+        parar.set()
+        thread.join()
+
+
+def executar(tarefa_id):
+    # roda uma tarefa ja reservada e grava o resultado, ou agenda a proxima tentativa com backoff ate max_tentativas
+    tarefa = Tarefa.objects.get(id=tarefa_id)
+    with _trava_execucao:
+        _em_execucao[tarefa.id] = tarefa.tentativas
+    try:
+        resultado = import_string(tarefa.funcao)(**tarefa.argumentos)
+    except Exception:
+        logger.exception('Tarefa %s (%s) falhou na tentativa %s', tarefa.id, tarefa.funcao, tarefa.tentativas)
+        tarefa.erro = traceback.format_exc()
+        if tarefa.tentativas >= tarefa.max_tentativas:
+            tarefa.status = Tarefa.FALHOU
+        else:
+            tarefa.status = Tarefa.PENDENTE
+            tarefa.executar_em = timezone.now() + timedelta(seconds=backoff(tarefa.tentativas))
+    else:
+        tarefa.status = Tarefa.CONCLUIDA
+        tarefa.resultado = resultado
+        tarefa.erro = ''
+    finally:
+        with _trava_execucao:
+            _em_execucao.pop(tarefa.id, None)
+
+    # so grava se a reserva ainda é nossa: com o lease vencido a tarefa pode ter voltado pra fila (ou ja estar com
+    # outro worker, que incrementou as tentativas)
+    gravada = Tarefa.objects.filter(id=tarefa.id, status=Tarefa.EXECUTANDO, tentativas=tarefa.tentativas).update(
+        status=tarefa.status, resultado=tarefa.resultado, erro=tarefa.erro, executar_em=tarefa.executar_em,
+        data_atualizacao=timezone.now())
+    if not gravada:
+        logger.warning('Tarefa %s (%s) perdeu o lease antes de terminar, resultado descartado', tarefa.id, tarefa.funcao)
+        tarefa.refresh_from_db()
+    return tarefa
+
+
+def _executar_na_thread(tarefa_id):
+    try:
+        return executar(tarefa_id)
+    finally:
+        # cada thread do pool tem a sua conexao, fecha pra nao acumular
+        connection.close()
+
+
+def executar_pendentes(limite=100):
+    # executa as tarefas vencidas uma de cada vez na thread atual (testes e shell)
+    return [executar(tarefa_id) for tarefa_id in reservar(limite)]
+
+
+def criar_executor(threads):
+    return ThreadPoolExecutor(max_workers=threads, thread_name_prefix='tarefas')
+
+
+@contextmanager
+def processando_prioritarias(intervalo=INTERVALO_PRIORITARIAS, ao_terminar=None):
+    # thread que roda as tarefas ALTA enquanto o bloco roda, fora do pool e com polling curto
+    parar = threading.Event()
+
+    def processar_prioritarias():
+        try:
+            while not parar.wait(intervalo):
+                try:
+                    # esvazia as prioritarias vencidas antes de esperar de novo
+                    while ids := reservar(1, prioridade_minima=ALTA):
+                        tarefa = executar(ids[0])
+                        if ao_terminar:
+                            ao_terminar(tarefa)
+                except Exception:
+                    logger.exception('Erro no laco das tarefas prioritarias')
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=processar_prioritarias, name='tarefas-prioritarias', daemon=True)
+    thread.start()
+    try:
+        yield thread
+    finally:
+        parar.set()
+        thread.join()
+
+
+def processar(threads, intervalo=1.0, uma_vez=False, ao_terminar=None):
+    # laco do worker (comando processar_tarefas). ao_terminar(tarefa) é chamado na thread de cada tarefa
+    # uma vaga por thread: so reserva tarefa quando tem thread livre, e cada uma vai pro pool na hora. Assim uma tarefa
+    # lenta (exportacao grande, SMS com o provedor travado) ocupa so a thread dela, sem esperar rodada nenhuma
+    vagas = threading.Semaphore(threads)
+
+    def terminou(futuro):
+        vagas.release()
+        if futuro.exception() is not None:
+            logger.error('Erro no worker de tarefas', exc_info=futuro.exception())
+        elif ao_terminar:
+            ao_terminar(futuro.result())
+
+    with renovando_leases(), processando_prioritarias(ao_terminar=ao_terminar), criar_executor(threads) as executor:
+        while True:
+            vagas.acquire()
+            livres = 1
+            while livres < threads and vagas.acquire(blocking=False):
+                livres += 1
+            ids = reservar(livres)
+            for _ in range(livres - len(ids)):
+                vagas.release()
+            for tarefa_id in ids:
+                executor.submit(_executar_na_thread, tarefa_id).add_done_callback(terminou)
+
+            if not ids:
+                # fila vazia: com --uma-vez sai (o with espera as que ainda tao rodando), senao olha de novo daqui a pouco
+                if uma_vez:
+                    return
+                time.sleep(intervalo)
@@ -1,3 +1,1752 @@
-from django.test import TestCase
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import types
+import zipfile
+from datetime import timedelta
+from importlib import import_module
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from PIL import Image
+
+from UniCrossed.cache_sessoes import configurar_cache, motor_sessao
+from accounts import (
+    cartoes, compatibilidade, conexoes, cursos, exportacao, feed, geo, imagens, indice_habilidades, notificacoes,
+    presenca, swipes, tarefas, universidades, views)
+from accounts.management.commands import estresse_sqlite
+from accounts.middleware import HISTORICO_CONSULTAS, PerfiladorConsultasMiddleware
+from accounts.models import (
+    CustomUser, Interacao, Like, Superlike, Dislike, Linkeds, Conexao, FilaCandidatos, ConfiguracoesUsuario,
+    GrupoDeEstudos, MembroGrupoEstudos, AparelhoSMS, Tarefa, FotosUsuario, Universidade, Curso, Habilidades,
+    PreferenciasEstudo, Municipio)
+from accounts.texto import normalizar
+from accounts.urls import rotas_feed
+
+try:
+    import fakeredis
+except ImportError:  # sem o fakeredis os testes do backend redis sao pulados
+    fakeredis = None
+
+
+def somar(a, b):
+    # tarefas usadas nos testes da fila
+    return a + b
+
+
+def falhar():
+    raise RuntimeError('provedor fora do ar')
+
+
+# segura a tarefa lenta do teste do worker ate o teste liberar
+LIBERAR_TAREFA_LENTA = threading.Event()
+
+
+def tarefa_lenta():
+    return LIBERAR_TAREFA_LENTA.wait(timeout=10)
+
+
+def renovar_o_proprio_lease():
+    return tarefas.renovar_leases()
+
+
+def perder_o_lease():
+    # outro worker achou o lease vencido e devolveu a tarefa pra fila enquanto essa ainda rodava
+    Tarefa.objects.filter(funcao__endswith='perder_o_lease').update(status=Tarefa.PENDENTE)
+    return 'atrasado'
+
+
+def criar_usuario(nome):
+    return CustomUser.objects.create_user(username=nome, email=f'{nome}@teste.com', password='senha-teste-123')
+
+
+@override_settings(FEED_TAMANHO_LOTE=3, FEED_LIMIAR_RECARGA=1, FEED_RECARGA_EM_SEGUNDO_PLANO=False)
+class FilaCandidatosTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_usuario('dono_da_fila')
+        self.candidatos = [criar_usuario(f'candidato{i}') for i in range(5)]
+
+    def fila(self):
+        return FilaCandidatos.objects.get(user=self.usuario)
+
+    def test_lote_segue_as_configuracoes(self):
+        primeiro = feed.proximo_candidato_id(self.usuario)
+        self.assertEqual(len(self.fila().get_ids()), 3)
+        self.assertEqual(self.fila().get_ids()[0], primeiro)
+        self.assertFalse(self.fila().esgotada)
+
+    def test_swipe_na_frente_so_anda_a_fila(self):
+        primeiro = feed.proximo_candidato_id(self.usuario)
+        ids = self.fila().get_ids()
+        feed.avancar_fila(self.usuario.id, primeiro)
+        self.assertEqual((self.fila().get_ids(), self.fila().posicao), (ids, 1))
+        self.assertEqual(feed.proximo_candidato_id(self.usuario), ids[1])
+
+    def test_swipe_fora_de_ordem_invalida(self):
+        feed.proximo_candidato_id(self.usuario)
+        feed.avancar_fila(self.usuario.id, self.fila().get_ids()[2])
+        self.assertEqual((self.fila().ids, self.fila().posicao), ('', 0))
+
+    def test_recarga_tira_quem_ja_recebeu_swipe_e_marca_esgotada(self):
+        for candidato in self.candidatos[:3]:
+            Interacao.objects.create(de_usuario=self.usuario, para_usuario=candidato, tipo=Interacao.DISLIKE)
+        ids = feed.recarregar_fila(self.usuario)
+        self.assertEqual(sorted(ids), sorted(c.id for c in self.candidatos[3:]))
+        self.assertTrue(self.fila().esgotada)
+
+        # depois de passar pelos que sobraram a fila fica vazia e esgotada, sem recarregar a cada leitura
+        for alvo_id in ids:
+            Interacao.objects.create(de_usuario=self.usuario, para_usuario_id=alvo_id, tipo=Interacao.DISLIKE)
+        self.assertEqual((self.fila().restantes(), self.fila().esgotada), ([], True))
+        with self.assertNumQueries(2):
+            self.assertIsNone(feed.proximo_candidato_id(self.usuario))
+
+        # o cadastro nao mexe na fila, é a leitura que ve que entrou alguem depois da ultima recarga
+        novo = criar_usuario('chegou_agora')
+        self.assertTrue(self.fila().esgotada)
+        self.assertEqual(feed.proximo_candidato_id(self.usuario), novo.id)
+
+
+@override_settings(FEED_TAMANHO_LOTE=6, FEED_LIMIAR_RECARGA=0, FEED_RECARGA_EM_SEGUNDO_PLANO=False)
+class FeedPaginadoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario('leitor_do_feed')
+        for i in range(6):
+            criar_usuario(f'perfil{i}')
+        self.client.force_login(self.usuario)
+
+    def pagina(self, **params):
+        return self.client.get('/api/feed/', {'count': 2, **params}).json()
+
+    def test_cursor_continua_de_onde_parou(self):
+        primeira = self.pagina()
+        ids = FilaCandidatos.objects.get(user=self.usuario).get_ids()
+        segunda = self.pagina(after=primeira['cursor'])
+        self.assertEqual([p['id'] for p in primeira['perfis'] + segunda['perfis']], ids[:4])
+        self.assertFalse(segunda['reset'])
+
+    def test_cursor_fora_da_fila_recomeca_com_reset(self):
+        primeira = self.pagina()
+        # swipe fora de ordem invalida a fila, o cursor do front nao existe mais nela
+        ultimo = primeira['cursor']
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario_id=ultimo, tipo=Interacao.DISLIKE)
+        feed.avancar_fila(self.usuario.id, ultimo)
+
+        resposta = self.pagina(after=ultimo)
+        self.assertTrue(resposta['reset'])
+        self.assertEqual([p['id'] for p in resposta['perfis']],
+                         FilaCandidatos.objects.get(user=self.usuario).get_ids()[:2])
+        self.assertNotIn(ultimo, [p['id'] for p in resposta['perfis']])
+
+
+class MigracaoMixin:
+    """Testes de migracao de dados: volta o app pra uma migracao antiga, popula com os models historicos dela e migra
+    pra frente. O tearDown deixa o banco na ultima migracao de novo"""
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('accounts', alvo)])
+        return MigrationExecutor(connection).loader.project_state([('accounts', alvo)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+
+class MigracaoInteracaoTests(MigracaoMixin, TransactionTestCase):
+    def test_copia_as_tabelas_antigas_e_volta(self):
+        apps = self.migrar('0013_filacandidatos')
+        Usuario = apps.get_model('accounts', 'CustomUser')
+        Like, Superlike, Dislike = (apps.get_model('accounts', nome) for nome in ('Like', 'Superlike', 'Dislike'))
+        ana, bia, caio = (
+            Usuario.objects.create(username=nome, email=f'{nome}@teste.com') for nome in ('ana', 'bia', 'caio'))
+        antiga = timezone.now() - timedelta(days=30)
+
+        # ana deu like e superlike na bia (as tabelas antigas nao tinham unique): fica o superlike
+        Like.objects.create(de_usuario=ana, para_usuario=bia)
+        superlike = Superlike.objects.create(de_usuario=ana, para_usuario=bia, mensagem='oi!')
+        Superlike.objects.filter(pk=superlike.pk).update(data_realizacao=antiga)
+        Like.objects.create(de_usuario=bia, para_usuario=ana)
+        Dislike.objects.create(de_usuario=caio, para_usuario=ana)
+        Dislike.objects.create(de_usuario=ana, para_usuario=caio)
+        Like.objects.create(de_usuario=ana, para_usuario=caio)
+
+        # a 0015 apaga as tabelas antigas, entao a volta recria elas vazias e a 0014 preenche de novo
+        apps = self.migrar('0015_like_superlike_dislike_proxies')
+        Interacao = apps.get_model('accounts', 'Interacao')
+        copiadas = {(i.de_usuario_id, i.para_usuario_id): i for i in Interacao.objects.all()}
+        self.assertEqual({par: i.tipo for par, i in copiadas.items()}, {
+            (ana.id, bia.id): 'superlike', (bia.id, ana.id): 'like',
+            (caio.id, ana.id): 'dislike', (ana.id, caio.id): 'like'})
+        self.assertEqual(copiadas[(ana.id, bia.id)].mensagem, 'oi!')
+        self.assertEqual(copiadas[(ana.id, bia.id)].data_realizacao, antiga)
+
+        apps = self.migrar('0013_filacandidatos')
+        Like, Superlike, Dislike = (apps.get_model('accounts', nome) for nome in ('Like', 'Superlike', 'Dislike'))
+        self.assertEqual(sorted(Like.objects.values_list('de_usuario_id', 'para_usuario_id')),
+                         sorted([(bia.id, ana.id), (ana.id, caio.id)]))
+        self.assertEqual(list(Superlike.objects.values_list('de_usuario_id', 'para_usuario_id', 'mensagem')),
+                         [(ana.id, bia.id, 'oi!')])
+        self.assertEqual(Superlike.objects.get().data_realizacao, antiga)
+        self.assertEqual(list(Dislike.objects.values_list('de_usuario_id', 'para_usuario_id')), [(caio.id, ana.id)])
+
+
+class MigracaoConexaoTests(MigracaoMixin, TransactionTestCase):
+    def test_normaliza_os_links_e_grava_as_conexoes(self):
+        apps = self.migrar('0016_customuser_foto_principal')
+        Usuario, Linkeds = apps.get_model('accounts', 'CustomUser'), apps.get_model('accounts', 'Linkeds')
+        ana, bia, caio = (
+            Usuario.objects.create(username=nome, email=f'{nome}@teste.com') for nome in ('ana', 'bia', 'caio'))
+        agora = timezone.now()
+
+        def linkar(usuario1, usuario2, dias):
+            link = Linkeds.objects.create(usuario1=usuario1, usuario2=usuario2)
+            Linkeds.objects.filter(id=link.id).update(data_realizacao=agora - timedelta(days=dias))
+            return link.id
+
+        fora_de_ordem = linkar(bia, ana, 3)  # o mais antigo do par fica, com o par ordenado
+        linkar(ana, bia, 1)  # mesmo par ao contrario: apagado
+        linkar(caio, caio, 2)  # consigo mesmo: apagado
+        ordenado = linkar(ana, caio, 2)
+
+        apps = self.migrar('0017_conexao')
+        Linkeds, Conexao = apps.get_model('accounts', 'Linkeds'), apps.get_model('accounts', 'Conexao')
+        self.assertEqual(
+            sorted(Linkeds.objects.values_list('id', 'usuario1_id', 'usuario2_id')),
+            sorted([(fora_de_ordem, ana.id, bia.id), (ordenado, ana.id, caio.id)]))
+        self.assertEqual(
+            sorted(Conexao.objects.values_list('usuario_id', 'conectado_id', 'link_id', 'data_realizacao')), sorted([
+                (ana.id, bia.id, fora_de_ordem, agora - timedelta(days=3)),
+                (bia.id, ana.id, fora_de_ordem, agora - timedelta(days=3)),
+                (ana.id, caio.id, ordenado, agora - timedelta(days=2)),
+                (caio.id, ana.id, ordenado, agora - timedelta(days=2))]))
+
+        # depois da migracao o banco nao aceita mais par fora de ordem
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Linkeds.objects.create(usuario1_id=caio.id, usuario2_id=bia.id)
+
+
+class MigracaoCursoTests(MigracaoMixin, TransactionTestCase):
+    def test_junta_as_grafias_do_mesmo_curso(self):
+        apps = self.migrar('0018_universidade')
+        Usuario = apps.get_model('accounts', 'CustomUser')
+        for i, curso in enumerate(['Ciência da Computação', 'ciencia da computacao', ' Ciência da  Computação ',
+                                   'Direito', 'Não informado']):
+            Usuario.objects.create(username=f'aluno{i}', email=f'aluno{i}@teste.com', curso=curso)
+
+        apps = self.migrar('0019_curso')
+        Curso, Usuario = apps.get_model('accounts', 'Curso'), apps.get_model('accounts', 'CustomUser')
+        self.assertEqual(sorted(Curso.objects.values_list('nome_normalizado', 'nome')), [
+            ('ciencia da computacao', 'Ciência da Computação'), ('direito', 'Direito')])
+        self.assertEqual(
+            Usuario.objects.filter(curso_canonico__nome_normalizado='ciencia da computacao').count(), 3)
+        self.assertIsNone(Usuario.objects.get(username='aluno4').curso_canonico_id)
+
+
+class InteracaoProxiesTests(TestCase):
+    def test_proxy_preenche_e_filtra_o_tipo(self):
+        ana, bia, caio = criar_usuario('ana'), criar_usuario('bia'), criar_usuario('caio')
+        Superlike.objects.create(de_usuario=ana, para_usuario=bia, mensagem='oi!')
+        Dislike.objects.create(de_usuario=ana, para_usuario=caio)
+        self.assertEqual(Interacao.objects.get(de_usuario=ana, para_usuario=bia).tipo, Interacao.SUPERLIKE)
+        self.assertEqual(list(Dislike.objects.values_list('para_usuario_id', flat=True)), [caio.id])
+        self.assertFalse(Like.objects.exists())
+
+    def test_uma_interacao_por_par(self):
+        ana, bia = criar_usuario('ana'), criar_usuario('bia')
+        Like.objects.create(de_usuario=ana, para_usuario=bia)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Dislike.objects.create(de_usuario=ana, para_usuario=bia)
+        # o outro sentido é outro par
+        Dislike.objects.create(de_usuario=bia, para_usuario=ana)
+
+
+class SwipeTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_usuario('quem_curte')
+        self.alvo = criar_usuario('quem_recebe')
+
+    def test_resultados_do_insert_direto(self):
+        self.assertEqual(swipes.registrar_swipe(self.usuario, self.usuario.id, Interacao.LIKE), swipes.PROPRIO_USUARIO)
+        self.assertEqual(swipes.registrar_swipe(self.usuario, 999999, Interacao.LIKE), swipes.NAO_ENCONTRADO)
+        self.assertEqual(swipes.registrar_swipe(self.usuario, self.alvo.id, Interacao.DISLIKE), swipes.REGISTRADO)
+        self.assertEqual(swipes.registrar_swipe(self.usuario, self.alvo.id, Interacao.LIKE), swipes.JA_INTERAGIU)
+        self.assertEqual(
+            list(Interacao.objects.values_list('de_usuario_id', 'para_usuario_id', 'tipo')),
+            [(self.usuario.id, self.alvo.id, Interacao.DISLIKE)])
+
+    def test_mensagem_so_fica_no_superlike(self):
+        with mock.patch.object(notificacoes, 'notificar_superlike') as notificar:
+            swipes.registrar_swipe(self.usuario, self.alvo.id, Interacao.SUPERLIKE, 'oi, tudo bem?')
+        self.assertEqual(Interacao.objects.get().mensagem, 'oi, tudo bem?')
+        notificar.assert_called_once_with(self.usuario.id, self.alvo.id, 'oi, tudo bem?')
+
+        outro = criar_usuario('outro_alvo')
+        swipes.registrar_swipe(self.usuario, outro.id, Interacao.LIKE, 'ignorada')
+        self.assertEqual(Interacao.objects.get(para_usuario=outro).mensagem, '')
+
+    def test_like_de_volta_cria_o_link_com_o_par_ordenado(self):
+        Interacao.objects.create(de_usuario=self.alvo, para_usuario=self.usuario, tipo=Interacao.SUPERLIKE)
+        with mock.patch.object(notificacoes, 'notificar_link') as notificar:
+            self.assertEqual(swipes.registrar_swipe(self.alvo, self.usuario.id, Interacao.LIKE), swipes.JA_INTERAGIU)
+            self.assertEqual(swipes.registrar_swipe(self.usuario, self.alvo.id, Interacao.LIKE), swipes.LINKED)
+        notificar.assert_called_once_with(self.usuario.id, self.alvo.id)
+
+        link = Linkeds.objects.get()
+        self.assertEqual((link.usuario1_id, link.usuario2_id), conexoes.par_ordenado(self.usuario.id, self.alvo.id))
+        self.assertEqual(
+            sorted(Conexao.objects.values_list('usuario_id', 'conectado_id', 'link_id')),
+            sorted([(self.usuario.id, self.alvo.id, link.id), (self.alvo.id, self.usuario.id, link.id)]))
+
+    def test_dislike_de_volta_nao_cria_link(self):
+        Interacao.objects.create(de_usuario=self.alvo, para_usuario=self.usuario, tipo=Interacao.DISLIKE)
+        self.assertEqual(swipes.registrar_swipe(self.usuario, self.alvo.id, Interacao.LIKE), swipes.REGISTRADO)
+        self.assertFalse(Linkeds.objects.exists())
+
+    def test_link_repetido_e_ignorado(self):
+        # os dois lados chegam no insert do link (ex: criar_link_se_mutuo chamado de novo): so o primeiro cria
+        Interacao.objects.create(de_usuario=self.alvo, para_usuario=self.usuario, tipo=Interacao.LIKE)
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario=self.alvo, tipo=Interacao.LIKE)
+        self.assertTrue(swipes.criar_link_se_mutuo(self.usuario.id, self.alvo.id))
+        self.assertFalse(swipes.criar_link_se_mutuo(self.alvo.id, self.usuario.id))
+        self.assertEqual((Linkeds.objects.count(), Conexao.objects.count()), (1, 2))
+
+
+class BancoEmArquivoMixin:
+    """O banco de teste do SQLite fica em memoria com cache compartilhado, onde quem esbarra no lock de outra conexao
+    recebe erro na hora em vez de esperar o timeout. Pros testes com threads escrevendo ao mesmo tempo, a classe copia o
+    banco pra um arquivo e aponta o default pra ele, como é em producao"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.diretorio = tempfile.TemporaryDirectory()
+        banco = connections['default']
+        banco.ensure_connection()
+        caminho = str(Path(cls.diretorio.name) / 'banco.sqlite3')
+        arquivo = sqlite3.connect(caminho)
+        banco.connection.backup(arquivo)
+        arquivo.close()
+        # a conexao em memoria continua aberta (guardada aqui), senao o banco em memoria some
+        cls.memoria = (banco.settings_dict['NAME'], banco.connection)
+        banco.connection = None
+        banco.settings_dict['NAME'] = caminho
+
+    @classmethod
+    def tearDownClass(cls):
+        banco = connections['default']
+        banco.close()
+        banco.settings_dict['NAME'], banco.connection = cls.memoria
+        cls.diretorio.cleanup()
+        super().tearDownClass()
+
+
+class SwipeConcorrenteTests(BancoEmArquivoMixin, TransactionTestCase):
+    def test_likes_mutuos_ao_mesmo_tempo_criam_um_link(self):
+        for rodada in range(3):
+            a, b = criar_usuario(f'corrida_a{rodada}'), criar_usuario(f'corrida_b{rodada}')
+            barreira = threading.Barrier(2)
+            resultados = []
+
+            def curtir(usuario, alvo):
+                try:
+                    barreira.wait()
+                    resultados.append(swipes.registrar_swipe(usuario, alvo.id, Interacao.LIKE))
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=curtir, args=par) for par in ((a, b), (b, a))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # os inserts da interacao e do link ficam na mesma transacao: quem chega depois sempre ve o like do outro
+            self.assertEqual(sorted(resultados), [swipes.LINKED, swipes.REGISTRADO])
+            usuario1_id, usuario2_id = conexoes.par_ordenado(a.id, b.id)
+            self.assertEqual(Linkeds.objects.filter(usuario1_id=usuario1_id, usuario2_id=usuario2_id).count(), 1)
+            self.assertEqual(Conexao.objects.filter(usuario_id__in=[a.id, b.id]).count(), 2)
+
+
+class SwipesEmLoteTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_usuario('swipes_offline')
+        self.client.force_login(self.usuario)
+
+    def enviar(self, acoes):
+        return self.client.post('/api/swipes/batch/', json.dumps({'acoes': acoes}), content_type='application/json')
+
+    def resultados(self, acoes):
+        return [item['resultado'] for item in self.enviar(acoes).json()['resultados']]
+
+    def test_limite_do_lote(self):
+        alvo = criar_usuario('alvo_do_lote')
+        acoes = [{'tipo': Interacao.LIKE, 'user_id': alvo.id}] * (swipes.TAMANHO_MAXIMO_LOTE + 1)
+        self.assertEqual(self.enviar(acoes).status_code, 400)
+        self.assertEqual(self.enviar([]).status_code, 400)
+        self.assertEqual(len(self.resultados(acoes[:swipes.TAMANHO_MAXIMO_LOTE])), swipes.TAMANHO_MAXIMO_LOTE)
+        self.assertEqual(Interacao.objects.count(), 1)
+
+    def test_resultados_misturados_na_ordem(self):
+        curtido, rejeitado, ja_visto = criar_usuario('curtido'), criar_usuario('rejeitado'), criar_usuario('ja_visto')
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario=ja_visto, tipo=Interacao.DISLIKE)
+        with mock.patch.object(notificacoes, 'notificar_superlike') as notificar:
+            resultados = self.resultados([
+                {'tipo': Interacao.SUPERLIKE, 'user_id': curtido.id, 'mensagem': 'bora estudar junto?'},
+                {'tipo': 'amei', 'user_id': rejeitado.id},
+                {'tipo': Interacao.SUPERLIKE, 'user_id': rejeitado.id, 'mensagem': 'curta'},
+                {'tipo': Interacao.DISLIKE, 'user_id': rejeitado.id},
+                {'tipo': Interacao.LIKE, 'user_id': ja_visto.id},
+                {'tipo': Interacao.LIKE, 'user_id': self.usuario.id},
+                {'tipo': Interacao.LIKE, 'user_id': 999999},
+            ])
+        self.assertEqual(resultados, [
+            swipes.REGISTRADO, swipes.INVALIDO, swipes.INVALIDO, swipes.REGISTRADO, swipes.JA_INTERAGIU,
+            swipes.PROPRIO_USUARIO, swipes.NAO_ENCONTRADO])
+        notificar.assert_called_once_with(self.usuario.id, curtido.id, 'bora estudar junto?')
+        self.assertEqual(
+            dict(Interacao.objects.filter(de_usuario=self.usuario).values_list('para_usuario_id', 'tipo')),
+            {curtido.id: Interacao.SUPERLIKE, rejeitado.id: Interacao.DISLIKE, ja_visto.id: Interacao.DISLIKE})
+
+    def test_links_do_lote(self):
+        fas = [criar_usuario(f'fa{i}') for i in range(3)]
+        Interacao.objects.create(de_usuario=fas[0], para_usuario=self.usuario, tipo=Interacao.LIKE)
+        Interacao.objects.create(de_usuario=fas[1], para_usuario=self.usuario, tipo=Interacao.SUPERLIKE)
+        Interacao.objects.create(de_usuario=fas[2], para_usuario=self.usuario, tipo=Interacao.LIKE)
+        with mock.patch.object(notificacoes, 'notificar_link') as notificar:
+            resultados = self.enviar([
+                {'tipo': Interacao.LIKE, 'user_id': fas[0].id},
+                {'tipo': Interacao.SUPERLIKE, 'user_id': fas[1].id, 'mensagem': 'finalmente um link!'},
+                {'tipo': Interacao.DISLIKE, 'user_id': fas[2].id},
+            ]).json()['resultados']
+        self.assertEqual([item['matched'] for item in resultados], [True, True, False])
+        self.assertEqual(sorted(chamada.args[1] for chamada in notificar.call_args_list), [fas[0].id, fas[1].id])
+        self.assertEqual(Linkeds.objects.count(), 2)
+        self.assertEqual(Conexao.objects.filter(usuario=self.usuario).count(), 2)
+
+    def test_um_insert_por_bloco(self):
+        alvos = [criar_usuario(f'em_bloco{i}') for i in range(5)]
+        acoes = [{'tipo': Interacao.DISLIKE, 'user_id': alvo.id} for alvo in alvos]
+
+        def inserts(consultas):
+            return [c for c in consultas if c['sql'].lstrip().startswith(f'INSERT INTO {swipes.TABELA_INTERACAO}')]
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.resultados(acoes[:3]), [swipes.REGISTRADO] * 3)
+        self.assertEqual(len(inserts(consultas)), 1)
+
+        with mock.patch.object(swipes, 'LINHAS_POR_INSERT', 1), CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.resultados(acoes), [swipes.JA_INTERAGIU] * 3 + [swipes.REGISTRADO] * 2)
+        self.assertEqual(len(inserts(consultas)), 2)
+        self.assertEqual(Interacao.objects.filter(de_usuario=self.usuario).count(), 5)
+
+    def test_alvo_repetido_vale_a_primeira_acao(self):
+        alvo = criar_usuario('repetido')
+        resultados = self.resultados([
+            {'tipo': Interacao.DISLIKE, 'user_id': alvo.id}, {'tipo': Interacao.LIKE, 'user_id': alvo.id}])
+        self.assertEqual(resultados, [swipes.REGISTRADO, swipes.JA_INTERAGIU])
+        self.assertEqual(Interacao.objects.get().tipo, Interacao.DISLIKE)
+
+    def test_par_gravado_por_outro_request_no_meio_vira_ja_interagiu(self):
+        alvo, outro = criar_usuario('disputado'), criar_usuario('tranquilo')
+        # o alvo ja curtiu: se o like do lote valesse, viraria link
+        Interacao.objects.create(de_usuario=alvo, para_usuario=self.usuario, tipo=Interacao.LIKE)
+        disparado = []
+
+        def outro_request_antes(execute, sql, params, many, context):
+            # o swipe unico do mesmo usuario grava o par entre a validacao e o primeiro insert do lote
+            if not disparado and sql.lstrip().startswith(f'INSERT INTO {swipes.TABELA_INTERACAO}'):
+                disparado.append(sql)
+                Interacao.objects.create(de_usuario=self.usuario, para_usuario=alvo, tipo=Interacao.DISLIKE)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(outro_request_antes), \
+                mock.patch.object(notificacoes, 'notificar_link') as notificar:
+            resultados = self.resultados([
+                {'tipo': Interacao.LIKE, 'user_id': alvo.id}, {'tipo': Interacao.LIKE, 'user_id': outro.id}])
+        self.assertEqual(resultados, [swipes.JA_INTERAGIU, swipes.REGISTRADO])
+        notificar.assert_not_called()
+        self.assertFalse(Linkeds.objects.exists())
+        self.assertEqual(Interacao.objects.get(de_usuario=self.usuario, para_usuario=alvo).tipo, Interacao.DISLIKE)
+
+
+def view_n_mais_um(request):
+    # a mesma consulta num laco, o caso que o perfilador tem que apontar
+    ids = [usuario.id for usuario in CustomUser.objects.all()]
+    return JsonResponse({'eu': request.user.id, 'existem': [CustomUser.objects.filter(id=i).exists() for i in ids]})
+
+
+ROTAS_PERFILADOR = types.ModuleType('rotas_perfilador')
+ROTAS_PERFILADOR.urlpatterns = [path('n-mais-um/', view_n_mais_um)]
+
+
+@override_settings(ROOT_URLCONF=ROTAS_PERFILADOR)
+class PerfiladorConsultasTests(TestCase):
+    def setUp(self):
+        HISTORICO_CONSULTAS.clear()
+        self.usuario = criar_usuario('perfilado')
+        for i in range(4):
+            criar_usuario(f'repetido{i}')
+        self.client.force_login(self.usuario)
+
+    @override_settings(PERFILADOR_CONSULTAS=True)
+    def test_consulta_repetida_no_laco_e_apontada(self):
+        resposta = self.client.get('/n-mais-um/')
+        self.assertIn('dup;desc="1 consultas repetidas"', resposta['Server-Timing'])
+
+        registro, = HISTORICO_CONSULTAS
+        duplicada, = registro['duplicadas']
+        self.assertEqual(duplicada['vezes'], 5)
+        self.assertIn('LIMIT ?', duplicada['sql'])
+        # 5 do laco + a lista de usuarios + sessao e usuario do request (o perfilador é o primeiro middleware)
+        self.assertEqual(registro['consultas'], 8)
+        self.assertIn('db;dur=', resposta['Server-Timing'])
+        self.assertIn(f'desc="{registro["consultas"]} consultas"', resposta['Server-Timing'])
+
+    @override_settings(PERFILADOR_CONSULTAS=False)
+    def test_desligado_nem_entra_na_cadeia(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            PerfiladorConsultasMiddleware(lambda request: None)
+        resposta = self.client.get('/n-mais-um/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('Server-Timing', resposta)
+        self.assertEqual(len(HISTORICO_CONSULTAS), 0)
+
+
+class FotoPrincipalTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        self.usuario = criar_usuario('dono_das_fotos')
+
+    def foto(self, usuario=None):
+        return FotosUsuario.objects.create(
+            user=usuario or self.usuario, imagem=SimpleUploadedFile('foto.jpg', b'conteudo da foto'))
+
+    def principal_id(self, usuario=None):
+        return CustomUser.objects.get(id=(usuario or self.usuario).id).foto_principal_id
+
+    def test_primeira_foto_vira_a_principal(self):
+        primeira = self.foto()
+        self.foto()
+        self.assertTrue(primeira.foto_perfil)
+        self.assertEqual(self.principal_id(), primeira.id)
+
+    def test_trocar_e_desmarcar_a_principal(self):
+        primeira, segunda = self.foto(), self.foto()
+        # como o definir_foto_perfil: desmarca todas por update e salva a nova
+        self.usuario.fotos.update(foto_perfil=False)
+        segunda.foto_perfil = True
+        segunda.save()
+        self.assertEqual(self.principal_id(), segunda.id)
+
+        segunda.foto_perfil = False
+        segunda.save()
+        self.assertIsNone(self.principal_id())
+
+    def test_apagar_a_principal_promove_a_proxima(self):
+        primeira, segunda, terceira = self.foto(), self.foto(), self.foto()
+        terceira.delete()
+        self.assertEqual(self.principal_id(), primeira.id)
+
+        primeira.delete()
+        self.assertTrue(FotosUsuario.objects.get(id=segunda.id).foto_perfil)
+        self.assertEqual(self.principal_id(), segunda.id)
+
+        segunda.delete()
+        self.assertIsNone(self.principal_id())
+
+    def test_pagina_de_linkeds_nao_faz_uma_consulta_por_foto(self):
+        self.client.force_login(self.usuario)
+
+        def consultas_da_pagina(quantidade):
+            for i in range(conexoes.conexoes_de(self.usuario).count(), quantidade):
+                outro = criar_usuario(f'linkado_com_foto{i}')
+                self.foto(outro)
+                conexoes.criar_link(self.usuario.id, outro.id)
+            # o primeiro request da sessao faz consultas a mais, entao mede o segundo, com o cache limpo pros cartoes
+            # serem montados do banco
+            self.client.get('/api/linkeds/')
+            cache.clear()
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.client.get('/api/linkeds/')
+            self.assertEqual(len(resposta.json()['linkeds']), quantidade)
+            self.assertTrue(all(l['image'] for l in resposta.json()['linkeds']))
+            return len(consultas)
+
+        uma = consultas_da_pagina(1)
+        consultas_da_pagina(8)
+        cache.clear()
+        with self.assertNumQueries(uma):
+            resposta = self.client.get('/api/linkeds/')
+        self.assertEqual(len(resposta.json()['linkeds']), 8)
+
+
+class LinkedsPaginadosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario('com_links')
+        self.client.force_login(self.usuario)
+        self.base = timezone.now() - timedelta(days=1)
+        # 5 links, os tres do meio com a mesma data (o cursor desempata pelo id)
+        self.linkados = []
+        for i, minutos in enumerate([50, 40, 40, 40, 10]):
+            outro = criar_usuario(f'linkado{i}')
+            self.linkar(outro, self.base + timedelta(minutes=minutos))
+
+    def linkar(self, outro, data):
+        link, _ = conexoes.criar_link(self.usuario.id, outro.id)
+        Conexao.objects.filter(link=link).update(data_realizacao=data)
+        self.linkados.append(outro)
+
+    def get(self, etag=None, **params):
+        return self.client.get('/api/linkeds/', params, headers={'if-none-match': etag} if etag else {})
+
+    def esperados(self):
+        return list(conexoes.conexoes_de(self.usuario).values_list('conectado_id', flat=True))
+
+    def test_pagina_nao_carrega_as_conexoes(self):
+        # a lista sai do /api/linkeds/ paginado, a pagina so monta o html
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/linkeds/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('linkeds', resposta.context)
+        self.assertFalse([consulta for consulta in consultas if 'accounts_conexao' in consulta['sql']])
+
+    def test_paginas_cobrem_tudo_sem_repetir(self):
+        for limite in (1, 2, 3, 5):
+            ids, cursor = [], None
+            while True:
+                dados = self.get(limit=limite, **({'cursor': cursor} if cursor else {})).json()
+                ids += [link['id'] for link in dados['linkeds']]
+                cursor = dados['next_cursor']
+                if not cursor:
+                    break
+            self.assertEqual(ids, self.esperados(), f'limit={limite}')
+
+    def test_ultima_pagina_exata_nao_tem_cursor(self):
+        self.assertIsNone(self.get(limit=5).json()['next_cursor'])
+        self.assertIsNotNone(self.get(limit=4).json()['next_cursor'])
+
+    def test_since_so_traz_os_mais_novos(self):
+        # estritamente depois: quem tem a mesma data do since nao volta
+        dados = self.get(since=(self.base + timedelta(minutes=40)).isoformat()).json()
+        self.assertEqual([link['id'] for link in dados['linkeds']], [self.linkados[0].id])
+        dados = self.get(since=(self.base + timedelta(minutes=10)).isoformat()).json()
+        self.assertEqual([link['id'] for link in dados['linkeds']], self.esperados()[:4])
+
+    def test_parametros_invalidos(self):
+        for params in ({'limit': 'x'}, {'since': 'ontem'}, {'cursor': 'nao-e-cursor'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_etag_responde_304_ate_mudar_link_ou_cartao(self):
+        resposta = self.get(limit=2)
+        etag = resposta['ETag']
+        self.assertEqual(self.get(etag, limit=2).status_code, 304)
+        # outra pagina é outro etag
+        self.assertNotEqual(self.get(limit=3)['ETag'], etag)
+
+        # linkado da pagina mudou o perfil: o cartao é invalidado e a resposta muda
+        primeiro = CustomUser.objects.get(id=resposta.json()['linkeds'][0]['id'])
+        primeiro.username = 'nome_novo'
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro.save()
+        resposta = self.get(etag, limit=2)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['linkeds'][0]['name'], 'nome_novo')
+        etag = resposta['ETag']
+
+        self.linkar(criar_usuario('link_novo'), timezone.now())
+        self.assertEqual(self.get(etag, limit=2).status_code, 200)
+
+
+class IndicesCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidacao_de_outro_processo_remonta_os_indices(self):
+        Universidade.objects.create(codigo='ufx', nome='Universidade Federal X', sigla='UFX', cidade='X', estado='SP')
+        Curso.objects.create(nome='Direito', nome_normalizado='direito')
+        self.assertEqual([u['id'] for u in universidades.obter_indice().buscar('federal')], ['ufx'])
+        self.assertEqual([c['nome'] for c in cursos.obter_indice().buscar('dir')], ['Direito'])
+
+        # o carregar_universidades (outro processo) grava e sobe as versoes no cache, sem tocar na memoria desse
+        Universidade.objects.create(codigo='ufy', nome='Universidade Federal Y', sigla='UFY', cidade='Y', estado='RJ')
+        Curso.objects.create(nome='Design', nome_normalizado='design')
+        self.assertEqual(len(universidades.obter_indice().buscar('federal')), 1)
+        cache.set(universidades.CHAVE_VERSAO, universidades.versao_atual() + 1)
+        cache.set(cursos.CHAVE_VERSAO, cursos.versao_atual() + 1)
+
+        self.assertEqual(sorted(u['id'] for u in universidades.obter_indice().buscar('federal')), ['ufx', 'ufy'])
+        self.assertEqual(sorted(c['nome'] for c in cursos.obter_indice().buscar('d')), ['Design', 'Direito'])
+
+    def test_carregar_universidades_avisa_que_o_locmem_nao_invalida_os_outros_processos(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = Path(pasta) / 'universidades.json'
+            arquivo.write_text(json.dumps([{'id': 'ufz', 'nome': 'Universidade Federal Z', 'cursos': ['Direito']}]))
+            for tipo, avisa in [('locmem', True), ('arquivo', False)]:
+                saida = io.StringIO()
+                with override_settings(CACHE_TIPO=tipo):
+                    call_command('carregar_universidades', str(arquivo), stdout=io.StringIO(), stderr=saida)
+                self.assertEqual('UNICROSSED_CACHE=locmem' in saida.getvalue(), avisa)
+
+
+    def test_os_dois_catalogos_ranqueiam_pela_mesma_busca(self):
+        indice = universidades.IndiceUniversidades([
+            Universidade(codigo='1', nome='Universidade Estadual Paulista', sigla='UNESP', cidade='Sao Paulo', estado='SP'),
+            Universidade(codigo='2', nome='Universidade de Sao Paulo', sigla='USP', cidade='Sao Paulo', estado='SP'),
+            Universidade(codigo='3', nome='Faculdade Paulista', sigla='FP', cidade='Santos', estado='SP')])
+        self.assertEqual([u['id'] for u in indice.buscar('usp')], ['2'])
+        # nome comecando com o termo vem antes, depois o nome mais curto
+        self.assertEqual([u['id'] for u in indice.buscar('paulista')], ['3', '1'])
+        self.assertEqual([u['id'] for u in indice.buscar('facudade')], ['3'])
+
+        def curso(id, nome, alunos):
+            return types.SimpleNamespace(id=id, nome=nome, nome_normalizado=normalizar(nome), total_alunos=alunos)
+        indice = cursos.IndiceCursos([
+            curso(1, 'Engenharia Civil', 3), curso(2, 'Engenharia de Software', 9), curso(3, 'Engenharia Eletrica', 1)])
+        self.assertEqual([c['id'] for c in indice.buscar('engenharia')], [2, 1, 3])
+        # o curso oferecido na universidade do usuario passa na frente do mais popular
+        self.assertEqual([c['id'] for c in indice.buscar('engenharia', preferidos=['engenharia civil'])], [1, 2, 3])
+        self.assertEqual([c['id'] for c in indice.buscar('engenaria eletrica')], [3])
+
+
+class CompatibilidadeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python, self.sql = Habilidades.objects.create(nome='Python'), Habilidades.objects.create(nome='SQL')
+        self.usuario = self.perfil('eu', 'SP', 'Campinas', 'usp', ['segunda', 'quarta'], [self.python, self.sql])
+        self.gemeo = self.perfil('gemeo', 'SP', 'Campinas', 'usp', ['segunda', 'quarta'], [self.python, self.sql])
+        self.mesmo_estado = self.perfil('paulista', 'SP', 'Santos', 'unicamp', ['sexta'], [])
+        self.outro_estado = self.perfil('carioca', 'RJ', 'Rio de Janeiro', 'ufrj', ['sexta'], [])
+        self.so_habilidade = self.perfil('sqlzeiro', 'Não informado', 'Não informado', 'Não informado', [], [self.sql])
+
+    def perfil(self, nome, estado, cidade, universidade, dias, habilidades):
+        usuario = criar_usuario(nome)
+        usuario.estado, usuario.cidade, usuario.universidade = estado, cidade, universidade
+        usuario.save()
+        usuario.habilidades.set(habilidades)
+        if dias:
+            PreferenciasEstudo.objects.create(user=usuario, dia_semana=dias, horario=['noite'], metodo_preferido=['online'])
+        return usuario
+
+    def ranking(self):
+        return compatibilidade.ranquear(self.usuario, CustomUser.objects.exclude(id=self.usuario.id), 10)
+
+    def test_bits_habilidades_acompanham_o_m2m(self):
+        bits = bytes(CustomUser.objects.get(id=self.usuario.id).bits_habilidades)
+        self.assertEqual(bits, compatibilidade.bytes_habilidades([self.python.id, self.sql.id]))
+        self.usuario.habilidades.remove(self.python)
+        self.assertEqual(bytes(CustomUser.objects.get(id=self.usuario.id).bits_habilidades),
+                         compatibilidade.bytes_habilidades([self.sql.id]))
+        self.usuario.habilidades.clear()
+        self.assertEqual(bytes(CustomUser.objects.get(id=self.usuario.id).bits_habilidades), b'')
+
+    def test_ordem_pela_compatibilidade(self):
+        ranking = self.ranking()
+        self.assertEqual(ranking[0], self.gemeo.id)
+        # o estado do proprio usuario conta (o primeiro texto codificado nao pode virar "nao informado")
+        self.assertLess(ranking.index(self.mesmo_estado.id), ranking.index(self.outro_estado.id))
+
+    def test_habilidades_de_id_alto_nao_colidem(self):
+        # ids 256 acima dos do usuario caiam nos mesmos bits quando o bitset tinha tamanho fixo
+        distantes = [Habilidades.objects.create(id=habilidade.id + 256, nome=f'{habilidade.nome} 2')
+                     for habilidade in (self.python, self.sql)]
+        distante = self.perfil('distante', 'Não informado', 'Não informado', 'Não informado', [], distantes)
+        self.assertGreater(len(bytes(CustomUser.objects.get(id=distante.id).bits_habilidades)), 32)
+        ranking = self.ranking()
+        self.assertLess(ranking.index(self.so_habilidade.id), ranking.index(distante.id))
+        with mock.patch.object(compatibilidade, 'np', None):
+            self.assertEqual(self.ranking(), ranking)
+
+    @skipUnless(compatibilidade.np is not None, 'sem numpy')
+    def test_numpy_e_python_puro_dao_o_mesmo_ranking(self):
+        com_numpy = self.ranking()
+        with mock.patch.object(compatibilidade, 'np', None):
+            self.assertEqual(self.ranking(), com_numpy)
+
+
+class MascaraBitsTests(TestCase):
+    def setUp(self):
+        # segunda=bit0, terca=bit1, quarta=bit2...; manha=bit0, tarde=bit1, noite=bit2
+        self.manha_seg = self.preferencias('manha_seg', ['segunda'], ['manha'])
+        self.noite_seg_qua = self.preferencias('noite_seg_qua', ['segunda', 'quarta'], ['noite'])
+        self.tudo_sabado = self.preferencias('tudo_sabado', ['sabado'], ['manha', 'tarde', 'noite'])
+
+    def preferencias(self, nome, dias, horarios):
+        return PreferenciasEstudo.objects.create(user=criar_usuario(nome), dia_semana=dias, horario=horarios)
+
+    def usuarios(self, **filtro):
+        return set(PreferenciasEstudo.objects.filter(**filtro).values_list('user__username', flat=True))
+
+    def test_save_grava_as_mascaras(self):
+        self.assertEqual(PreferenciasEstudo.mascara('dia_semana', ['segunda', 'quarta']), 0b101)
+        self.assertEqual(PreferenciasEstudo.mascara('horario', 'manha,noite'), 0b101)
+        self.noite_seg_qua.refresh_from_db()
+        self.assertEqual((self.noite_seg_qua.dia_semana_bits, self.noite_seg_qua.horario_bits), (0b101, 0b100))
+        self.assertEqual(self.tudo_sabado.horario_bits, 0b111)
+
+    def test_algum_bit(self):
+        self.assertEqual(self.usuarios(dia_semana_bits__algum_bit=0b1), {'manha_seg', 'noite_seg_qua'})
+        self.assertEqual(self.usuarios(dia_semana_bits__algum_bit=0b100100), {'noite_seg_qua', 'tudo_sabado'})
+        self.assertEqual(self.usuarios(horario_bits__algum_bit=0b10), {'tudo_sabado'})
+        self.assertEqual(self.usuarios(dia_semana_bits__algum_bit=0b1000000), set())
+        self.assertEqual(self.usuarios(dia_semana_bits__algum_bit=0), set())
+
+    def test_todos_bits(self):
+        self.assertEqual(self.usuarios(dia_semana_bits__todos_bits=0b101), {'noite_seg_qua'})
+        self.assertEqual(self.usuarios(horario_bits__todos_bits=0b101), {'tudo_sabado'})
+        self.assertEqual(self.usuarios(horario_bits__todos_bits=0b1), {'manha_seg', 'tudo_sabado'})
+        # mascara vazia: todo mundo tem "todas" as opcoes dela
+        self.assertEqual(self.usuarios(horario_bits__todos_bits=0), {'manha_seg', 'noite_seg_qua', 'tudo_sabado'})
+
+    def test_filtros_de_disponibilidade(self):
+        referencia = PreferenciasEstudo(dia_semana_bits=0b1, horario_bits=0b100)  # segunda a noite
+        self.assertEqual(
+            set(PreferenciasEstudo.objects.compativeis_com(referencia).values_list('user__username', flat=True)),
+            {'noite_seg_qua'})
+        self.assertEqual(
+            set(CustomUser.objects.disponiveis_junto_com(referencia).values_list('username', flat=True)), {'noite_seg_qua'})
+
+
+class GeoRaioTests(TestCase):
+    # coordenadas reais (graus): Sao Paulo-Campinas ~84 km, Sao Paulo-Santos ~55 km, Sao Paulo-Rio ~360 km
+    MUNICIPIOS = [
+        ('3550308', 'São Paulo', 'SP', -23.5505, -46.6333),
+        ('3509502', 'Campinas', 'SP', -22.9056, -47.0608),
+        ('3548500', 'Santos', 'SP', -23.9608, -46.3336),
+        ('3304557', 'Rio de Janeiro', 'RJ', -22.9068, -43.1729),
+        # do lado de uma quina da grade de 0,5 grau: (-23.0, -47.0)
+        ('9999991', 'Quina Norte', 'SP', -22.99, -46.99),
+        ('9999992', 'Quina Sul', 'SP', -23.01, -47.01),
+    ]
+
+    def setUp(self):
+        for codigo, nome, uf, latitude, longitude in self.MUNICIPIOS:
+            Municipio.objects.create(
+                codigo=codigo, nome=nome, nome_normalizado=normalizar(nome), uf=uf,
+                latitude=latitude, longitude=longitude)
+        self.usuarios = {nome: self.morador(nome, uf) for codigo, nome, uf, latitude, longitude in self.MUNICIPIOS}
+        self.sem_local = self.morador('Cidade Que Nao Existe', 'SP')
+
+    def morador(self, cidade, estado):
+        usuario = criar_usuario(normalizar(cidade).replace(' ', '_'))
+        usuario.cidade, usuario.estado = cidade, estado
+        usuario.save()
+        return usuario
+
+    def no_raio(self, cidade, raio_km, **kwargs):
+        centro = self.usuarios[cidade]
+        return set(CustomUser.objects.no_raio(centro.latitude, centro.longitude, raio_km, **kwargs)
+                   .values_list('cidade', flat=True))
+
+    def test_save_resolve_coordenadas_e_celula(self):
+        campinas = self.usuarios['Campinas']
+        self.assertEqual((campinas.latitude, campinas.longitude), (-22.9056, -47.0608))
+        self.assertEqual(campinas.geocelula, geo.celula(-22.9056, -47.0608))
+        self.assertIsNone(self.sem_local.latitude)
+        self.assertIsNone(self.sem_local.geocelula)
+
+        # o estado pode vir por extenso
+        campinas.estado = 'São Paulo'
+        campinas.cidade = 'Rio de Janeiro'
+        campinas.save()
+        self.assertIsNone(campinas.latitude)
+        campinas.estado = 'rio de janeiro'
+        campinas.save()
+        self.assertEqual((campinas.latitude, campinas.longitude), (-22.9068, -43.1729))
+
+    def test_haversine_em_python(self):
+        self.assertAlmostEqual(geo.distancia_km(-23.5505, -46.6333, -22.9068, -43.1729), 357, delta=5)
+        self.assertAlmostEqual(geo.distancia_km(-23.5505, -46.6333, -22.9056, -47.0608), 84, delta=3)
+        self.assertEqual(geo.distancia_km(-23.5505, -46.6333, -23.5505, -46.6333), 0)
+        # um grau de latitude no meridiano
+        self.assertAlmostEqual(geo.distancia_km(0, 0, 1, 0), 111.19, delta=0.1)
+
+    def test_haversine_em_sql_bate_com_o_python(self):
+        centro = self.usuarios['São Paulo']
+        distancias = CustomUser.objects.filter(latitude__isnull=False).annotate(
+            distancia=geo.expressao_distancia(centro.latitude, centro.longitude)).values_list(
+            'latitude', 'longitude', 'distancia')
+        self.assertEqual(len(distancias), len(self.MUNICIPIOS))
+        for latitude, longitude, distancia in distancias:
+            self.assertAlmostEqual(
+                distancia, geo.distancia_km(centro.latitude, centro.longitude, latitude, longitude), places=6)
+
+    def test_no_raio(self):
+        self.assertEqual(self.no_raio('São Paulo', 60), {'São Paulo', 'Santos'})
+        self.assertEqual(
+            self.no_raio('São Paulo', 100), {'São Paulo', 'Santos', 'Campinas', 'Quina Norte', 'Quina Sul'})
+        self.assertEqual(self.no_raio('São Paulo', 400), {nome for codigo, nome, *resto in self.MUNICIPIOS})
+        self.assertEqual(self.no_raio('Rio de Janeiro', 100), {'Rio de Janeiro'})
+        self.assertEqual(
+            self.no_raio('Rio de Janeiro', 100, incluir_sem_localizacao=True),
+            {'Rio de Janeiro', 'Cidade Que Nao Existe'})
+
+    def test_no_raio_atravessa_as_celulas_da_grade(self):
+        norte, sul = self.usuarios['Quina Norte'], self.usuarios['Quina Sul']
+        # pontos a ~3 km um do outro, mas em linhas e colunas diferentes da grade
+        self.assertNotEqual(norte.geocelula, sul.geocelula)
+        self.assertNotEqual(norte.geocelula // geo.COLUNAS, sul.geocelula // geo.COLUNAS)
+        self.assertNotEqual(norte.geocelula % geo.COLUNAS, sul.geocelula % geo.COLUNAS)
+        self.assertEqual(self.no_raio('Quina Sul', 5), {'Quina Norte', 'Quina Sul'})
+        self.assertEqual(self.no_raio('Quina Norte', 5), {'Quina Norte', 'Quina Sul'})
+        self.assertEqual(self.no_raio('Quina Norte', 1), {'Quina Norte'})
+
+    def test_faixas_cobrem_o_circulo(self):
+        for cidade in ('São Paulo', 'Quina Sul'):
+            centro = self.usuarios[cidade]
+            faixas = geo.faixas_de_celulas(centro.latitude, centro.longitude, 100)
+            for outro in CustomUser.objects.no_raio(centro.latitude, centro.longitude, 100):
+                self.assertTrue(any(inicio <= outro.geocelula <= fim for inicio, fim in faixas), outro.cidade)
+            # uma faixa por linha da grade, sem pular linha
+            linhas = [inicio // geo.COLUNAS for inicio, fim in faixas]
+            self.assertEqual(linhas, list(range(linhas[0], linhas[-1] + 1)))
+
+    @override_settings(FEED_INCLUIR_SEM_LOCALIZACAO=False)
+    def test_feed_respeita_a_distancia_maxima(self):
+        usuario = self.usuarios['São Paulo']
+        ConfiguracoesUsuario.objects.create(user=usuario, distancia_maxima=60)
+        self.assertEqual(set(feed.candidatos_elegiveis(usuario).values_list('cidade', flat=True)), {'Santos'})
+
+
+class IndiceHabilidadesTests(TestCase):
+    def setUp(self):
+        cache.delete(indice_habilidades.CHAVE_VERSAO)
+        indice_habilidades.invalidar_indice()
+        self.python = Habilidades.objects.create(nome='Python')
+        self.usuario = criar_usuario('indexado')
+
+    def test_alteracao_aplicada_no_indice_do_processo(self):
+        indice = indice_habilidades.obter_indice()
+        indice_habilidades.registrar_alteracoes([(self.usuario.id, [], [self.python.id])])
+        self.assertIs(indice_habilidades.obter_indice(), indice)
+        self.assertEqual(indice_habilidades._indice.versao, indice_habilidades.versao_atual())
+        self.assertEqual(indice.buscar([self.python.id]), {self.usuario.id})
+
+    def test_incremento_de_outro_processo_descarta_o_indice(self):
+        indice = indice_habilidades.obter_indice()
+        incrementar = indice_habilidades._indice.incrementar_versao
+
+        def outro_processo_antes():
+            # outro processo incrementa logo antes do nosso incr: a alteracao dele nao ta no indice desse processo
+            cache.incr(indice_habilidades.CHAVE_VERSAO)
+            return incrementar()
+
+        with mock.patch.object(indice_habilidades._indice, 'incrementar_versao', outro_processo_antes):
+            indice_habilidades.registrar_alteracoes([(self.usuario.id, [], [self.python.id])])
+        self.assertIsNone(indice_habilidades._indice.indice)
+        self.assertIsNot(indice_habilidades.obter_indice(), indice)
+
+
+class ConfiguracaoCacheSessoesTests(TestCase):
+    def test_tipos_de_cache(self):
+        self.assertEqual(configurar_cache('locmem')['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(configurar_cache('arquivo', local='/tmp/c')['LOCATION'], '/tmp/c')
+        self.assertEqual(configurar_cache('redis', redis_url='redis://r:6379/2')['LOCATION'], 'redis://r:6379/2')
+        with self.assertRaises(ImproperlyConfigured):
+            configurar_cache('arquivo')
+        with self.assertRaises(ImproperlyConfigured):
+            configurar_cache('memcached')
+
+    def test_sessao_padrao_depende_do_cache(self):
+        self.assertEqual(motor_sessao(None, 'locmem'), 'django.contrib.sessions.backends.db')
+        self.assertEqual(motor_sessao(None, 'redis'), 'django.contrib.sessions.backends.cached_db')
+        self.assertEqual(motor_sessao('cookies', 'locmem'), 'django.contrib.sessions.backends.signed_cookies')
+        with self.assertRaises(ImproperlyConfigured):
+            motor_sessao('arquivo', 'locmem')
+
+
+class BackendCacheMixin:
+    """Mesmos testes pra cada backend de cache: o que o app usa do cache tem que funcionar igual em todos"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_operacoes_basicas(self):
+        cache.set_many({'a': 1, 'b': {'x': [1, 2]}})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': {'x': [1, 2]}})
+        cache.delete_many(['a'])
+        self.assertIsNone(cache.get('a'))
+
+    def test_versao_do_indice_de_habilidades(self):
+        versao = indice_habilidades.versao_atual()
+        indice_habilidades.invalidar_indice()
+        indice_habilidades.invalidar_indice()
+        self.assertEqual(indice_habilidades.versao_atual(), versao + 2)
+
+    def test_cartoes_saem_do_cache(self):
+        usuarios = [criar_usuario(f'cartao{i}') for i in range(3)]
+        ids = [u.id for u in usuarios]
+        self.assertEqual([c['id'] for c in cartoes.obter_cartoes(ids)], ids)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual([c['username'] for c in cartoes.obter_cartoes(ids)], ['cartao0', 'cartao1', 'cartao2'])
+        self.assertEqual(len(consultas), 0)
+
+    def test_sessao_cached_db_nao_le_o_banco(self):
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+            sessao = SessionStore()
+            sessao['usuario'] = 42
+            sessao.save()
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(SessionStore(sessao.session_key)['usuario'], 42)
+            self.assertEqual(len(consultas), 0)
+
+
+@override_settings(CACHES={'default': configurar_cache('locmem', local='testes')})
+class CacheLocmemTests(BackendCacheMixin, TestCase):
+    pass
+
+
+class CacheArquivoTests(BackendCacheMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.diretorio = tempfile.TemporaryDirectory()
+        cls.enterClassContext(override_settings(CACHES={'default': configurar_cache('arquivo', local=cls.diretorio.name)}))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.diretorio.cleanup()
+
+
+@skipUnless(fakeredis, 'fakeredis não instalado')
+class CacheRedisTests(BackendCacheMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # o RedisCache do django repassa as OPTIONS pro pool de conexoes, entao da pra trocar a conexao pela do fakeredis
+        config = configurar_cache('redis', redis_url='redis://fakeredis:6379/0')
+        config['OPTIONS'] = {'connection_class': fakeredis.FakeConnection}
+        cls.enterClassContext(override_settings(CACHES={'default': config}))
+        super().setUpClass()
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class SessaoCookiesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario('cookies')
+        self.client.force_login(self.usuario)
+
+    def test_request_autenticado_nao_consulta_sessao_nem_configuracoes(self):
+        self.client.get('/api/configuracoes/')
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get('/api/configuracoes/')
+        self.assertEqual(resposta.json()['config']['distancia_maxima'], 50)
+        tabelas = ' '.join(c['sql'] for c in consultas)
+        self.assertNotIn('django_session', tabelas)
+        self.assertNotIn('accounts_configuracoesusuario', tabelas)
+
+    def test_configuracoes_salvas_invalidam_o_cache(self):
+        self.client.get('/api/configuracoes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/configuracoes/', {'distancia_maxima': 120}, content_type='application/json')
+        self.assertEqual(self.client.get('/api/configuracoes/').json()['config']['distancia_maxima'], 120)
+
+
+class SqliteDesempenhoTests(SimpleTestCase):
+    def test_pragmas_aplicados_em_toda_conexao(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            conexao = estresse_sqlite._conectar(Path(diretorio) / 'banco.sqlite3', estresse_sqlite.CONFIGURACOES['otimizada'])
+            with conexao.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            conexao.close()
+
+    def test_escritores_em_paralelo_nao_travam(self):
+        # com a configuracao do settings nenhuma transacao pode falhar com "database is locked"
+        ok, travadas = estresse_sqlite.medir_travamentos(estresse_sqlite.CONFIGURACOES['otimizada'], threads=8, escritas=50)
+        self.assertEqual(travadas, 0)
+        self.assertEqual(ok, 400)
+
+
+@override_settings(REPLICAS_BANCO=['replica_teste'], REPLICAS_JANELA_PRIMARIO=5)
+class RoteadorReplicasTests(TransactionTestCase):
+    """Primario (o banco de teste) e uma replica num arquivo SQLite separado, atualizada so quando o teste chama replicar()"""
+
+    @classmethod
+    def setUpClass(cls):
+        # o alias da replica entra depois do setUpClass pra nao cair no bloqueio de bancos que o teste nao declarou
+        super().setUpClass()
+        cls.diretorio = tempfile.TemporaryDirectory()
+        connections.settings['replica_teste'] = {
+            **connections['default'].settings_dict, 'NAME': str(Path(cls.diretorio.name) / 'replica.sqlite3')}
+        cls.databases = {'default', 'replica_teste'}
+        cls.replicar()
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica_teste'].close()
+        del connections['replica_teste']
+        del connections.settings['replica_teste']
+        cls.diretorio.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def replicar(cls):
+        # copia o primario inteiro pra replica, como a replicacao faria com algum atraso
+        connections['default'].ensure_connection()
+        connections['replica_teste'].ensure_connection()
+        connections['default'].connection.backup(connections['replica_teste'].connection)
+
+    def setUp(self):
+        self.usuario = criar_usuario('leitor')
+        self.outro = criar_usuario('alvo')
+        # o outro ja curtiu, entao o like do usuario vira link
+        Interacao.objects.create(de_usuario=self.outro, para_usuario=self.usuario, tipo=Interacao.LIKE)
+        self.client.force_login(self.usuario)
+        self.replicar()
+
+    def test_leitura_fora_de_request_vai_pra_replica(self):
+        novo = criar_usuario('so_no_primario')
+        self.assertFalse(CustomUser.objects.filter(id=novo.id).exists())
+        self.assertTrue(CustomUser.objects.using('default').filter(id=novo.id).exists())
+
+    def test_leitura_dentro_de_transacao_vai_pro_primario(self):
+        novo = criar_usuario('na_transacao')
+        with transaction.atomic():
+            self.assertTrue(CustomUser.objects.filter(id=novo.id).exists())
+
+    def test_quem_escreveu_le_o_proprio_link(self):
+        self.assertEqual(self.client.get('/api/linkeds/').json()['linkeds'], [])
+
+        resposta = self.client.post(f'/like/{self.outro.id}/')
+        self.assertTrue(resposta.json()['matched'])
+        self.assertIn('primario_ate', resposta.cookies)
+
+        # dentro da janela le do primario e ja ve o link novo
+        linkeds = self.client.get('/api/linkeds/').json()['linkeds']
+        self.assertEqual([l['id'] for l in linkeds], [self.outro.id])
+
+        # sem o cookie (outro usuario, ou depois da janela) le da replica, que ainda nao recebeu o link
+        del self.client.cookies['primario_ate']
+        self.assertEqual(self.client.get('/api/linkeds/').json()['linkeds'], [])
+
+        self.replicar()
+        self.assertEqual(len(self.client.get('/api/linkeds/').json()['linkeds']), 1)
+
+    def test_request_so_de_leitura_nao_fixa_no_primario(self):
+        resposta = self.client.get('/api/linkeds/')
+        self.assertNotIn('primario_ate', resposta.cookies)
+
+    def test_recarga_do_feed_em_segundo_plano_le_do_primario(self):
+        candidato = criar_usuario('ja_descurtido')
+        self.replicar()
+        # o swipe acabou de ser gravado e a replica ainda nao tem
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario=candidato, tipo=Interacao.DISLIKE)
+
+        thread = threading.Thread(target=feed._recarregar_em_segundo_plano, args=(self.usuario.id,))
+        thread.start()
+        thread.join()
+        restantes = FilaCandidatos.objects.using('default').get(user=self.usuario).restantes()
+        self.assertIn(self.outro.id, restantes)
+        self.assertNotIn(candidato.id, restantes)
+
+
+# urlconf so com as rotas do feed apontando pras views async, como fica com VIEWS_ASSINCRONAS ligado
+ROTAS_ASYNC = types.ModuleType('rotas_async')
+ROTAS_ASYNC.urlpatterns = rotas_feed(True)
+
+
+@override_settings(ROOT_URLCONF=ROTAS_ASYNC)
+class ViewsAsyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario('assincrono')
+        self.outro = criar_usuario('curtiu_antes')
+        Interacao.objects.create(de_usuario=self.outro, para_usuario=self.usuario, tipo=Interacao.LIKE)
+
+    async def test_swipe_vira_link(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.post(f'/like/{self.outro.id}/')
+        self.assertEqual(resposta.json(), {'status': 'success', 'message': 'Linked!', 'matched': True})
+        self.assertTrue(await Linkeds.objects.filter(usuario1=self.usuario, usuario2=self.outro).aexists())
+
+        resposta = await self.async_client.post(f'/dislike/{self.outro.id}/')
+        self.assertEqual(resposta.json()['status'], 'info')
+        resposta = await self.async_client.post('/dislike/999999/')
+        self.assertEqual(resposta.status_code, 404)
+
+    async def test_proximo_perfil_e_linkeds(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get('/pegar-proximo-perfil/')
+        self.assertEqual(resposta.json()['perfil']['id'], self.outro.id)
+
+        await self.async_client.post(f'/superlike/{self.outro.id}/', {'mensagem': 'bora estudar junto?'}, content_type='application/json')
+        resposta = await self.async_client.get('/pegar-proximo-perfil/')
+        self.assertEqual(resposta.json()['status'], 'no_more_profiles')
+
+        resposta = await self.async_client.get('/api/linkeds/')
+        self.assertEqual([l['id'] for l in resposta.json()['linkeds']], [self.outro.id])
+        revalidacao = await self.async_client.get('/api/linkeds/', headers={'if-none-match': resposta['ETag']})
+        self.assertEqual(revalidacao.status_code, 304)
+
+    def test_configuracoes(self):
+        # teste sync (com async_to_sync) pro captureOnCommitCallbacks ver a conexao da thread onde o ORM async roda
+        self.async_client.force_login(self.usuario)
+        get, post = async_to_sync(self.async_client.get), async_to_sync(self.async_client.post)
+        self.assertEqual(get('/api/configuracoes/').json()['config']['distancia_maxima'], 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            post('/api/configuracoes/', {'distancia_maxima': 80}, content_type='application/json')
+        self.assertEqual(get('/api/configuracoes/').json()['config']['distancia_maxima'], 80)
+
+    def test_swipe_valida_numa_consulta_so(self):
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario=self.outro, tipo=Interacao.DISLIKE)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(
+                async_to_sync(swipes.aregistrar_swipe)(self.usuario, self.outro.id, Interacao.LIKE), swipes.JA_INTERAGIU)
+        self.assertEqual(len(consultas), 1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(
+                async_to_sync(swipes.aregistrar_swipe)(self.usuario, 999999, Interacao.LIKE), swipes.NAO_ENCONTRADO)
+        self.assertEqual(len(consultas), 1)
+
+
+class NotificacoesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hub = notificacoes.HubLocal()
+        self.addCleanup(notificacoes.trocar_hub, notificacoes.trocar_hub(self.hub))
+        self.usuario = criar_usuario('notificado')
+        self.outro = criar_usuario('quem_curtiu')
+        self.client.force_login(self.usuario)
+
+    def test_link_pelo_swipe_avisa_os_dois(self):
+        meu, dele = self.hub.assinar(self.usuario.id), self.hub.assinar(self.outro.id)
+        Interacao.objects.create(de_usuario=self.outro, para_usuario=self.usuario, tipo=Interacao.LIKE)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/like/{self.outro.id}/')
+
+        evento = dele.proximo(timeout=0)
+        self.assertEqual((evento['tipo'], evento['usuario']['id'], evento['voce_iniciou']), ('link', self.usuario.id, False))
+        self.assertTrue(meu.proximo(timeout=0)['voce_iniciou'])
+        self.assertIsNone(dele.proximo(timeout=0))
+
+    def test_stream_respeita_as_preferencias(self):
+        config = ConfiguracoesUsuario.objects.create(user=self.outro, notificacao_matchs=False)
+        stream = notificacoes.stream(self.outro.id, intervalo_ping=0.01)
+        self.assertTrue(next(stream).startswith('retry:'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/superlike/{self.outro.id}/', {'mensagem': 'vamos estudar calculo?'}, content_type='application/json')
+        # o superlike chegou no hub mas foi filtrado, entao o proximo pedaço é o ping
+        self.assertEqual(next(stream), ': ping\n\n')
+
+        config.notificacao_matchs = True
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+            notificacoes.notificar_superlike(self.usuario.id, self.outro.id, 'vamos estudar calculo?')
+        self.assertTrue(next(stream).startswith('event: superlike\ndata: '))
+
+        stream.close()
+        self.assertEqual(dict(self.hub._assinaturas), {})
+
+    @override_settings(NOTIFICACOES_STREAM_WSGI=True)
+    def test_endpoint_sse(self):
+        resposta = self.client.get('/api/notificacoes/stream/')
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        self.assertTrue(next(iter(resposta.streaming_content)).startswith(b'retry:'))
+        resposta.close()
+        self.assertEqual(dict(self.hub._assinaturas), {})
+
+    def test_wsgi_sem_stream_responde_204(self):
+        # cada stream prenderia uma thread do servidor WSGI: o front faz polling do since
+        resposta = self.client.get('/api/notificacoes/stream/')
+        self.assertEqual(resposta.status_code, 204)
+        self.assertEqual(dict(self.hub._assinaturas), {})
+        self.assertContains(self.client.get('/linkeds/'), 'notificacoesStream: false')
+        with self.settings(NOTIFICACOES_STREAM_WSGI=True):
+            self.assertContains(self.client.get('/linkeds/'), 'notificacoesStream: true')
+
+    async def test_asgi_sempre_tem_stream(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get('/api/notificacoes/stream/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+
+    def test_evento_de_grupo_vai_pros_membros(self):
+        grupo = GrupoDeEstudos.objects.create(
+            nome='Cálculo', materia='Cálculo I', descricao='-', usuario_criador=self.usuario,
+            dias_encontros='1,3', horario_encontros='19h')
+        MembroGrupoEstudos.objects.create(user=self.usuario, grupo=grupo)
+        assinatura = self.hub.assinar(self.usuario.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            MembroGrupoEstudos.objects.create(user=self.outro, grupo=grupo)
+        # hub local: a entrega é no proprio processo depois do commit, sem passar pela fila de tarefas
+        self.assertIsNone(assinatura.proximo(timeout=0))
+        self.assertFalse(Tarefa.objects.filter(funcao__endswith='entregar_aviso_grupo').exists())
+        for callback in callbacks:
+            callback()
+
+        evento = assinatura.proximo(timeout=0)
+        self.assertEqual((evento['acao'], evento['grupo']['id'], evento['usuario']['id']), ('entrou', grupo.id, self.outro.id))
+
+    def test_saida_do_grupo_avisa_uma_vez(self):
+        grupo = GrupoDeEstudos.objects.create(
+            nome='Química', materia='Química I', descricao='-', usuario_criador=self.usuario,
+            dias_encontros='4', horario_encontros='8h')
+        with self.captureOnCommitCallbacks(execute=True):
+            membro = MembroGrupoEstudos.objects.create(user=self.outro, grupo=grupo)
+        assinatura = self.hub.assinar(self.outro.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            membro.ativo = False
+            membro.save()
+            # save de membro que ja tinha saido nao avisa de novo
+            membro.save()
+        self.assertEqual(assinatura.proximo(timeout=0)['acao'], 'saiu')
+        self.assertIsNone(assinatura.proximo(timeout=0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            membro.ativo = True
+            membro.save()
+        self.assertEqual(assinatura.proximo(timeout=0)['acao'], 'entrou')
+
+    def test_evento_de_grupo_com_hub_compartilhado_vai_pela_fila(self):
+        hub = mock.Mock(spec=['publicar'])
+        notificacoes.trocar_hub(hub)
+        grupo = GrupoDeEstudos.objects.create(
+            nome='Física', materia='Física I', descricao='-', usuario_criador=self.usuario,
+            dias_encontros='2', horario_encontros='10h')
+        MembroGrupoEstudos.objects.create(user=self.usuario, grupo=grupo)
+        MembroGrupoEstudos.objects.create(user=self.outro, grupo=grupo)
+        hub.publicar.assert_not_called()
+
+        tarefas.executar_pendentes()
+        self.assertEqual({chamada.args[0] for chamada in hub.publicar.call_args_list}, {self.usuario.id, self.outro.id})
+
+    async def test_stream_async_recebe_de_outra_thread(self):
+        assinatura = await self.hub.aassinar(42)
+        threading.Thread(target=self.hub.publicar, args=(42, {'tipo': 'link'})).start()
+        self.assertEqual(await assinatura.aproximo(timeout=1), {'tipo': 'link'})
+        await assinatura.afechar()
+
+
+@skipUnless(fakeredis, 'fakeredis não instalado')
+class HubRedisTests(SimpleTestCase):
+    def setUp(self):
+        servidor = fakeredis.FakeServer()
+        self.hub = notificacoes.HubRedis(
+            cliente=fakeredis.FakeRedis(server=servidor), cliente_async=fakeredis.FakeAsyncRedis(server=servidor))
+
+    @staticmethod
+    def esperar(proximo):
+        # a confirmacao do subscribe volta como None, entao tenta mais de uma vez
+        for tentativa in range(5):
+            evento = proximo(timeout=0.2)
+            if evento:
+                return evento
+
+    def test_publicar_e_receber(self):
+        assinatura = self.hub.assinar(7)
+        self.hub.publicar(7, {'tipo': 'superlike', 'mensagem': 'oi'})
+        self.assertEqual(self.esperar(assinatura.proximo), {'tipo': 'superlike', 'mensagem': 'oi'})
+        assinatura.fechar()
+
+    def test_assinatura_async(self):
+        async def receber():
+            assinatura = await self.hub.aassinar(7)
+            self.hub.publicar(7, {'tipo': 'link'})
+            for tentativa in range(5):
+                evento = await assinatura.aproximo(timeout=0.2)
+                if evento:
+                    break
+            await assinatura.afechar()
+            return evento
+
+        self.assertEqual(async_to_sync(receber)(), {'tipo': 'link'})
+
+
+class PresencaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = criar_usuario('presente')
+        self.outro = criar_usuario('colega')
+        self.sumido = criar_usuario('sumido')
+        self.grupo = GrupoDeEstudos.objects.create(
+            nome='Física', materia='Física I', descricao='-', usuario_criador=self.usuario,
+            dias_encontros='2', horario_encontros='18h')
+        for membro in (self.usuario, self.outro, self.sumido):
+            MembroGrupoEstudos.objects.create(user=membro, grupo=self.grupo)
+        self.client.force_login(self.usuario)
+
+    def status_no_grupo(self):
+        membros = self.client.get(f'/api/grupos-estudo/{self.grupo.id}/').json()['group']['members']
+        return {membro['id']: membro['status'] for membro in membros}
+
+    def test_heartbeat_nao_escreve_no_banco(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post('/api/presenca/', {'ativo': False}, content_type='application/json')
+        self.assertEqual(resposta.json()['status'], 'success')
+        escritas = [q['sql'] for q in consultas if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(escritas, [])
+        self.assertEqual(presenca.presentes([self.usuario.id]), {self.usuario.id: presenca.AUSENTE})
+
+    def test_status_real_nos_grupos(self):
+        self.client.post('/api/presenca/')
+        presenca.registrar(self.outro.id)
+        self.assertEqual(self.status_no_grupo(), {
+            self.usuario.id: 'online', self.outro.id: 'online', self.sumido.id: 'offline'})
+
+        grupos = self.client.get('/api/grupos-estudo/').json()['groups']
+        self.assertEqual(sorted(m['status'] for m in grupos[0]['members']), ['offline', 'online', 'online'])
+
+    def test_quem_esconde_o_status_aparece_offline(self):
+        ConfiguracoesUsuario.objects.create(user=self.outro, mostrar_status_online=False)
+        presenca.registrar(self.outro.id)
+        self.assertEqual(self.status_no_grupo()[self.outro.id], 'offline')
+
+    def test_heartbeat_antigo_expira(self):
+        # backend que ainda devolve a chave depois do TTL: vale o horario do heartbeat
+        cache.set(f'presenca:{self.outro.id}', (presenca.ONLINE, 0), None)
+        self.assertEqual(presenca.presentes([self.outro.id]), {})
+
+    def test_logout_tira_da_presenca(self):
+        self.client.post('/api/presenca/')
+        self.client.post('/logout/')
+        self.assertEqual(presenca.presentes([self.usuario.id]), {})
+
+
+class TarefasTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_usuario('exportador')
+        self.client.force_login(self.usuario)
+
+    def test_executa_e_guarda_o_resultado(self):
+        tarefa = tarefas.enfileirar(somar, a=2, b=3)
+        self.assertEqual(tarefa.funcao, 'accounts.tests.somar')
+        self.assertEqual([t.id for t in tarefas.executar_pendentes()], [tarefa.id])
+
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.resultado, tarefa.tentativas), (Tarefa.CONCLUIDA, 5, 1))
+        self.assertEqual(tarefas.executar_pendentes(), [])
+
+    def test_falha_tenta_de_novo_com_backoff_ate_desistir(self):
+        tarefa = tarefas.enfileirar(falhar, max_tentativas=2)
+        with self.assertLogs('accounts.tarefas', 'ERROR'):
+            tarefas.executar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.PENDENTE, 1))
+        self.assertIn('provedor fora do ar', tarefa.erro)
+        self.assertGreater(tarefa.executar_em, timezone.now() + timedelta(seconds=tarefas.BACKOFF_BASE - 1))
+
+        # ainda nao venceu o backoff
+        self.assertEqual(tarefas.executar_pendentes(), [])
+        Tarefa.objects.filter(id=tarefa.id).update(executar_em=timezone.now())
+        with self.assertLogs('accounts.tarefas', 'ERROR'):
+            tarefas.executar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.FALHOU, 2))
+        self.assertEqual(tarefas.backoff(3), 4 * tarefas.BACKOFF_BASE)
+
+    def test_so_volta_pra_fila_com_o_lease_vencido(self):
+        tarefa = tarefas.enfileirar(somar, a=1, b=1)
+        self.assertEqual(tarefas.reservar(10), [tarefa.id])
+        vencido = timezone.now() - timedelta(seconds=tarefas.TEMPO_LIMITE + 1)
+
+        # comecou ha muito tempo mas o worker continua renovando: ta viva
+        Tarefa.objects.filter(id=tarefa.id).update(iniciada_em=vencido)
+        self.assertEqual(tarefas.reservar(10), [])
+
+        Tarefa.objects.filter(id=tarefa.id).update(renovada_em=vencido)
+        self.assertEqual(tarefas.reservar(10), [tarefa.id])
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.EXECUTANDO, 2))
+
+    def test_lease_renovado_durante_a_execucao(self):
+        tarefa = tarefas.enfileirar(renovar_o_proprio_lease)
+        tarefas.executar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.resultado), (Tarefa.CONCLUIDA, 1))
+        # terminou: nao tem mais o que renovar
+        self.assertEqual(tarefas.renovar_leases(), 0)
+
+    def test_quem_perdeu_o_lease_nao_grava_o_resultado(self):
+        tarefa = tarefas.enfileirar(perder_o_lease)
+        with self.assertLogs('accounts.tarefas', 'WARNING'):
+            executada, = tarefas.executar_pendentes()
+        self.assertEqual(executada.status, Tarefa.PENDENTE)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.resultado), (Tarefa.PENDENTE, None))
+
+    def test_sms_sai_do_request(self):
+        aparelho = AparelhoSMS.objects.create(user=self.usuario, name='SMS', numero_celular='11999999999')
+        with mock.patch.object(AparelhoSMS, 'send_sms') as send_sms:
+            token = aparelho.gerar_desafio()
+            send_sms.assert_not_called()
+            tarefas.executar_pendentes()
+        send_sms.assert_called_once_with(token)
+
+    def test_sms_com_codigo_vencido_nao_sai(self):
+        aparelho = AparelhoSMS.objects.create(user=self.usuario, name='SMS', numero_celular='11999999999')
+        with mock.patch.object(AparelhoSMS, 'send_sms') as send_sms:
+            token = aparelho.gerar_desafio()
+            AparelhoSMS.objects.filter(id=aparelho.id).update(token_valido_ate=timezone.now() - timedelta(seconds=1))
+            tarefa, = tarefas.executar_pendentes()
+        send_sms.assert_not_called()
+        self.assertEqual((tarefa.status, tarefa.resultado), (Tarefa.CONCLUIDA, False))
+        aparelho.refresh_from_db()
+        self.assertFalse(aparelho.verificar_token(token))
+
+    def test_prioritarias_passam_na_frente(self):
+        normal = tarefas.enfileirar(somar, a=1, b=1)
+        sms = AparelhoSMS.objects.create(user=self.usuario, name='SMS', numero_celular='11999999999')
+        sms.gerar_desafio()
+        prioritaria = Tarefa.objects.get(funcao='accounts.models.enviar_sms_desafio')
+        self.assertEqual(prioritaria.prioridade, tarefas.ALTA)
+        self.assertEqual(tarefas.reservar(2), [prioritaria.id, normal.id])
+
+    def test_exportacao_em_segundo_plano(self):
+        resposta = self.client.post('/api/exportar-dados/')
+        self.assertEqual(resposta.status_code, 202)
+        url = f"/api/exportar-dados/{resposta.json()['tarefa_id']}/"
+        self.assertEqual(self.client.get(url).json()['status'], Tarefa.PENDENTE)
+
+        with tempfile.TemporaryDirectory() as pasta, override_settings(EXPORTACOES_DIR=pasta):
+            tarefas.executar_pendentes()
+            arquivo = Tarefa.objects.get(id=resposta.json()['tarefa_id']).resultado['arquivo']
+            # fora do MEDIA_ROOT: nao tem URL publica, so sai pela view
+            self.assertTrue((Path(pasta) / arquivo).exists())
+            self.assertFalse(default_storage.exists(arquivo))
+
+            resposta = self.client.get(url)
+            self.assertIn('attachment', resposta['Content-Disposition'])
+            dados = json.loads(b''.join(resposta.streaming_content))
+            resposta.close()
+            # baixou, apagou
+            self.assertFalse((Path(pasta) / arquivo).exists())
+            self.assertEqual(self.client.get(url).status_code, 410)
+        self.assertEqual(dados['perfil']['username'], 'exportador')
+
+        # a exportacao de um nao aparece pro outro
+        self.client.force_login(criar_usuario('curioso'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+    def test_exportacao_nao_baixada_expira(self):
+        with tempfile.TemporaryDirectory() as pasta, override_settings(EXPORTACOES_DIR=pasta, EXPORTACAO_VALIDADE=2):
+            tarefa_id = self.client.post('/api/exportar-dados/').json()['tarefa_id']
+            tarefas.executar_pendentes()
+            arquivo = Tarefa.objects.get(id=tarefa_id).resultado['arquivo']
+
+            # a limpeza fica agendada pra quando vence a validade
+            limpeza = Tarefa.objects.get(funcao=tarefas.caminho(exportacao.apagar_arquivo))
+            self.assertEqual(limpeza.argumentos, {'nome': arquivo})
+            self.assertGreater(limpeza.executar_em, timezone.now() + timedelta(hours=2) - timedelta(minutes=1))
+            self.assertEqual(tarefas.executar_pendentes(), [])
+
+            Tarefa.objects.filter(id=limpeza.id).update(executar_em=timezone.now())
+            tarefas.executar_pendentes()
+            self.assertFalse((Path(pasta) / arquivo).exists())
+            self.assertEqual(self.client.get(f'/api/exportar-dados/{tarefa_id}/').status_code, 410)
+
+
+class WorkerTarefasTests(BancoEmArquivoMixin, TransactionTestCase):
+    def test_comando_roda_as_tarefas_no_pool(self):
+        ids = [tarefas.enfileirar(somar, a=i, b=i).id for i in range(6)]
+        call_command('processar_tarefas', '--uma-vez', '--threads', '3')
+        self.assertEqual(
+            list(Tarefa.objects.filter(id__in=ids).order_by('id').values_list('status', 'resultado')),
+            [(Tarefa.CONCLUIDA, 2 * i) for i in range(6)])
+
+    def test_tarefa_lenta_nao_segura_as_outras(self):
+        LIBERAR_TAREFA_LENTA.clear()
+        self.addCleanup(LIBERAR_TAREFA_LENTA.set)
+        lenta = tarefas.enfileirar(tarefa_lenta)
+        rapidas = [tarefas.enfileirar(somar, a=i, b=1).id for i in range(6)]
+        worker = threading.Thread(target=tarefas.processar, args=(2,), kwargs={'uma_vez': True})
+        worker.start()
+
+        # com uma thread presa na lenta, a outra continua pegando as rapidas
+        concluidas = Tarefa.objects.filter(id__in=rapidas, status=Tarefa.CONCLUIDA)
+        limite = time.monotonic() + 10
+        while concluidas.count() < len(rapidas) and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.assertEqual(concluidas.count(), len(rapidas))
+        self.assertEqual(Tarefa.objects.get(id=lenta.id).status, Tarefa.EXECUTANDO)
+
+        LIBERAR_TAREFA_LENTA.set()
+        worker.join()
+        self.assertEqual(Tarefa.objects.get(id=lenta.id).status, Tarefa.CONCLUIDA)
+
+    def test_prioritaria_nao_espera_thread_livre(self):
+        LIBERAR_TAREFA_LENTA.clear()
+        self.addCleanup(LIBERAR_TAREFA_LENTA.set)
+        lenta = tarefas.enfileirar(tarefa_lenta)
+        worker = threading.Thread(target=tarefas.processar, args=(1,), kwargs={'uma_vez': True})
+        worker.start()
+        executando = Tarefa.objects.filter(id=lenta.id, status=Tarefa.EXECUTANDO)
+        limite = time.monotonic() + 10
+        while not executando.exists() and time.monotonic() < limite:
+            time.sleep(0.05)
+
+        # a unica thread do pool ta presa na lenta, a prioritaria roda no laco dela
+        prioritaria = tarefas.enfileirar(somar, prioridade=tarefas.ALTA, a=2, b=3)
+        concluida = Tarefa.objects.filter(id=prioritaria.id, status=Tarefa.CONCLUIDA)
+        while not concluida.exists() and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.assertTrue(concluida.exists())
+        self.assertTrue(executando.exists())
+
+        LIBERAR_TAREFA_LENTA.set()
+        worker.join()
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        self.usuario = criar_usuario('exportado')
+        self.outros = [criar_usuario(f'outro{i}') for i in range(4)]
+        self.client.force_login(self.usuario)
+
+        Interacao.objects.create(de_usuario=self.usuario, para_usuario=self.outros[0], tipo=Interacao.LIKE)
+        Interacao.objects.create(
+            de_usuario=self.usuario, para_usuario=self.outros[1], tipo=Interacao.SUPERLIKE, mensagem='bora estudar?')
+        Interacao.objects.create(
+            de_usuario=self.outros[2], para_usuario=self.usuario, tipo=Interacao.SUPERLIKE, mensagem='oi, tudo bem?')
+        conexoes.criar_links_em_lote(self.usuario.id, [self.outros[3].id])
+
+    def test_json_em_streaming(self):
+        with mock.patch.object(exportacao, 'TAMANHO_PEDACO', 64):
+            resposta = self.client.get('/api/exportar-dados/')
+            pedacos = list(resposta.streaming_content)
+        self.assertGreater(len(pedacos), 3)
+
+        corpo = json.loads(b''.join(pedacos))
+        self.assertEqual(corpo['status'], 'success')
+        dados = corpo['data']
+        self.assertEqual(dados['perfil']['username'], 'exportado')
+        self.assertEqual([like['usuario'] for like in dados['likes']], ['outro0'])
+        self.assertEqual(dados['superlikes'][0]['mensagem'], 'bora estudar?')
+        self.assertEqual(dados['superlikes_recebidos'][0]['usuario'], 'outro2')
+        self.assertEqual([link['usuario'] for link in dados['linkeds']], ['outro3'])
+        self.assertEqual(dados['fotos'], [])
+
+    def test_zip_com_as_fotos(self):
+        with tempfile.TemporaryDirectory() as pasta, override_settings(MEDIA_ROOT=pasta):
+            foto = FotosUsuario.objects.create(
+                user=self.usuario, imagem=SimpleUploadedFile('perfil.jpg', b'conteudo da foto' * 5000))
+            resposta = self.client.get('/api/exportar-dados/?formato=zip')
+            self.assertIn('attachment', resposta['Content-Disposition'])
+            arquivo = zipfile.ZipFile(io.BytesIO(b''.join(resposta.streaming_content)))
+
+            dados = json.loads(arquivo.read('dados.json'))
+            self.assertEqual(dados['fotos'][0]['arquivo'], exportacao.caminho_foto(foto))
+            self.assertEqual(arquivo.read(exportacao.caminho_foto(foto)), b'conteudo da foto' * 5000)
+
+
+class ImagensTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+
+        self.usuario = criar_usuario('fotografado')
+        self.outro = criar_usuario('quem_ve')
+        conexoes.criar_links_em_lote(self.outro.id, [self.usuario.id])
+        self.client.force_login(self.outro)
+
+    def enviar_foto(self, tamanho=(1600, 1200)):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientacao: girada 90 graus
+        exif[0x010F] = 'Camera de teste'
+        conteudo = io.BytesIO()
+        Image.new('RGB', tamanho, 'red').save(conteudo, 'JPEG', exif=exif)
+        return FotosUsuario.objects.create(user=self.usuario, imagem=SimpleUploadedFile('foto.jpg', conteudo.getvalue()))
+
+    def imagem_nos_linkeds(self):
+        return self.client.get('/api/linkeds/').json()['linkeds'][0]['image']
+
+    def test_gera_variantes_e_tira_o_exif(self):
+        foto = self.enviar_foto()
+        # antes da tarefa rodar a API manda o original
+        self.assertEqual(self.imagem_nos_linkeds(), foto.imagem.url)
+
+        # no worker nao tem transacao em volta e a invalidacao do cartao roda na hora
+        with self.captureOnCommitCallbacks(execute=True):
+            tarefas.executar_pendentes()
+        foto.refresh_from_db()
+        self.assertEqual(set(foto.variantes), set(imagens.VARIANTES))
+        with Image.open(default_storage.open(foto.variantes['mini']['webp'])) as mini:
+            self.assertEqual((mini.format, mini.size), ('WEBP', (128, 128)))
+        # a orientacao do EXIF foi aplicada antes de reduzir
+        with Image.open(default_storage.open(foto.variantes['grande']['webp'])) as grande:
+            self.assertEqual(grande.size, (810, 1080))
+        with Image.open(default_storage.open(foto.imagem.name)) as original:
+            self.assertEqual((len(original.getexif()), original.size), (0, (1200, 1600)))
+
+        self.assertEqual(self.imagem_nos_linkeds(), default_storage.url(foto.variantes['mini']['webp']))
+
+    def test_cartao_sem_variantes_vence_logo(self):
+        foto = self.enviar_foto()
+        # TTL 0: o cartao provisorio (e a versao dele) ja venceu na proxima leitura
+        self.enterContext(mock.patch.object(cartoes, 'TTL_CARTAO_PROVISORIO', 0))
+        resposta = self.client.get('/api/linkeds/')
+        self.assertEqual(resposta.json()['linkeds'][0]['image'], foto.imagem.url)
+
+        # o worker é outro processo: o invalidar dele nao chega no cache (locmem) desse
+        with mock.patch.object(cartoes, 'invalidar'):
+            tarefas.executar_pendentes()
+        foto.refresh_from_db()
+        resposta = self.client.get('/api/linkeds/', HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['linkeds'][0]['image'], default_storage.url(foto.variantes['mini']['webp']))
+
+    def test_ttl_do_cartao_depende_das_variantes(self):
+        foto = self.enviar_foto()
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            cartoes.obter_cartao(self.usuario.id)
+            FotosUsuario.objects.filter(id=foto.id).update(variantes={'mini': {'largura': 128, 'webp': 'mini.webp'}})
+            cartoes.invalidar([self.usuario.id])
+            cartoes.obter_cartao(self.usuario.id)
+        chave = cartoes.chave_cartao(self.usuario.id)
+        ttls = [chamada.args[1] for chamada in set_many.call_args_list if chave in chamada.args[0]]
+        self.assertEqual(ttls, [cartoes.TTL_CARTAO_PROVISORIO, cartoes.TTL_CARTAO])
+
+    def test_feed_manda_srcset_e_foto_pequena_nao_aumenta(self):
+        foto = self.enviar_foto(tamanho=(300, 200))
+        tarefas.executar_pendentes()
+        foto.refresh_from_db()
+        self.assertEqual(foto.variantes['media']['largura'], 200)
+
+        cartao = cartoes.obter_cartao(self.usuario.id)
+        card = views.serializar_card_perfil(cartao)
+        self.assertTrue(card['foto'].endswith('media.webp'))
+        self.assertEqual(card['foto_srcset'].count('w,'), 2)
+
+    def test_apagar_a_foto_apaga_as_variantes(self):
+        foto = self.enviar_foto()
+        tarefas.executar_pendentes()
+        foto.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            foto.delete()
+        self.assertFalse(default_storage.exists(foto.variantes['mini']['webp']))
@@ -0,0 +1,19 @@
+import unicodedata
+
+
+def normalizar(texto):
+    # minusculo e sem acento, pra "São Paulo" e "sao paulo" cairem no mesmo lugar
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def palavras(texto):
+    return ''.join(c if c.isalnum() else ' ' for c in normalizar(texto)).split()
+
+
+def trigramas(texto):
+    trigramas_texto = set()
+    for palavra in palavras(texto):
+        palavra = f'  {palavra} '
+        trigramas_texto.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return trigramas_texto
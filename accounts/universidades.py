@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from django.conf import settings
+
+from .indice_prefixos import IndicePrefixos
+from .indice_versionado import IndiceVersionado
+from .models import Universidade
+from .texto import normalizar, palavras, trigramas
+
+# quantos resultados a busca devolve por padrao e de quanto em quanto tempo o indice é refeito a partir do banco
+TOP_K = getattr(settings, 'UNIVERSIDADES_TOP_K', 8)
+TTL_INDICE = getattr(settings, 'UNIVERSIDADES_TTL_INDICE', 300)
+
+# versao do indice no cache: o carregar_universidades roda em outro processo, entao invalidar so a memoria dele nao
+# adianta (e com o cache locmem nem assim, ver IndiceVersionado)
+CHAVE_VERSAO = 'universidades:indice:versao'
+
+
+def serializar_universidade(universidade):
+    return {
+        'id': universidade.codigo,
+        'nome': universidade.nome,
+        'sigla': universidade.sigla,
+        'cidade': universidade.cidade,
+        'estado': universidade.estado,
+        'cursos': universidade.cursos,
+    }
+
+
+class IndiceUniversidades:
+    """Indice em memoria das universidades (busca no IndicePrefixos) e das cidades de cada estado"""
+
+    def __init__(self, universidades):
+        self.itens = [serializar_universidade(u) for u in universidades]
+        self.por_codigo = {item['id']: item for item in self.itens}
+        self.siglas = [normalizar(item['sigla']) for item in self.itens]
+        self.busca = IndicePrefixos()
+        self.locais = defaultdict(lambda: defaultdict(list))
+
+        for posicao, item in enumerate(self.itens):
+            self.busca.adicionar(
+                normalizar(item['nome']),
+                palavras(f"{item['nome']} {item['sigla']} {item['cidade']} {item['estado']}"),
+                trigramas(f"{item['nome']} {item['sigla']}"))
+            self.locais[item['estado']][item['cidade']].append(posicao)
+
+    def buscar(self, termo, limite=TOP_K):
+        # sigla igual a uma palavra do termo ("usp") sobe no ranking
+        palavras_termo = set(palavras(termo))
+        posicoes = self.busca.buscar(termo, limite, bonus=lambda posicao: self.siglas[posicao] in palavras_termo)
+        return [self.itens[posicao] for posicao in posicoes]
+
+    def estados(self):
+        # {estado: [cidades]} pros selects do cadastro
+        return {estado: sorted(cidades) for estado, cidades in sorted(self.locais.items())}
+
+    def da_cidade(self, estado, cidade):
+        return sorted((self.itens[posicao] for posicao in self.locais.get(estado, {}).get(cidade, [])), key=lambda u: u['nome'])
+
+    def por_id(self, codigo):
+        return self.por_codigo.get(codigo)
+
+
+def _montar_indice():
+    return IndiceUniversidades(Universidade.objects.order_by('id').iterator(chunk_size=2000))
+
+
+_indice = IndiceVersionado(CHAVE_VERSAO, _montar_indice, TTL_INDICE)
+versao_atual = _indice.versao_atual
+obter_indice = _indice.obter
+# chamado depois de carregar universidades novas, o proximo request de cada processo monta o indice de novo
+invalidar_indice = _indice.invalidar
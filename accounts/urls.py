@@ -1,7 +1,22 @@
+from django.conf import settings
 from django.conf.global_settings import LOGOUT_REDIRECT_URL
 from django.urls import path, include
 from accounts.views import MySignupView
-from . import views
+from . import views, views_async
+
+
+def rotas_feed(assincronas):
+    # feed, swipes, linkeds e configuracoes: no ASGI (VIEWS_ASSINCRONAS) entram as versoes async do views_async.py
+    v = views_async if assincronas else views
+    return [
+        path('like/<int:user_id>/', v.like, name='like'),
+        path('dislike/<int:user_id>/', v.dislike, name='dislike'),
+        path('superlike/<int:user_id>/', v.superlike, name='superlike'),
+        path('pegar-proximo-perfil/', v.pegar_proximo_perfil, name='pegar_proximo_perfil'),
+        path('api/linkeds/', v.api_linkeds, name='api_linkeds'),
+        path('api/configuracoes/', v.api_configuracoes_usuario, name='api_configuracoes_usuario'),
+    ]
+
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -10,15 +25,15 @@ urlpatterns = [
     path('linkeds/', views.linkeds, name='linkeds'),  # Altera
     path('landingpage/', views.landingpage, name='landingpage'),
     path('configuracoes/', views.configuracoes, name='configuracoes'),
-    path('like/<int:user_id>/', views.like, name='like'),
-    path('dislike/<int:user_id>/', views.dislike, name='dislike'),
-    path('superlike/<int:user_id>/', views.superlike, name='superlike'),
-    path('pegar-proximo-perfil/', views.pegar_proximo_perfil, name='pegar_proximo_perfil'),
+    path('api/feed/', views.api_feed, name='api_feed'),
+    path('api/swipe/', views.api_swipe, name='api_swipe'),
+    path('api/swipes/batch/', views.api_swipes_lote, name='api_swipes_lote'),
     path('configuracoes/user-profile/', views.user_profile, name='user_profile'),
     path('configuracoes/config-profile/', views.config_profile, name='config-profile'),
     path('configuracoes/editar-perfil/', views.configurar_profile, name='configurar_profile'),
     path('api/perfil-usuario/', views.api_perfil_usuario, name='api_perfil_usuario'),
-    path('api/linkeds/', views.api_linkeds, name='api_linkeds'),
+    path('api/notificacoes/stream/', views.api_notificacoes_stream, name='api_notificacoes_stream'),
+    path('api/presenca/', views.api_presenca, name='api_presenca'),
     path('api/grupos-estudo/', views.api_grupos_estudo, name='api_grupos_estudo'),
     path('api/grupos-estudo/<int:grupo_id>/', views.api_detalhes_grupo, name='api_detalhes_grupo'),
     path('logout/', views.logout_view, name='logout'),
@@ -34,7 +49,12 @@ urlpatterns = [
     path('2fa/verificar/', views.verificar_2fatores, name='verificar_2fatores'),
     path('2fa/desabilitar/', views.desabilitar_2fatores, name='desabilitar_2fatores'),
     path('2fa/status/', views.status_2fatores, name='status_2fatores'),
-    path('api/configuracoes/', views.api_configuracoes_usuario, name='api_configuracoes_usuario'),
     path('api/relatorio-problema/', views.api_relatorio_problema, name='api_relatorio_problema'),
     path('api/exportar-dados/', views.api_exportar_dados, name='api_exportar_dados'),
-]
+    path('api/exportar-dados/<int:tarefa_id>/', views.api_exportacao_arquivo, name='api_exportacao_arquivo'),
+    path('api/universidades/', views.api_universidades, name='api_universidades'),
+    path('api/universidades/locais/', views.api_universidades_locais, name='api_universidades_locais'),
+    path('api/cursos/', views.api_cursos, name='api_cursos'),
+    path('api/busca/habilidades/', views.api_busca_habilidades, name='api_busca_habilidades'),
+    path('api/relatorio-consultas/', views.api_relatorio_consultas, name='api_relatorio_consultas'),
+] + rotas_feed(getattr(settings, 'VIEWS_ASSINCRONAS', False))
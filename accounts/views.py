@@ -1,21 +1,47 @@
 from allauth.account.views import SignupView
 from accounts.forms import CustomSignupForm, EditarPerfilForm, EditarPreferenciasForm
-from .models import CustomUser, Habilidades, Like, Superlike, Dislike, Linkeds, PreferenciasEstudo, AparelhoSMS, FotosUsuario, GrupoDeEstudos, MembroGrupoEstudos, ConfiguracoesUsuario, RelatorioProblema
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from .models import Curso, Habilidades, Interacao, Conexao, PreferenciasEstudo, AparelhoSMS, FotosUsuario, GrupoDeEstudos, MembroGrupoEstudos, ConfiguracoesUsuario, RelatorioProblema, Tarefa, avisar_admins_relatorio
+from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 import json
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
 from django.conf import settings
-from django.db import transaction, models
-from django.views.decorators.http import require_http_methods
-from django.db.models import Exists, OuterRef
+from django.db import models
+from django.db.models import Prefetch, Count, Max
+from django.views.decorators.http import require_http_methods, condition
+from django.utils.dateparse import parse_datetime
 from django_otp.decorators import otp_required
 from django_otp import match_token
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django.contrib.auth import login, authenticate
 import re
+import base64
+import binascii
+import hashlib
+import bisect
+from . import feed, swipes, conexoes, universidades, cursos, indice_habilidades, cartoes, notificacoes, presenca, tarefas, exportacao, imagens
+from .middleware import relatorio_consultas
+from django.contrib.admin.views.decorators import staff_member_required
+
+# tamanho padrao e maximo da pagina do /api/feed/
+FEED_PAGINA_PADRAO = 10
+FEED_PAGINA_MAXIMA = 30
+
+# tamanho padrao e maximo da pagina do /api/linkeds/
+LINKEDS_PAGINA_PADRAO = 50
+LINKEDS_PAGINA_MAXIMA = 200
+# e do /api/busca/habilidades/
+BUSCA_HABILIDADES_PAGINA_PADRAO = 20
+BUSCA_HABILIDADES_PAGINA_MAXIMA = 100
+
+# mensagem de sucesso de cada tipo de swipe
+MENSAGENS_SWIPE = {
+    Interacao.LIKE: 'Like enviado!',
+    Interacao.SUPERLIKE: 'Superlike enviado!',
+    Interacao.DISLIKE: 'Dislike enviado!'}
 
 
 
@@ -36,25 +62,37 @@ class MySignupView(SignupView):
         return super().form_invalid(form)
 
 def buscar_proximo_perfil(usuario):
-    # vai criar subqueries pra ver se o usuario ja curtiu, descurtiu ou supercurtiu o outro usuario
-    # se ja tiver feito alguma dessas interacoes, o usuario nao aparece mais pra ele
-    # resumindo = historico de interacoes
-    likes_subquery = Like.objects.filter(de_usuario=usuario, para_usuario=OuterRef('pk'))
-    dislikes_subquery = Dislike.objects.filter(de_usuario=usuario, para_usuario=OuterRef('pk'))
-    superlikes_subquery = Superlike.objects.filter(de_usuario=usuario, para_usuario=OuterRef('pk'))
-        
-
-    # gera informacoes sobre as interacoes. pega todas elas, ve se existe, e filtra pra trazer só os usuarios que nao tiveram interacao ainda
-    return CustomUser.objects.annotate(
-        ja_curtiu=Exists(likes_subquery),
-        ja_descurtiu=Exists(dislikes_subquery),
-        ja_supercurtiu=Exists(superlikes_subquery)).filter(
-            ja_curtiu=False,
-            ja_descurtiu=False,
-            ja_supercurtiu=False,
-            is_staff=False).exclude(
-                # exclui o proprio usuario logado e traz apenas as informacoes relevantes com o return
-                id=usuario.id).only('id','username','cidade','estado','bio').prefetch_related('habilidades').first()
+    # pega o perfil da frente da fila pre-calculada do usuario (ver feed.py), em vez de varrer a tabela de usuarios toda vez
+    # quem ja teve interacao (like, dislike ou superlike) nem entra na fila
+    while True:
+        candidato_id = feed.proximo_candidato_id(usuario)
+        if candidato_id is None:
+            return None
+
+        # o cartao do candidato vem do cache (ver cartoes.py), so vai no banco se ainda nao tiver la
+        perfil = cartoes.obter_cartao(candidato_id)
+        if perfil and not perfil['staff']:
+            return perfil
+
+        # o usuario da fila foi apagado ou virou staff, entao pula ele
+        feed.avancar_fila(usuario.id, candidato_id)
+
+def buscar_perfis_card(ids):
+    # busca os cartoes de varios perfis de uma vez (um get_many no cache), mantendo a ordem dos ids (ordem da fila)
+    return [perfil for perfil in cartoes.obter_cartoes(ids) if not perfil['staff']]
+
+def serializar_card_perfil(perfil):
+    # monta o dicionario do card do feed que vai pro front a partir do cartao
+    return {
+        'id': perfil['id'],
+        'username': perfil['username'],
+        'cidade': perfil['cidade'] or 'Localização não informada',
+        'estado': perfil['estado'] or '',
+        'bio': perfil['bio'] or 'Biografia não informada',
+        'habilidades': perfil['habilidades'],
+        'foto': imagens.foto_para(perfil, 'media'),
+        'foto_srcset': imagens.srcset(perfil)
+    }
 
 def tratamento_dados_request(request):
     # pega os dados do request e transforma num json para poder ser trabalho no resto das funções
@@ -68,59 +106,35 @@ def criar_resposta_erro(message, status_code=400):
     # autoexplicativo o nome, cria resposta pros erros
     return JsonResponse({'status':'error','message':message}, status=status_code)
 
-def validar_interacoes(usuario_atual, usuario_alvo):
-    # checa se o usuário está tentando interagir com ele mesmo
-    if usuario_atual == usuario_alvo:
+def validar_mensagem_superlike(msg):
+    # se a mensagem tiver menos que 10 caracteres ou mais que 500, apresenta o respectivo erro
+    erro = swipes.erro_mensagem_superlike(msg)
+    if erro:
+        return JsonResponse({'status':'error','message':erro}, status=400)
+
+    return None # mensagem ok
+
+def responder_swipe(usuario_atual, user_id, tipo, msg=''):
+    # grava a interacao pelo servico de swipe (ver swipes.py) e transforma o resultado na resposta pro front
+    return resposta_swipe(swipes.registrar_swipe(usuario_atual, user_id, tipo, msg), tipo)
+
+def resposta_swipe(resultado, tipo):
+    # resposta pro front de cada resultado do swipe (usada tambem pelas views async)
+    if resultado == swipes.PROPRIO_USUARIO:
         return JsonResponse({'status':'error','message':'Você não pode interagir consigo mesmo!'}, status=400)
-    
-    # checa se o usuario mostrado e o usuario logado já interagiram anteriormente
-    interacao_existe = (
-        Like.objects.filter(de_usuario=usuario_atual, para_usuario=usuario_alvo).exists() or
-        Dislike.objects.filter(de_usuario=usuario_atual, para_usuario=usuario_alvo).exists() or
-        Superlike.objects.filter(de_usuario=usuario_atual, para_usuario=usuario_alvo).exists())
-    
+
+    if resultado == swipes.NAO_ENCONTRADO:
+        return JsonResponse({'status':'error','message':'Usuário não encontrado.'}, status=404)
+
     # se ja interagiram, retorna a mensagem de info
-    if interacao_existe:
+    if resultado == swipes.JA_INTERAGIU:
         return JsonResponse({'status':'info','message':'Você já interagiu com esse usuário anteriormente.'})
 
-    return None # sem erro ou interacao anterior
-
-def processar_interacao_mutua(usuario_atual, usuario_alvo):
-    # inverte a ordem do usuario que curtiu e o que foi curtido com o like
-    like_inverso = Like.objects.filter(
-        de_usuario=usuario_alvo,
-        para_usuario=usuario_atual).first()
-
-    # inverte a ordem do usuario que curtiu e o que foi curtido com o superlike
-    superlike_inverso = Superlike.objects.filter(
-        de_usuario=usuario_alvo,
-        para_usuario=usuario_atual).first()
-
-    # caso haja uma interação mutua (os dois usuarios curtiram um ao outro), realiza link entre eles
-    if like_inverso or superlike_inverso:
-        usuario1, usuario2 = sorted([usuario_atual, usuario_alvo], key=lambda u:u.id)
-        Linkeds.objects.get_or_create(
-            usuario1=usuario_atual,
-            usuario2=usuario_alvo)
-        return True # link criado
-
-    return False # sem interação mutua
-
-def verificar_link_ou_criar(usuario_atual, usuario_alvo):
-    # verifica se ja existe interacao mutua (os dois usuarios se curtiram) e cria o link caso positivo, tanto com like quanto superlike
-    interacao_mutua = (
-        Like.objects.filter(de_usuario=usuario_alvo, para_usuario=usuario_atual).exists() or
-        Superlike.objects.filter(de_usuario=usuario_alvo, para_usuario=usuario_atual).exists())
-    
-    # se houver interacao mutua, cria o link (se ja existir, nao cria de novo por causa do unique_together)
-    if interacao_mutua:
-        Linkeds.objects.get_or_create(
-            usuario1=min(usuario_atual, usuario_alvo, key=lambda u: u.id), # minimo pra garantir que o usuario1 seja sempre o de menor id, evitando bugs ou uma ordem trocada de interacoes, tipo joao e maria e maria e joao
-            # assim gera menos possibilidades de erro e menos carga pro servidor etc
-            usuario2=max(usuario_atual, usuario_alvo, key=lambda u: u.id))
-        return True # link criado
+    # deu interação mutua (os dois usuarios se curtiram), entao virou link
+    if resultado == swipes.LINKED:
+        return JsonResponse({'status':'success','message':'Linked!','matched':True})
 
-    return False # sem interação mutua, ou seja, so envia a interacao, sem criar nd
+    return JsonResponse({'status':'success','message':MENSAGENS_SWIPE[tipo],'matched':False})
 
 @login_required(login_url='landingpage/')
 def home(request):
@@ -129,10 +143,10 @@ def home(request):
     
     # se nao tiver mais perfis disponiveis, renderiza a home com o perfil como None e fim como True, pra mostrar a tela de "sem mais perfis disponiveis"
     if not proximo_perfil:
-        return render(request, 'home.html', {'perfil':None, 'fim':True})
+        return render(request, 'home.html', {'perfil':None, 'fim':True, **notificacoes.contexto_pagina(request)})
 
     # se nao, renderiza a home com o perfil encontrado
-    return render(request, 'home.html', {'perfil': proximo_perfil})
+    return render(request, 'home.html', {'perfil': proximo_perfil, **notificacoes.contexto_pagina(request)})
 
 @require_http_methods(["GET"])
 @login_required(login_url='/accounts/login/')
@@ -148,23 +162,40 @@ def pegar_proximo_perfil(request): # Endpoint AJAX pra pegar o proximo usuario d
     if not proximo_perfil:
         return JsonResponse({'status': 'no_more_profiles','message': 'Não há mais perfis para mostrar no momento.','perfil': None})
     
-    # pega as habilidades do perfil
-    habilidades = [str(hab) for hab in proximo_perfil.habilidades.all()]
-    
     # retorna os dados do perfil pro front
     return JsonResponse({
         'status': 'success',
-        'perfil': {
-            'id': proximo_perfil.id,
-            'username': proximo_perfil.username,
-            'cidade': proximo_perfil.cidade or 'Localização não informada',
-            'estado': proximo_perfil.estado or '',
-            'bio': proximo_perfil.bio or 'Biografia não informada',
-            'habilidades': habilidades
-        }
+        'perfil': serializar_card_perfil(proximo_perfil)
+    })
+
+@require_http_methods(["GET"])
+@login_required(login_url='/accounts/login/')
+def api_feed(request):
+    """API endpoint que retorna os proximos N perfis do feed de uma vez (o front guarda eles num buffer)"""
+    # quantidade de perfis por pagina, limitada pra ninguem pedir a fila inteira
+    try:
+        quantidade = min(max(int(request.GET.get('count', FEED_PAGINA_PADRAO)), 1), FEED_PAGINA_MAXIMA)
+    except ValueError:
+        return criar_resposta_erro('Parâmetro count inválido.')
+
+    # cursor = id do ultimo perfil que o front ja tem no buffer
+    depois_de = request.GET.get('after')
+    try:
+        depois_de = int(depois_de) if depois_de else None
+    except ValueError:
+        return criar_resposta_erro('Parâmetro after inválido.')
+
+    ids, reiniciou = feed.proximos_candidatos_ids(request.user, quantidade, depois_de)
+    perfis = buscar_perfis_card(ids)
+
+    return JsonResponse({
+        'status': 'success' if perfis else 'no_more_profiles',
+        'perfis': [serializar_card_perfil(perfil) for perfil in perfis],
+        'cursor': perfis[-1]['id'] if perfis else depois_de,
+        # o cursor tinha saido da fila: a pagina veio do comeco e o front troca o buffer por ela
+        'reset': reiniciou
     })
 
-@transaction.atomic
 @require_http_methods(["POST"])
 @login_required(login_url='/accounts/login/')
 def like(request, user_id):
@@ -172,30 +203,9 @@ def like(request, user_id):
     if request.method != 'POST':
         return JsonResponse({'status':'error','message':'Método não permitido.'}, status=405)
 
-    # pega os dados do request (q é transformado em JSON pela funcao de tratamento_dados_request), o usuario atual (logado) e o usuario alvo (o que recebeu o like)
-    data = tratamento_dados_request(request)
-    usuario_atual = request.user
-    usuario_alvo = get_object_or_404(CustomUser, id=user_id)
-
-    # checagem de interação, seja pra ver se o usuario interagiu com ele mesmo ou se ja interagiu com o usuario alvo
-    resposta_erro = validar_interacoes(usuario_atual, usuario_alvo)
-    # se der erro, retorna a resposta de erro
-    if resposta_erro:
-        return resposta_erro
-
-    # cria o like, ou pega o like ja existente (o que nunca vai acontecer pq a validação acima já checa isso)
-    like, criado = Like.objects.get_or_create( # esse criado aí so Deus sabe pq ta aqui e pra que serve
-        de_usuario=usuario_atual,
-        para_usuario=usuario_alvo)
-
-    # checa se houve interação mutua (os dois usuarios se curtiram) e cria o link caso positivo
-    if processar_interacao_mutua(usuario_atual, usuario_alvo):
-        return JsonResponse({'status':'success','message':'Linked!'})
-        
-    # se nao deu linked, retorna q o like foi enviado e manda pro front    
-    return JsonResponse({'status':'success', 'message':'Like enviado!'})
+    # grava o like e ja checa se virou link
+    return responder_swipe(request.user, user_id, Interacao.LIKE)
 
-@transaction.atomic
 @require_http_methods(["POST"])
 @login_required(login_url='/accounts/login/')
 def superlike(request, user_id):
@@ -203,38 +213,16 @@ def superlike(request, user_id):
     if request.method != 'POST':
         return JsonResponse({'status':'error','message':'Método não permitido.'}, status=405)
 
-    # pega os dados do request (q é transformado em JSON pela funcao de tratamento_dados_request), o usuario atual (logado) e o usuario alvo (o que recebeu o superlike) alem da msg
+    # pega a mensagem do request (q é transformado em JSON pela funcao de tratamento_dados_request)
     data = tratamento_dados_request(request)
-    usuario_atual = request.user
-    usuario_alvo = get_object_or_404(CustomUser, id=user_id)
     msg = data.get('mensagem', '').strip()
 
-    # checagem de interação, seja pra ver se o usuario interagiu com ele mesmo ou se ja interagiu com o usuario alvo
-    resposta_erro = validar_interacoes(usuario_atual, usuario_alvo)
-    # se der erro, retorna a resposta de erro
+    resposta_erro = validar_mensagem_superlike(msg)
     if resposta_erro:
         return resposta_erro
-    
-    # se a mensagem tiver menos que 10 caracteres ou mais que 500, apresenta o respectivo erro
-    if len(msg) < 10:
-        return JsonResponse({'status':'error','message':'Limite mínimo de caracteres não atingido! Você precisa adicionar no mínimo 10.'}, status=400)
-    
-    if len(msg) > 500:
-        return JsonResponse({'status':'error','message':'Limite máximo de caracteres alcançado! Você pode adicionar no máximo 500.'}, status=400)
-
-    # cria o superlike, ou pega o superlike ja existente (o que nunca vai acontecer pq a validação acima já checa isso) 
-    superlike, criado = Superlike.objects.get_or_create( # novo, esse criado aí so Deus sabe pq ta aqui e pra que serve
-        de_usuario=usuario_atual,
-        para_usuario=usuario_alvo,
-        mensagem=msg)
-    
-    # checa se houve interação mutua (os dois usuarios se curtiram) e cria o link caso positivo
-    if processar_interacao_mutua(usuario_atual, usuario_alvo):
-        return JsonResponse({'status':'success','message':'Linked!'})    
-
-    # se nao deu linked, retorna q o superlike foi enviado e manda pro front
-    return JsonResponse({'status':'success','message':'Superlike enviado!'})
 
+    # grava o superlike e ja checa se virou link
+    return responder_swipe(request.user, user_id, Interacao.SUPERLIKE, msg)
 
 @require_http_methods(["POST"])
 @login_required(login_url='/accounts/login/')
@@ -243,53 +231,72 @@ def dislike(request, user_id):
     if request.method != 'POST':
         return JsonResponse({'status':'error','message':'Método não permitido.'}, status=405)
 
-    # pega os dados necessarios, no caso o JSON com as informações do request, o usuario atual (logado) e o usuario alvo (o que recebeu o dislike)
+    # grava o dislike (dislike nunca gera link)
+    return responder_swipe(request.user, user_id, Interacao.DISLIKE)
+
+@require_http_methods(["POST"])
+@login_required(login_url='/accounts/login/')
+def api_swipe(request):
+    """API endpoint unico de swipe: recebe o tipo da acao (like, superlike ou dislike) e o id do usuario alvo"""
     data = tratamento_dados_request(request)
-    usuario_atual = request.user
-    # ou pega o usuario alvo, ou dá 404, ou seja, nao achou
-    usuario_alvo = get_object_or_404(CustomUser, id=user_id)
+    tipo = data.get('tipo')
+    if tipo not in MENSAGENS_SWIPE:
+        return criar_resposta_erro('Tipo de interação inválido.')
 
-    # checagem de interação, seja pra ver se o usuario interagiu com ele mesmo ou se ja interagiu com o usuario alvo
-    resposta_erro = validar_interacoes(usuario_atual, usuario_alvo)
-    # se der erro, retorna a resposta de erro
-    if resposta_erro:
-        return resposta_erro
-    
-    # cria o dislike, ou pega o dislike ja existente (o que nunca vai acontecer pq a validação acima já checa isso)
-    dislike, criado = Dislike.objects.get_or_create( # esse criado aí so Deus sabe pq ta aqui e pra que serve
-        de_usuario=usuario_atual,
-        para_usuario=usuario_alvo)
+    try:
+        user_id = int(data.get('user_id'))
+    except (TypeError, ValueError):
+        return criar_resposta_erro('Usuário inválido.')
 
-    # retorna sucesso se deu certo pro front
-    return JsonResponse({'status': 'success', 'message': 'Dislike enviado!'})
+    msg = ''
+    if tipo == Interacao.SUPERLIKE:
+        msg = str(data.get('mensagem', '')).strip()
+        resposta_erro = validar_mensagem_superlike(msg)
+        if resposta_erro:
+            return resposta_erro
 
-@login_required(login_url='/accounts/login/')
-def linkeds(request):
-    # usuario atual é o user logado
-    usuario_atual = request.user
-    
-    # pega todos os linkeds do usuario atual, ordenados pela data de criacao (mais recentes primeiro)
-    meus_linkeds = Linkeds.objects.filter(
-        models.Q(usuario1=usuario_atual) | models.Q(usuario2=usuario_atual)).order_by('-data_realizacao')
+    return responder_swipe(request.user, user_id, tipo, msg)
 
-    # cria uma lista de dicionarios com o usuario linkado e a data do link
-    usuarios_linkados = []
-    # loop, pra cada link nos linkeds do usuario
-    for link in meus_linkeds:
-        # ve se o usuario1 do link é o usuario atual, se sim, adiciona o usuario2 na lista
-        if link.usuario1 == usuario_atual:
-            usuarios_linkados.append({
-                'usuario': link.usuario2,
-                'data_link': link.data_realizacao
-            })
-        # senao, adiciona o usuario1            
+@require_http_methods(["POST"])
+@login_required(login_url='/accounts/login/')
+def api_swipes_lote(request):
+    """API endpoint pra mandar varios swipes de uma vez (fila offline do front, swipes rapidos etc)"""
+    data = tratamento_dados_request(request)
+    acoes = data.get('acoes') if isinstance(data, dict) else data
+    if not isinstance(acoes, list) or not acoes:
+        return criar_resposta_erro('Nenhuma ação enviada.')
+
+    if len(acoes) > swipes.TAMANHO_MAXIMO_LOTE:
+        return criar_resposta_erro(f'Máximo de {swipes.TAMANHO_MAXIMO_LOTE} ações por lote.')
+
+    resultados = swipes.registrar_swipes_em_lote(request.user, acoes)
+
+    # traduz o resultado de cada acao pro mesmo formato da resposta do swipe unico
+    itens = []
+    for resultado in resultados:
+        codigo = resultado['resultado']
+        if codigo == swipes.LINKED:
+            item = {'status': 'success', 'message': 'Linked!', 'matched': True}
+        elif codigo == swipes.REGISTRADO:
+            item = {'status': 'success', 'message': MENSAGENS_SWIPE[resultado['tipo']], 'matched': False}
+        elif codigo == swipes.JA_INTERAGIU:
+            item = {'status': 'info', 'message': 'Você já interagiu com esse usuário anteriormente.', 'matched': False}
+        elif codigo == swipes.NAO_ENCONTRADO:
+            item = {'status': 'error', 'message': 'Usuário não encontrado.', 'matched': False}
+        elif codigo == swipes.PROPRIO_USUARIO:
+            item = {'status': 'error', 'message': 'Você não pode interagir consigo mesmo!', 'matched': False}
         else:
-            usuarios_linkados.append({
-                'usuario': link.usuario1,
-                'data_link': link.data_realizacao
-            })
-    # renderiza a pagina de linkeds, passando a lista de usuarios linkados
-    return render(request, 'linkeds.html', {'linkeds': usuarios_linkados})
+            item = {'status': 'error', 'message': resultado['message'], 'matched': False}
+        item.update({'user_id': resultado['user_id'], 'tipo': resultado['tipo'], 'resultado': codigo})
+        itens.append(item)
+
+    return JsonResponse({'status': 'success', 'resultados': itens})
+
+@login_required(login_url='/accounts/login/')
+@ensure_csrf_cookie  # o heartbeat de presenca é POST e le o token do cookie
+def linkeds(request):
+    # a lista vem paginada do /api/linkeds/ pelo linkeds.js, a pagina nao consulta as conexoes
+    return render(request, 'linkeds.html', notificacoes.contexto_pagina(request))
 
 def setup_2fatores(request):
     # se for post, pega o numero do celular
@@ -485,6 +492,8 @@ def logout_view(request):
     from django.contrib import messages
     
     if request.method == 'POST':
+        # tira da presenca antes (depois do logout o request.user ja é anonimo)
+        presenca.remover(request.user.id)
         # Faz o logout do usuário
         logout(request)
         # Adiciona mensagem de sucesso (opcional)
@@ -509,49 +518,10 @@ def api_perfil_usuario(request):
     # api pra pegar informacoes do usuario, incluindo o nome da universidade
     user = request.user
     
-    # pega as habilidades do usuario
-    habilidades = [str(hab) for hab in user.habilidades.all()]
-    
-    # pega as preferencias do usuario se elas existirem
-    try:
-        preferencias = user.preferencias_estudo
-        dias_preferidos = list(preferencias.dia_semana) if preferencias.dia_semana else []
-        horarios_preferidos = list(preferencias.horario) if preferencias.horario else []
-        metodos_preferidos = list(preferencias.metodo_preferido) if preferencias.metodo_preferido else []
-    except:
-        dias_preferidos = []
-        horarios_preferidos = []
-        metodos_preferidos = []
-    
-    # pega a foto de perfil
-    foto_perfil = user.get_foto_perfil()
-    foto_url = foto_perfil.imagem.url if foto_perfil else None
-    
-    profile_data = {
-        'id': user.id,
-        'username': user.username,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'email': user.email,
-        'bio': user.bio or 'Biografia não informada',
-        'curso': user.curso,
-        'universidade_nome': user.universidade_nome or 'Universidade não informada',  # nome da universidade
-        'universidade_id': user.universidade,  # envia o ID ainda se precisar
-        'semestre': user.semestre,
-        'cidade': user.cidade,
-        'estado': user.estado,
-        'habilidades': habilidades,
-        'foto_perfil': foto_url,
-        'preferencias': {
-            'dias_disponiveis': dias_preferidos,
-            'horarios_preferidos': horarios_preferidos,
-            'metodos_preferidos': metodos_preferidos
-        }
-    }
-    
+    # o perfil montado fica no cache ate o usuario mudar alguma coisa (ver cartoes.py e os signals)
     return JsonResponse({
         'status': 'success',
-        'profile': profile_data
+        'profile': cartoes.obter_perfil_completo(user, montar_perfil_usuario)
     })
 
 
@@ -812,6 +782,50 @@ def api_perfil_usuario(request):
     return render(request, 'configuracoes/user-profile.html', context)
 
 
+def montar_perfil_usuario(user):
+    # pega as habilidades do usuario
+    habilidades = user.nomes_habilidades()
+    
+    # pega as preferencias do usuario se elas existirem
+    try:
+        preferencias = user.preferencias_estudo
+        dias_preferidos = list(preferencias.dia_semana) if preferencias.dia_semana else []
+        horarios_preferidos = list(preferencias.horario) if preferencias.horario else []
+        metodos_preferidos = list(preferencias.metodo_preferido) if preferencias.metodo_preferido else []
+    except:
+        dias_preferidos = []
+        horarios_preferidos = []
+        metodos_preferidos = []
+    
+    # pega a foto de perfil
+    foto_perfil = user.get_foto_perfil()
+    foto_url = foto_perfil.imagem.url if foto_perfil else None
+    
+    profile_data = {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'bio': user.bio or 'Biografia não informada',
+        'curso': user.curso,
+        'universidade_nome': user.universidade_nome or 'Universidade não informada',  # nome da universidade
+        'universidade_id': user.universidade,  # envia o ID ainda se precisar
+        'semestre': user.semestre,
+        'cidade': user.cidade,
+        'estado': user.estado,
+        'habilidades': habilidades,
+        'foto_perfil': foto_url,
+        'preferencias': {
+            'dias_disponiveis': dias_preferidos,
+            'horarios_preferidos': horarios_preferidos,
+            'metodos_preferidos': metodos_preferidos
+        }
+    }
+    
+    return profile_data
+
+
 def configurar_profile(request):
     """Combined view to handle both profile and preferences editing"""
     user = request.user
@@ -966,7 +980,7 @@ def definir_foto_perfil(request, foto_id):
             # remove a foto de perfil atual
             request.user.fotos.update(foto_perfil=False)
             
-            # define a nova foto de perfil e salva
+            # define a nova foto de perfil e salva (o save ja atualiza o ponteiro foto_principal do usuario)
             foto = request.user.fotos.get(id=foto_id)
             foto.foto_perfil = True
             foto.save()
@@ -976,46 +990,141 @@ def definir_foto_perfil(request, foto_id):
             return JsonResponse({'error': 'Foto não encontrada'})
 
 
+def codificar_cursor_linkeds(conexao):
+    # cursor opaco com a posicao (data, id) da ultima conexao da pagina
+    valor = f"{conexao.data_realizacao.isoformat()}|{conexao.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+def decodificar_cursor_linkeds(cursor):
+    # retorna (data, id) ou None se o cursor for invalido
+    try:
+        data, conexao_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        data = parse_datetime(data)
+        return (data, int(conexao_id)) if data else None
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+def resumo_linkeds(usuario):
+    # total e maior id das conexoes do usuario, o que muda quando entra ou sai link
+    return Conexao.objects.filter(usuario=usuario).aggregate(total=Count('id'), ultimo=Max('id'))
+
+def calcular_etag_linkeds(request, usuario, resumo, versoes_cartoes):
+    # o etag muda quando entra ou sai link do usuario (total e maior id), quando muda o cartao de algum linkado da
+    # pagina (cartoes.versoes) ou quando mudam os parametros da busca
+    chave = f"{usuario.id}:{resumo['total']}:{resumo['ultimo']}:{','.join(versoes_cartoes)}:{request.GET.urlencode()}"
+    return hashlib.md5(chave.encode()).hexdigest()
+
+def etag_linkeds(request):
+    minhas_conexoes, limite = filtrar_linkeds(request, request.user)
+    if minhas_conexoes is None:
+        return None  # parametro invalido, a view responde o erro
+    ids = minhas_conexoes.values_list('conectado_id', flat=True)[:limite]
+    return calcular_etag_linkeds(request, request.user, resumo_linkeds(request.user), cartoes.versoes(ids))
+
+def filtrar_linkeds(request, usuario):
+    """Le os parametros do /api/linkeds/ e retorna (conexoes filtradas, limite) ou (None, resposta de erro)"""
+    # tamanho da pagina
+    try:
+        limite = min(max(int(request.GET.get('limit', LINKEDS_PAGINA_PADRAO)), 1), LINKEDS_PAGINA_MAXIMA)
+    except ValueError:
+        return None, criar_resposta_erro('Parâmetro limit inválido.')
+    
+    # pega as conexoes do usuario atual, ordenadas pela data do link (mais recentes primeiro) e pelo id pra desempatar
+    minhas_conexoes = conexoes.conexoes_de(usuario)
+
+    # since: so os links criados depois desse momento (o front manda a data do link mais novo que ele ja tem)
+    since = request.GET.get('since')
+    if since:
+        since = parse_datetime(since)
+        if not since:
+            return None, criar_resposta_erro('Parâmetro since inválido.')
+        minhas_conexoes = minhas_conexoes.filter(data_realizacao__gt=since)
+
+    # cursor: continua de onde a pagina anterior parou (keyset, nao usa OFFSET)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        posicao = decodificar_cursor_linkeds(cursor)
+        if not posicao:
+            return None, criar_resposta_erro('Parâmetro cursor inválido.')
+        data, conexao_id = posicao
+        minhas_conexoes = minhas_conexoes.filter(
+            models.Q(data_realizacao__lt=data) | models.Q(data_realizacao=data, id__lt=conexao_id))
+
+    return minhas_conexoes, limite
+
 @login_required(login_url='/accounts/login/')
 @require_http_methods(["GET"])
+@condition(etag_func=etag_linkeds)
 def api_linkeds(request):
-    """API endpoint para obter usuários linkados"""
-    usuario_atual = request.user
-    
-    # pega todos os linkeds do usuario atual, ordenados pela data de criacao (mais recentes primeiro)
-    meus_linkeds = Linkeds.objects.filter(
-        models.Q(usuario1=usuario_atual) | models.Q(usuario2=usuario_atual)
-    ).select_related('usuario1', 'usuario2').order_by('-data_realizacao')
-
-    # cria uma lista de dicionarios com o usuario linkado e seus dados
+    """API endpoint para obter usuários linkados, paginado por cursor (limit + cursor) e com sincronizacao incremental (since)"""
+    minhas_conexoes, limite = filtrar_linkeds(request, request.user)
+    if minhas_conexoes is None:
+        return limite
+
+    # pega um a mais so pra saber se tem proxima pagina
+    pagina = list(minhas_conexoes[:limite + 1])
+    cartoes_linkados = cartoes.obter_cartoes([c.conectado_id for c in pagina[:limite]])
+    return resposta_linkeds(pagina, limite, cartoes_linkados)
+
+def resposta_linkeds(pagina, limite, cartoes_linkados):
+    # pagina vem com um item a mais (se tiver), que so diz se tem proxima pagina
+    tem_mais = len(pagina) > limite
+    pagina = pagina[:limite]
+
+    # cria uma lista de dicionarios com o usuario linkado e seus dados (cartoes da pagina inteira num get_many so)
+    cartoes_linkados = {cartao['id']: cartao for cartao in cartoes_linkados}
     usuarios_linkados = []
-    for link in meus_linkeds:
-        # determina qual usuario é o linkado (não o usuario atual)
-        if link.usuario1 == usuario_atual:
-            linked_user = link.usuario2
-        else:
-            linked_user = link.usuario1
-            
-        # pega foto de perfil
-        foto_perfil = linked_user.get_foto_perfil()
-        foto_url = foto_perfil.imagem.url if foto_perfil else 'https://randomuser.me/api/portraits/men/32.jpg'
-        
+    for conexao in pagina:
+        linked_user = cartoes_linkados.get(conexao.conectado_id)
+        if not linked_user:
+            continue
+
         usuarios_linkados.append({
-            'id': linked_user.id,
-            'name': linked_user.username,
-            'course': linked_user.curso,
-            'university': linked_user.universidade_nome,
-            'semester': f"{linked_user.semestre}º Semestre" if linked_user.semestre else "Semestre não informado",
-            'image': foto_url,
-            'data_link': link.data_realizacao.isoformat()
+            'id': linked_user['id'],
+            'name': linked_user['username'],
+            'course': linked_user['curso'],
+            'university': linked_user['universidade_nome'],
+            'semester': f"{linked_user['semestre']}º Semestre" if linked_user['semestre'] else "Semestre não informado",
+            'image': imagens.foto_para(linked_user, 'mini') or cartoes.FOTO_PADRAO,
+            'data_link': conexao.data_realizacao.isoformat()
         })
     
     return JsonResponse({
         'status': 'success',
-        'linkeds': usuarios_linkados
+        'linkeds': usuarios_linkados,
+        'next_cursor': codificar_cursor_linkeds(pagina[-1]) if tem_mais else None
     })
 
 
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["GET"])
+def api_notificacoes_stream(request):
+    """Stream SSE (EventSource) com os eventos do usuario na hora: link novo, superlike recebido e eventos dos grupos"""
+    # no WSGI sem NOTIFICACOES_STREAM_WSGI: 204 faz o EventSource desistir em vez de ficar reconectando
+    if not notificacoes.stream_disponivel(request):
+        return HttpResponse(status=204)
+
+    # no ASGI o corpo precisa ser um gerador async, senao o Django le o stream inteiro antes de mandar
+    if isinstance(request, ASGIRequest):
+        eventos = notificacoes.astream(request.user.id)
+    else:
+        eventos = notificacoes.stream(request.user.id)
+
+    resposta = StreamingHttpResponse(eventos, content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'  # nginx nao segura os eventos no buffer
+    return resposta
+
+
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["POST"])
+def api_presenca(request):
+    """Heartbeat de presenca: so grava no cache, nao encosta no banco"""
+    data = tratamento_dados_request(request)
+    presenca.registrar(request.user.id, ativo=data.get('ativo', True) is not False)
+    return JsonResponse({'status': 'success', 'ttl': presenca.TTL})
+
+
 @login_required(login_url='/accounts/login/')
 @require_http_methods(["GET"])
 def api_grupos_estudo(request):
@@ -1027,23 +1136,30 @@ def api_grupos_estudo(request):
         membros__user=usuario_atual,
         membros__ativo=True,
         ativo=True
-    ).prefetch_related('membros__user').order_by('-data_criacao')
+    ).prefetch_related(
+        # ja traz so os membros ativos, senao filtrar grupo.membros no loop faria uma consulta por grupo
+        Prefetch('membros', queryset=MembroGrupoEstudos.objects.filter(ativo=True).only('id', 'grupo_id', 'user_id'), to_attr='membros_ativos')
+    ).order_by('-data_criacao')
+    grupos_do_usuario = list(grupos_do_usuario)
+
+    # cartoes de todos os membros de todos os grupos num get_many so
+    membros_ids = {membro.user_id for grupo in grupos_do_usuario for membro in grupo.membros_ativos}
+    cartoes_membros = {cartao['id']: cartao for cartao in cartoes.obter_cartoes(membros_ids)}
+    # presenca de todo mundo tambem numa leitura so do cache
+    status_membros = presenca.status_de(membros_ids)
     
     grupos_data = []
     for grupo in grupos_do_usuario:
         # pega os membros ativos do grupo
-        membros_ativos = grupo.membros.filter(ativo=True).select_related('user')
+        membros_ativos = [cartoes_membros[m.user_id] for m in grupo.membros_ativos if m.user_id in cartoes_membros]
         
         membros_info = []
         for membro in membros_ativos:
-            foto_perfil = membro.user.get_foto_perfil()
-            foto_url = foto_perfil.imagem.url if foto_perfil else 'https://randomuser.me/api/portraits/men/32.jpg'
-            
             membros_info.append({
-                'name': membro.user.username,
-                'image': foto_url,
-                'course': f"{membro.user.curso} - {membro.user.semestre}º semestre" if membro.user.semestre != 'Não informado' else 'Semestre não informado',
-                'status': 'online'  # Por enquanto todos como online, depois pode implementar status real
+                'name': membro['username'],
+                'image': imagens.foto_para(membro, 'mini') or cartoes.FOTO_PADRAO,
+                'course': f"{membro['curso']} - {membro['semestre']}º semestre" if membro['semestre'] != 'Não informado' else 'Semestre não informado',
+                'status': status_membros.get(membro['id'], presenca.OFFLINE)
             })
         
         # converte dias de encontros de string para lista
@@ -1075,7 +1191,7 @@ def api_grupos_estudo(request):
 def api_detalhes_grupo(request, grupo_id):
     """API endpoint para obter detalhes específicos de um grupo"""
     try:
-        grupo = GrupoDeEstudos.objects.get(
+        grupo = GrupoDeEstudos.objects.select_related('usuario_criador').get(
             id=grupo_id,
             membros__user=request.user,
             membros__ativo=True
@@ -1084,20 +1200,23 @@ def api_detalhes_grupo(request, grupo_id):
         return JsonResponse({'status': 'error', 'message': 'Grupo não encontrado'}, status=404)
     
     # pega os membros ativos do grupo
-    membros_ativos = grupo.membros.filter(ativo=True).select_related('user')
+    membros_ativos = list(grupo.membros.filter(ativo=True).only('id', 'user_id', 'entrou_em'))
+    cartoes_membros = {cartao['id']: cartao for cartao in cartoes.obter_cartoes([m.user_id for m in membros_ativos])}
+    status_membros = presenca.status_de(cartoes_membros)
     
     membros_detalhados = []
     for membro in membros_ativos:
-        foto_perfil = membro.user.get_foto_perfil()
-        foto_url = foto_perfil.imagem.url if foto_perfil else 'https://randomuser.me/api/portraits/men/32.jpg'
+        cartao = cartoes_membros.get(membro.user_id)
+        if not cartao:
+            continue
         
         membros_detalhados.append({
-            'id': membro.user.id,
-            'name': membro.user.username,
-            'image': foto_url,
-            'course': f"{membro.user.curso} - {membro.user.semestre}º semestre",
-            'university': membro.user.universidade_nome,
-            'status': 'online',  # implementar status real depois
+            'id': cartao['id'],
+            'name': cartao['username'],
+            'image': imagens.foto_para(cartao, 'mini') or cartoes.FOTO_PADRAO,
+            'course': f"{cartao['curso']} - {cartao['semestre']}º semestre",
+            'university': cartao['universidade_nome'],
+            'status': status_membros[cartao['id']],
             'joined_at': membro.entrou_em.isoformat()
         })
     
@@ -1132,29 +1251,8 @@ def api_detalhes_grupo(request, grupo_id):
 def api_configuracoes_usuario(request):
     """API endpoint para gerenciar configurações do usuário"""
     if request.method == "GET":
-        # Buscar configurações existentes ou criar novas
-        config, created = ConfiguracoesUsuario.objects.get_or_create(user=request.user)
-        
-        return JsonResponse({
-            'status': 'success',
-            'config': {
-                'notificacao_linkeds': config.notificacao_linkeds,
-                'notificacao_mensagens': config.notificacao_mensagens,
-                'notificacao_eventos': config.notificacao_eventos,
-                'notificacao_sons': config.notificacao_sons,
-                'mostrar_status_online': config.mostrar_status_online,
-                'confirmacao_leitura': config.confirmacao_leitura,
-                'visibilidade_perfil': config.visibilidade_perfil,
-                'mostrar_curso': config.mostrar_curso,
-                'distancia_maxima': config.distancia_maxima,
-                'modo_escuro': config.modo_escuro,
-                'tamanho_fonte': config.tamanho_fonte,
-                'idioma': config.idioma,
-                'backup_automatico': config.backup_automatico,
-                'notificacao_matchs': config.notificacao_matchs,
-                'notificacao_eventos_grupos': config.notificacao_eventos_grupos,
-            }
-        })
+        # Buscar configurações existentes ou criar novas (pelo cache, a leitura nao disputa o SQLite com as gravacoes)
+        return resposta_configuracoes(ConfiguracoesUsuario.do_usuario(request.user))
     
     elif request.method == "POST":
         try:
@@ -1164,29 +1262,9 @@ def api_configuracoes_usuario(request):
             
             # Buscar ou criar configurações
             config, created = ConfiguracoesUsuario.objects.get_or_create(user=request.user)
-            
-            # Atualizar campos
-            boolean_fields = [
-                'notificacao_linkeds', 'notificacao_mensagens', 'notificacao_eventos', 
-                'notificacao_sons', 'mostrar_status_online', 'confirmacao_leitura',
-                'visibilidade_perfil', 'mostrar_curso', 'modo_escuro', 'backup_automatico',
-                'notificacao_matchs', 'notificacao_eventos_grupos'
-            ]
-            
-            for field in boolean_fields:
-                if field in data:
-                    setattr(config, field, bool(data[field]))
-            
-            # Campos específicos
-            if 'distancia_maxima' in data:
-                config.distancia_maxima = int(data['distancia_maxima'])
-            
-            if 'tamanho_fonte' in data and data['tamanho_fonte'] in ['small', 'medium', 'large']:
-                config.tamanho_fonte = data['tamanho_fonte']
-            
-            if 'idioma' in data and data['idioma'] in ['pt-br', 'en-us', 'es']:
-                config.idioma = data['idioma']
-            
+            if atualizar_configuracoes(config, data):
+                # a fila foi montada com o raio antigo
+                feed.invalidar_fila(request.user.id)
             config.save()
             
             return JsonResponse({
@@ -1199,6 +1277,59 @@ def api_configuracoes_usuario(request):
             return criar_resposta_erro(f"Erro ao salvar configurações: {str(e)}")
 
 
+def resposta_configuracoes(config):
+    return JsonResponse({
+        'status': 'success',
+        'config': {
+            'notificacao_linkeds': config.notificacao_linkeds,
+            'notificacao_mensagens': config.notificacao_mensagens,
+            'notificacao_eventos': config.notificacao_eventos,
+            'notificacao_sons': config.notificacao_sons,
+            'mostrar_status_online': config.mostrar_status_online,
+            'confirmacao_leitura': config.confirmacao_leitura,
+            'visibilidade_perfil': config.visibilidade_perfil,
+            'mostrar_curso': config.mostrar_curso,
+            'distancia_maxima': config.distancia_maxima,
+            'modo_escuro': config.modo_escuro,
+            'tamanho_fonte': config.tamanho_fonte,
+            'idioma': config.idioma,
+            'backup_automatico': config.backup_automatico,
+            'notificacao_matchs': config.notificacao_matchs,
+            'notificacao_eventos_grupos': config.notificacao_eventos_grupos,
+        }
+    })
+
+
+def atualizar_configuracoes(config, data):
+    """Aplica os campos enviados no config (sem salvar). Retorna True se a distancia maxima mudou"""
+    # Atualizar campos
+    boolean_fields = [
+        'notificacao_linkeds', 'notificacao_mensagens', 'notificacao_eventos', 
+        'notificacao_sons', 'mostrar_status_online', 'confirmacao_leitura',
+        'visibilidade_perfil', 'mostrar_curso', 'modo_escuro', 'backup_automatico',
+        'notificacao_matchs', 'notificacao_eventos_grupos'
+    ]
+    
+    for field in boolean_fields:
+        if field in data:
+            setattr(config, field, bool(data[field]))
+    
+    # Campos específicos
+    distancia_mudou = False
+    if 'distancia_maxima' in data:
+        distancia_maxima = int(data['distancia_maxima'])
+        distancia_mudou = distancia_maxima != config.distancia_maxima
+        config.distancia_maxima = distancia_maxima
+    
+    if 'tamanho_fonte' in data and data['tamanho_fonte'] in ['small', 'medium', 'large']:
+        config.tamanho_fonte = data['tamanho_fonte']
+    
+    if 'idioma' in data and data['idioma'] in ['pt-br', 'en-us', 'es']:
+        config.idioma = data['idioma']
+
+    return distancia_mudou
+
+
 @login_required(login_url='/accounts/login/')
 @require_http_methods(["POST"])
 def api_relatorio_problema(request):
@@ -1229,6 +1360,9 @@ def api_relatorio_problema(request):
             arquivos_anexados=data.get('filesCount', 0)
         )
         
+        # email pros admins vai pela fila, o usuario nao espera o SMTP
+        tarefas.enfileirar(avisar_admins_relatorio, relatorio_id=relatorio.id)
+        
         return JsonResponse({
             'status': 'success',
             'message': f'Relatório #{relatorio.id} enviado com sucesso!',
@@ -1240,94 +1374,141 @@ def api_relatorio_problema(request):
 
 
 @login_required(login_url='/accounts/login/')
-@require_http_methods(["GET"])
+@require_http_methods(["GET", "POST"])
 def api_exportar_dados(request):
-    """API endpoint para exportar dados do usuário"""
-    try:
-        user = request.user
-        
-        # Buscar dados relacionados
-        config = ConfiguracoesUsuario.objects.filter(user=user).first()
-        preferencias = PreferenciasEstudo.objects.filter(user=user).first()
-        fotos = FotosUsuario.objects.filter(user=user)
-        grupos = MembroGrupoEstudos.objects.filter(user=user, ativo=True)
-        
-        # Preparar dados para exportação
-        dados_exportacao = {
-            'perfil': {
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'data_nascimento': user.data_nascimento.isoformat() if user.data_nascimento else None,
-                'genero': user.genero,
-                'estado': user.estado,
-                'cidade': user.cidade,
-                'universidade': user.universidade,
-                'universidade_nome': user.universidade_nome,
-                'curso': user.curso,
-                'semestre': user.semestre,
-                'celular': user.celular,
-                'bio': user.bio,
-                'data_cadastro': user.date_joined.isoformat(),
-                'ultimo_login': user.last_login.isoformat() if user.last_login else None,
-            },
-            'configuracoes': {
-                'notificacoes': {
-                    'linkeds': config.notificacao_linkeds if config else True,
-                    'mensagens': config.notificacao_mensagens if config else True,
-                    'eventos': config.notificacao_eventos if config else False,
-                    'sons': config.notificacao_sons if config else True,
-                    'matchs': config.notificacao_matchs if config else True,
-                    'eventos_grupos': config.notificacao_eventos_grupos if config else False,
-                },
-                'privacidade': {
-                    'mostrar_status_online': config.mostrar_status_online if config else True,
-                    'confirmacao_leitura': config.confirmacao_leitura if config else True,
-                    'visibilidade_perfil': config.visibilidade_perfil if config else True,
-                    'mostrar_curso': config.mostrar_curso if config else True,
-                },
-                'interface': {
-                    'modo_escuro': config.modo_escuro if config else False,
-                    'tamanho_fonte': config.tamanho_fonte if config else 'medium',
-                    'idioma': config.idioma if config else 'pt-br',
-                },
-                'sistema': {
-                    'backup_automatico': config.backup_automatico if config else True,
-                    'distancia_maxima': config.distancia_maxima if config else 50,
-                }
-            },
-            'preferencias_estudo': {
-                'dias_semana': preferencias.dia_semana if preferencias else [],
-                'horarios': preferencias.horario if preferencias else [],
-                'metodos': preferencias.metodo_preferido if preferencias else [],
-            },
-            'grupos_estudo': [
-                {
-                    'nome': membro.grupo.nome,
-                    'materia': membro.grupo.materia,
-                    'entrou_em': membro.entrou_em.isoformat(),
-                    'ativo': membro.ativo
-                }
-                for membro in grupos
-            ],
-            'fotos': [
-                {
-                    'descricao': foto.descricao,
-                    'foto_perfil': foto.foto_perfil,
-                    'ordem': foto.ordem,
-                    'data_upload': foto.data_upload.isoformat()
-                }
-                for foto in fotos
-            ],
-            'data_exportacao': user.date_joined.isoformat(),
-            'versao_exportacao': '1.0'
-        }
-        
+    """API endpoint para exportar dados do usuário. GET devolve na hora (em streaming, ?formato=zip inclui os arquivos
+    das fotos), POST gera o arquivo em segundo plano"""
+    if request.method == "POST":
+        tarefa = tarefas.enfileirar(exportacao.gerar_arquivo, usuario=request.user, usuario_id=request.user.id)
         return JsonResponse({
-            'status': 'success',
-            'data': dados_exportacao
-        })
-        
-    except Exception as e:
-        return criar_resposta_erro(f"Erro ao exportar dados: {str(e)}")
+            'status': 'queued',
+            'message': 'Exportação iniciada, o arquivo fica pronto em instantes.',
+            'tarefa_id': tarefa.id
+        }, status=202)
+
+    if request.GET.get('formato') == 'zip':
+        pedacos, tipo = exportacao.pedacos_zip(request.user), 'application/zip'
+    else:
+        pedacos, tipo = exportacao.pedacos_resposta(request.user), 'application/json'
+    if isinstance(request, ASGIRequest):
+        pedacos = exportacao.aiterar(pedacos)
+
+    resposta = StreamingHttpResponse(pedacos, content_type=tipo)
+    if tipo == 'application/zip':
+        resposta['Content-Disposition'] = 'attachment; filename="unicrossed-dados.zip"'
+    return resposta
+
+
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["GET"])
+def api_exportacao_arquivo(request, tarefa_id):
+    """Andamento da exportacao pedida por POST e, quando termina, o download do arquivo"""
+    tarefa = Tarefa.objects.filter(
+        id=tarefa_id, usuario=request.user, funcao=tarefas.caminho(exportacao.gerar_arquivo)).first()
+    if tarefa is None:
+        return criar_resposta_erro("Exportação não encontrada", 404)
+    if tarefa.status == Tarefa.FALHOU:
+        return criar_resposta_erro("Não foi possível gerar a exportação, tente de novo", 500)
+    if tarefa.status != Tarefa.CONCLUIDA:
+        return JsonResponse({'status': tarefa.status, 'tentativas': tarefa.tentativas})
+
+    # o arquivo é apagado depois do download (ou pela tarefa, quando passa a validade)
+    if not exportacao.armazenamento().exists(tarefa.resultado['arquivo']):
+        return criar_resposta_erro("A exportação expirou ou já foi baixada, peça uma nova", 410)
+    arquivo = exportacao.ArquivoExportado(tarefa.resultado['arquivo'])
+    return FileResponse(arquivo, as_attachment=True, filename='unicrossed-dados.json', content_type='application/json')
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def api_relatorio_consultas(request):
+    """API endpoint (so staff) com o relatorio do perfilador de consultas: consultas por view e requests recentes"""
+    if not getattr(settings, 'PERFILADOR_CONSULTAS', False):
+        return criar_resposta_erro('Perfilador de consultas desligado (PERFILADOR_CONSULTAS).', 404)
+
+    return JsonResponse({
+        'status': 'success',
+        'relatorio': relatorio_consultas()
+    })
+
+@require_http_methods(["GET"])
+def api_universidades(request):
+    """API endpoint para buscar universidades no catalogo local (q = busca por nome, estado + cidade = universidades da cidade)"""
+    # publico de proposito, o cadastro usa antes do usuario ter conta
+    indice = universidades.obter_indice()
+
+    termo = request.GET.get('q', '').strip()
+    if termo:
+        try:
+            limite = min(max(int(request.GET.get('limit', universidades.TOP_K)), 1), 50)
+        except ValueError:
+            return criar_resposta_erro('Parâmetro limit inválido.')
+        return JsonResponse({'status': 'success', 'universidades': indice.buscar(termo, limite)})
+
+    estado = request.GET.get('estado', '').strip()
+    cidade = request.GET.get('cidade', '').strip()
+    if estado and cidade:
+        return JsonResponse({'status': 'success', 'universidades': indice.da_cidade(estado, cidade)})
+
+    return criar_resposta_erro('Informe q ou estado e cidade.')
+
+@require_http_methods(["GET"])
+def api_universidades_locais(request):
+    """API endpoint que retorna os estados e as cidades que tem universidade no catalogo, pros selects do cadastro"""
+    return JsonResponse({'status': 'success', 'estados': universidades.obter_indice().estados()})
+
+@require_http_methods(["GET"])
+def api_cursos(request):
+    """API endpoint de autocomplete de cursos (q = termo, universidade = id da universidade pra priorizar os cursos dela)"""
+    termo = request.GET.get('q', '').strip()
+    if not termo:
+        return criar_resposta_erro('Parâmetro q é obrigatório.')
+
+    try:
+        limite = min(max(int(request.GET.get('limit', cursos.TOP_K)), 1), 50)
+    except ValueError:
+        return criar_resposta_erro('Parâmetro limit inválido.')
+
+    # cursos oferecidos pela universidade escolhida sobem no ranking
+    preferidos = ()
+    universidade = universidades.obter_indice().por_id(request.GET.get('universidade', ''))
+    if universidade:
+        preferidos = [Curso.normalizar_nome(nome) for nome in universidade['cursos']]
+
+    return JsonResponse({'status': 'success', 'cursos': cursos.obter_indice().buscar(termo, limite, preferidos)})
+
+
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["GET"])
+def api_busca_habilidades(request):
+    """API endpoint pra buscar usuarios por habilidade (habilidades = ids separados por virgula, modo = todas ou qualquer)"""
+    try:
+        habilidade_ids = [int(h) for h in request.GET.get('habilidades', '').split(',') if h.strip()]
+        limite = min(max(int(request.GET.get('limit', BUSCA_HABILIDADES_PAGINA_PADRAO)), 1), BUSCA_HABILIDADES_PAGINA_MAXIMA)
+        depois_de = int(request.GET.get('cursor') or 0)
+    except ValueError:
+        return criar_resposta_erro('Parâmetros inválidos.')
+    if not habilidade_ids:
+        return criar_resposta_erro('Parâmetro habilidades é obrigatório.')
+
+    modo = request.GET.get('modo', 'todas')
+    if modo not in ('todas', 'qualquer'):
+        return criar_resposta_erro('Parâmetro modo deve ser todas ou qualquer.')
+
+    # o indice devolve so quem tem as habilidades, a pagina anda por id a partir do cursor
+    encontrados = sorted(indice_habilidades.obter_indice().buscar(habilidade_ids, todas=(modo == 'todas')) - {request.user.id})
+    inicio = bisect.bisect_right(encontrados, depois_de)
+
+    perfis = []
+    while len(perfis) < limite and inicio < len(encontrados):
+        # staff fica de fora do card, entao pode precisar de mais de uma leva pra encher a pagina
+        lote = encontrados[inicio:inicio + limite - len(perfis)]
+        perfis += buscar_perfis_card(lote)
+        inicio += len(lote)
+
+    return JsonResponse({
+        'status': 'success',
+        'total': len(encontrados),
+        'perfis': [serializar_card_perfil(perfil) for perfil in perfis],
+        'next_cursor': encontrados[inicio - 1] if inicio < len(encontrados) else None,
+    })
@@ -0,0 +1,126 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_http_methods
+
+from . import feed, swipes, cartoes
+from .models import Interacao, ConfiguracoesUsuario, Conexao
+from .views import (
+    criar_resposta_erro, tratamento_dados_request, validar_mensagem_superlike, resposta_swipe, serializar_card_perfil,
+    calcular_etag_linkeds, filtrar_linkeds, resposta_linkeds, resposta_configuracoes, atualizar_configuracoes)
+
+# versoes async das views mais chamadas, no lugar das do views.py com VIEWS_ASSINCRONAS (ASGI). Mesma validacao e mesmas
+# respostas das sync (comparacao das duas: python manage.py benchmark_async)
+
+async def buscar_proximo_perfil(usuario):
+    # mesma logica do views.buscar_proximo_perfil: perfil da frente da fila, pulando quem foi apagado ou virou staff
+    while True:
+        candidato_id = await feed.aproximo_candidato_id(usuario)
+        if candidato_id is None:
+            return None
+
+        perfil = await cartoes.aobter_cartao(candidato_id)
+        if perfil and not perfil['staff']:
+            return perfil
+
+        await sync_to_async(feed.avancar_fila)(usuario.id, candidato_id)
+
+
+@require_http_methods(["GET"])
+@login_required(login_url='/accounts/login/')
+async def pegar_proximo_perfil(request):
+    proximo_perfil = await buscar_proximo_perfil(await request.auser())
+
+    if not proximo_perfil:
+        return JsonResponse({'status': 'no_more_profiles','message': 'Não há mais perfis para mostrar no momento.','perfil': None})
+
+    return JsonResponse({
+        'status': 'success',
+        'perfil': serializar_card_perfil(proximo_perfil)
+    })
+
+
+async def responder_swipe(request, user_id, tipo, msg=''):
+    resultado = await swipes.aregistrar_swipe(await request.auser(), user_id, tipo, msg)
+    return resposta_swipe(resultado, tipo)
+
+
+@require_http_methods(["POST"])
+@login_required(login_url='/accounts/login/')
+async def like(request, user_id):
+    return await responder_swipe(request, user_id, Interacao.LIKE)
+
+
+@require_http_methods(["POST"])
+@login_required(login_url='/accounts/login/')
+async def superlike(request, user_id):
+    # o corpo ja chega inteiro no request (o ASGIHandler le antes de chamar a view), entao ler aqui nao bloqueia
+    data = tratamento_dados_request(request)
+    msg = data.get('mensagem', '').strip()
+
+    resposta_erro = validar_mensagem_superlike(msg)
+    if resposta_erro:
+        return resposta_erro
+
+    return await responder_swipe(request, user_id, Interacao.SUPERLIKE, msg)
+
+
+@require_http_methods(["POST"])
+@login_required(login_url='/accounts/login/')
+async def dislike(request, user_id):
+    return await responder_swipe(request, user_id, Interacao.DISLIKE)
+
+
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["GET"])
+async def api_linkeds(request):
+    usuario = await request.auser()
+
+    minhas_conexoes, limite = filtrar_linkeds(request, usuario)
+    if minhas_conexoes is None:
+        return limite
+
+    # o @condition chama a funcao do etag de forma sync (e ela consulta o banco), entao aqui a revalidacao é feita na mao
+    resumo = await Conexao.objects.filter(usuario=usuario).aaggregate(total=Count('id'), ultimo=Max('id'))
+    ids = [conectado_id async for conectado_id in minhas_conexoes.values_list('conectado_id', flat=True)[:limite]]
+    etag = quote_etag(calcular_etag_linkeds(request, usuario, resumo, await cartoes.aversoes(ids)))
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is not None:
+        return resposta
+
+    pagina = [conexao async for conexao in minhas_conexoes[:limite + 1]]
+    cartoes_linkados = await cartoes.aobter_cartoes([c.conectado_id for c in pagina[:limite]])
+    resposta = resposta_linkeds(pagina, limite, cartoes_linkados)
+    resposta.headers.setdefault('ETag', etag)
+    return resposta
+
+
+@login_required(login_url='/accounts/login/')
+@require_http_methods(["GET", "POST"])
+async def api_configuracoes_usuario(request):
+    usuario = await request.auser()
+    if request.method == "GET":
+        return resposta_configuracoes(await ConfiguracoesUsuario.ado_usuario(usuario))
+
+    try:
+        data = tratamento_dados_request(request)
+        if not data:
+            return criar_resposta_erro("Dados inválidos")
+
+        config, created = await ConfiguracoesUsuario.objects.aget_or_create(user=usuario)
+        if atualizar_configuracoes(config, data):
+            # a fila foi montada com o raio antigo
+            await feed.ainvalidar_fila(usuario.id)
+        await config.asave()
+
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Configurações salvas com sucesso!',
+            'config_id': config.id
+        })
+
+    except Exception as e:
+        return criar_resposta_erro(f"Erro ao salvar configurações: {str(e)}")
@@ -97,6 +97,7 @@ document.addEventListener("DOMContentLoaded", () => {
     // const [btnContinuar, formError, signupForm] = [document.querySelector("#btn-continuar"), $("form-error"), $("signup-form")];
 
     let universidades = [];
+    let locais = {};
 
     const mostrarErro = (msg) => {
         if (formError) {
@@ -165,15 +166,15 @@ document.addEventListener("DOMContentLoaded", () => {
 
             mostrarStep(step2);
 
-            fetch("http://localhost:3000/universidades")
+            // so os estados e cidades com universidade, as universidades vem depois por cidade
+            fetch("/api/universidades/locais/")
                 .then(res => {
                     if (!res.ok) throw new Error("Erro na resposta");
                     return res.json();
                 })
                 .then(data => {
-                    universidades = data;
-                    const estados = [...new Set(data.map(u => u.estado))];
-                    if (estado) preencherSelect(estado, estados, "Selecione o estado");
+                    locais = data.estados;
+                    if (estado) preencherSelect(estado, Object.keys(locais), "Selecione o estado");
                 })
                 .catch(error => {
                     console.error("Erro ao carregar universidades:", error);
@@ -225,9 +226,7 @@ document.addEventListener("DOMContentLoaded", () => {
     // Eventos para selects dinâmicos
     if (estado) {
         estado.addEventListener("change", () => {
-            const cidades = [...new Set(universidades
-                .filter(u => u.estado === estado.value)
-                .map(u => u.cidade))];
+            const cidades = locais[estado.value] || [];
             if (cidade) preencherSelect(cidade, cidades, "Selecione a cidade");
             if (universidade) preencherSelect(universidade, [], "Selecione uma cidade primeiro");
             if (curso) preencherSelect(curso, [], "Selecione uma universidade primeiro");
@@ -236,15 +235,24 @@ document.addEventListener("DOMContentLoaded", () => {
 
     if (cidade) {
         cidade.addEventListener("change", () => {
-            const unis = universidades.filter(u =>
-                u.estado === estado?.value &&
-                u.cidade === cidade.value
-            );
-            if (universidade) preencherSelect(universidade,
-                unis.map(u => ({ value: u.id, label: u.nome })),
-                "Selecione a universidade"
-            );
             if (curso) preencherSelect(curso, [], "Selecione um curso primeiro");
+            const params = new URLSearchParams({ estado: estado?.value || "", cidade: cidade.value });
+            fetch(`/api/universidades/?${params.toString()}`)
+                .then(res => {
+                    if (!res.ok) throw new Error("Erro na resposta");
+                    return res.json();
+                })
+                .then(data => {
+                    universidades = data.universidades;
+                    if (universidade) preencherSelect(universidade,
+                        universidades.map(u => ({ value: u.id, label: u.nome })),
+                        "Selecione a universidade"
+                    );
+                })
+                .catch(error => {
+                    console.error("Erro ao carregar universidades:", error);
+                    mostrarErro("Erro ao carregar dados. Tente novamente.");
+                });
         });
     }
 
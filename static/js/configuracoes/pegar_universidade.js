@@ -1,7 +1,12 @@
 // Enhanced Universities and Courses API Integration for Config Profile
+
+// Search runs on the server index, so short prefixes are cheap
+const MIN_SEARCH_LENGTH = 3;
+
 class AcademicSearchManager {
   constructor() {
     this.universities = [];
+    this.selectedUniversity = null;
     this.courses = [];
     this.currentSearchType = null;
     this.searchTimeout = null;
@@ -11,7 +16,7 @@ class AcademicSearchManager {
   init() {
     console.log('🎓 Academic Search Manager loaded!');
     this.setupEventListeners();
-    this.loadUniversities();
+    this.loadCurrentUniversity();
   }
 
   setupEventListeners() {
@@ -20,7 +25,7 @@ class AcademicSearchManager {
     if (universidadeInput) {
       universidadeInput.addEventListener('click', () => {
         this.currentSearchType = 'university';
-        this.showHelpMessage('universidadeDropdown', 'Digite pelo menos 5 caracteres para buscar universidades...');
+        this.showHelpMessage('universidadeDropdown', 'Digite pelo menos 3 caracteres para buscar universidades...');
       });
 
       universidadeInput.addEventListener('input', (e) => {
@@ -30,7 +35,7 @@ class AcademicSearchManager {
 
       universidadeInput.addEventListener('focus', (e) => {
         this.currentSearchType = 'university';
-        if (e.target.value.length >= 5) {
+        if (e.target.value.length >= MIN_SEARCH_LENGTH) {
           this.handleSearch(e.target.value, 'university');
         }
       });
@@ -45,7 +50,7 @@ class AcademicSearchManager {
     if (cursoInput) {
       cursoInput.addEventListener('click', () => {
         this.currentSearchType = 'course';
-        this.showHelpMessage('cursoDropdown', 'Digite pelo menos 5 caracteres para buscar cursos...');
+        this.showHelpMessage('cursoDropdown', 'Digite pelo menos 3 caracteres para buscar cursos...');
       });
 
       cursoInput.addEventListener('input', (e) => {
@@ -55,7 +60,7 @@ class AcademicSearchManager {
 
       cursoInput.addEventListener('focus', (e) => {
         this.currentSearchType = 'course';
-        if (e.target.value.length >= 5) {
+        if (e.target.value.length >= MIN_SEARCH_LENGTH) {
           this.handleSearch(e.target.value, 'course');
         }
       });
@@ -73,20 +78,32 @@ class AcademicSearchManager {
     });
   }
 
-  async loadUniversities() {
+  async fetchUniversities(searchTerm, limit = 8) {
+    const params = new URLSearchParams({ q: searchTerm, limit });
+    const response = await fetch(`/api/universidades/?${params.toString()}`);
+    if (!response.ok) throw new Error('Erro na resposta da API');
+
+    const data = await response.json();
+    return data.universidades || [];
+  }
+
+  // Looks up the user's current university so its courses rank first in the course search
+  async loadCurrentUniversity() {
+    const input = document.getElementById('instituicao');
+    if (!input || !input.value || input.value === 'Não informado') return;
+
     try {
-      const response = await fetch('http://localhost:3000/universidades');
-      if (!response.ok) throw new Error('Erro na resposta da API');
-      
-      this.universities = await response.json();
-      console.log('✅ Universities loaded:', this.universities.length);
+      const [university] = await this.fetchUniversities(input.value, 1);
+      if (university && university.nome === input.value) {
+        this.selectedUniversity = university;
+      }
     } catch (error) {
-      console.error('❌ Error loading universities:', error);
+      console.error('❌ Error loading current university:', error);
     }
   }
 
   handleSearch(searchTerm, searchType) {
-    if (searchTerm.length < 5) {
+    if (searchTerm.length < MIN_SEARCH_LENGTH) {
       this.hideDropdown(searchType === 'university' ? 'universidadeDropdown' : 'cursoDropdown');
       return;
     }
@@ -106,31 +123,34 @@ class AcademicSearchManager {
     }, 300);
   }
 
-  searchUniversities(searchTerm) {
-    const filtered = this.universities.filter(uni => 
-      uni.nome.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      uni.cidade.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      uni.estado.toLowerCase().includes(searchTerm.toLowerCase())
-    );
+  async searchUniversities(searchTerm) {
+    try {
+      this.universities = await this.fetchUniversities(searchTerm);
+    } catch (error) {
+      console.error('❌ Error searching universities:', error);
+      this.universities = [];
+    }
 
-    this.displayUniversityResults(filtered);
+    this.displayUniversityResults(this.universities);
   }
 
-  searchCourses(searchTerm) {
-    // Extract all unique courses from universities
-    const allCourses = new Set();
-    this.universities.forEach(uni => {
-      if (uni.cursos && Array.isArray(uni.cursos)) {
-        uni.cursos.forEach(curso => {
-          if (curso.toLowerCase().includes(searchTerm.toLowerCase())) {
-            allCourses.add(curso);
-          }
-        });
-      }
-    });
+  async searchCourses(searchTerm) {
+    // Ranked on the server; courses offered by the selected university come first
+    const params = new URLSearchParams({ q: searchTerm, limit: 10 });
+    if (this.selectedUniversity) params.set('universidade', this.selectedUniversity.id);
+
+    try {
+      const response = await fetch(`/api/cursos/?${params.toString()}`);
+      if (!response.ok) throw new Error('Erro na resposta da API');
+
+      const data = await response.json();
+      this.courses = (data.cursos || []).map(curso => curso.nome);
+    } catch (error) {
+      console.error('❌ Error searching courses:', error);
+      this.courses = [];
+    }
 
-    const filteredCourses = Array.from(allCourses).slice(0, 10); // Limit to 10 results
-    this.displayCourseResults(filteredCourses);
+    this.displayCourseResults(this.courses);
   }
 
   displayUniversityResults(universities) {
@@ -185,6 +205,7 @@ class AcademicSearchManager {
     if (input) {
       input.value = university.nome;
     }
+    this.selectedUniversity = university;
     this.hideDropdown('universidadeDropdown');
   }
 
@@ -274,14 +295,14 @@ class AcademicSearchManager {
 
 // Legacy function for backward compatibility
 function buscarUniversidades(termo) {
-  if (termo.length < 5) return;
-  fetch(`http://localhost:3000/universidades?nome=${encodeURIComponent(termo)}`)
+  if (termo.length < MIN_SEARCH_LENGTH) return;
+  fetch(`/api/universidades/?q=${encodeURIComponent(termo)}`)
   .then(res => {
     if (!res.ok) throw new Error("Erro na resposta");
     return res.json();
   })
   .then(data => {
-    mostrarResultados(data);
+    mostrarResultados(data.universidades);
   })
   .catch(error => {
     console.error("Erro ao carregar universidades:", error);
@@ -0,0 +1,75 @@
+// Eventos em tempo real do /api/notificacoes/stream/ (SSE). O EventSource reconecta sozinho quando o stream fecha.
+// Quando o servidor nao serve o stream (WSGI sem NOTIFICACOES_STREAM_WSGI) faz polling dos links novos pelo since
+const LiveEvents = {
+    source: null,
+    polling: null,
+    // links que o proprio usuario fechou com o swipe (ja viu o "Linked!"), o polling nao avisa de novo
+    ownLinks: new Set(),
+
+    connect() {
+        if (this.source || this.polling) return;
+
+        const config = window.APP_CONFIG || {};
+        if (config.notificacoesStream === false || !window.EventSource) {
+            this.startPolling(config.intervaloPollingMs || 30000);
+            return;
+        }
+
+        this.source = new EventSource('/api/notificacoes/stream/');
+
+        this.source.addEventListener('link', (event) => {
+            const data = JSON.parse(event.data);
+            // quem fez o swipe que fechou o link ja viu o "Linked!" da resposta
+            if (!data.voce_iniciou) {
+                NotificationSystem.show(`${data.usuario.name} deu link com você! Podem conversar agora!`, 'success', 5000);
+            }
+        });
+
+        this.source.addEventListener('superlike', (event) => {
+            const data = JSON.parse(event.data);
+            NotificationSystem.show(`${data.usuario.name} te mandou um superlike: "${data.mensagem}"`, 'info', 6000);
+        });
+
+        this.source.addEventListener('grupo', (event) => {
+            const data = JSON.parse(event.data);
+            const acao = data.acao === 'entrou' ? 'entrou no' : 'saiu do';
+            NotificationSystem.show(`${data.usuario ? data.usuario.name : 'Alguém'} ${acao} grupo ${data.grupo.name}`, 'info');
+        });
+    },
+
+    // sem stream so da pra saber dos links (superlike e grupo nao tem API de "desde"). A primeira busca so marca o link
+    // mais novo, as seguintes pedem o que veio depois dele
+    startPolling(intervalMs) {
+        let since = null;
+        let primeira = true;
+
+        const poll = async () => {
+            if (document.visibilityState === 'hidden') return;
+            try {
+                const params = new URLSearchParams({ limit: 50 });
+                if (since) params.set('since', since);
+                const response = await fetch(`/api/linkeds/?${params.toString()}`, { cache: 'no-cache' });
+                const data = await response.json();
+                if (data.status !== 'success') return;
+
+                const novos = primeira ? [] : data.linkeds;
+                primeira = false;
+                if (data.linkeds.length > 0) since = data.linkeds[0].data_link;
+                novos
+                    .filter(link => !this.ownLinks.has(String(link.id)))
+                    .forEach(link => NotificationSystem.show(`${link.name} deu link com você! Podem conversar agora!`, 'success', 5000));
+            } catch (error) {
+                console.error('Erro ao buscar links novos:', error);
+            }
+        };
+
+        poll();
+        this.polling = setInterval(poll, intervalMs);
+    },
+
+    markOwnLink(userId) {
+        this.ownLinks.add(String(userId));
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => LiveEvents.connect());
@@ -1,3 +1,74 @@
+// Fila de swipes que nao conseguiram ser enviados (sem rede), mandados depois de uma vez pelo /api/swipes/batch/
+const PendingSwipes = {
+    storageKey: 'unicrossed:swipesPendentes',
+    flushing: false,
+
+    load() {
+        try {
+            return JSON.parse(localStorage.getItem(this.storageKey)) || [];
+        } catch (error) {
+            return [];
+        }
+    },
+
+    save(items) {
+        localStorage.setItem(this.storageKey, JSON.stringify(items));
+    },
+
+    add(action) {
+        const items = this.load();
+        items.push(action);
+        this.save(items);
+    },
+
+    // Envia tudo que ficou pendente, na ordem em que os swipes foram feitos, em lotes de ate batchSize
+    // (o maximo que o /api/swipes/batch/ aceita, swipes.TAMANHO_MAXIMO_LOTE)
+    batchSize: 100,
+
+    async flush() {
+        if (this.flushing || !navigator.onLine) return;
+
+        this.flushing = true;
+        let links = 0;
+        try {
+            let items = this.load();
+            while (items.length > 0) {
+                const batch = items.slice(0, this.batchSize);
+                const response = await fetch('/api/swipes/batch/', {
+                    method: 'POST',
+                    headers: {
+                        'X-CSRFToken': window.APP_CONFIG.csrfToken,
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify({ acoes: batch })
+                });
+
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+
+                const result = await response.json();
+                const matched = (result.resultados || []).filter(item => item.matched);
+                matched.forEach(item => LiveEvents.markOwnLink(item.user_id));
+                links += matched.length;
+                // tira da fila so o lote enviado (pode ter entrado swipe novo enquanto a requisicao rodava)
+                items = this.load().slice(batch.length);
+                this.save(items);
+            }
+        } catch (error) {
+            console.error('Erro ao enviar swipes pendentes:', error);
+        } finally {
+            this.flushing = false;
+            if (links > 0) {
+                NotificationSystem.show(`${links} novo(s) link(s)! Podem conversar agora!`, 'success');
+            }
+        }
+    }
+};
+
+window.addEventListener('online', () => PendingSwipes.flush());
+document.addEventListener('DOMContentLoaded', () => PendingSwipes.flush());
+
 const InteractionManager = {
 
     // Validacao comum para todas as interacoes
@@ -34,13 +105,14 @@ const InteractionManager = {
         }
 
         try {
-            const response = await fetch(`${type}/${AppState.currentProfileId}/`, {
+            // endpoint unico de swipe, o tipo da acao vai no corpo
+            const response = await fetch('/api/swipe/', {
                 method: 'POST',
                 headers: {
                     'X-CSRFToken': window.APP_CONFIG.csrfToken,
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(data)
+                body: JSON.stringify({ tipo: type, user_id: AppState.currentProfileId, ...data })
             });
 
             if (!response.ok) {
@@ -53,6 +125,15 @@ const InteractionManager = {
 
         } catch (error) {
             console.error(`Erro no ${type}:`, error);
+
+            // sem rede: guarda o swipe pra mandar depois e segue pro proximo perfil
+            if (error instanceof TypeError || !navigator.onLine) {
+                PendingSwipes.add({ tipo: type, user_id: AppState.currentProfileId, ...data });
+                NotificationSystem.show('Sem conexão. Sua interação será enviada assim que a rede voltar.', 'warning');
+                setTimeout(() => ProfileManager.fetchNext(), 800);
+                return true;
+            }
+
             NotificationSystem.show('Algo deu errado. Tente novamente.', 'error');
             ButtonManager.enable();
             return false;
@@ -72,6 +153,7 @@ const InteractionManager = {
         if (data.status === 'success') {
             const message = data.matched ? 'Linked! Podem conversar agora!' : messages[type];
             const msgType = data.matched ? 'success' : 'info';
+            if (data.matched) LiveEvents.markOwnLink(AppState.currentProfileId);
 
             NotificationSystem.show(message, msgType);
 
@@ -1,3 +1,81 @@
+// Buffer circular com os proximos perfis do feed, assim o swipe nao espera a rede
+const ProfileBuffer = {
+    capacity: 10,
+    refillThreshold: 3,
+    items: new Array(10),
+    head: 0,
+    size: 0,
+    cursor: null,      // id do ultimo perfil que ja veio do servidor
+    exhausted: false,  // servidor avisou que nao tem mais perfis
+    pending: null,     // promise da requisicao em andamento
+
+    push(perfil) {
+        if (this.size === this.capacity) return false;
+        this.items[(this.head + this.size) % this.capacity] = perfil;
+        this.size++;
+        return true;
+    },
+
+    shift() {
+        if (this.size === 0) return null;
+        const perfil = this.items[this.head];
+        this.items[this.head] = undefined;
+        this.head = (this.head + 1) % this.capacity;
+        this.size--;
+        return perfil;
+    },
+
+    clear() {
+        this.items = new Array(this.capacity);
+        this.head = 0;
+        this.size = 0;
+    },
+
+    // Busca uma pagina no /api/feed/ (so uma requisicao por vez)
+    refill() {
+        if (this.pending || this.exhausted) return this.pending;
+
+        const count = this.capacity - this.size;
+        if (count <= 0) return null;
+
+        const params = new URLSearchParams({ count });
+        const after = this.cursor || AppState.currentProfileId;
+        if (after) params.set('after', after);
+
+        this.pending = fetch(`/api/feed/?${params}`, {
+            method: 'GET',
+            headers: {
+                'X-CSRFToken': window.APP_CONFIG.csrfToken
+            }
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (data.status === 'no_more_profiles') {
+                    this.exhausted = true;
+                    return;
+                }
+                if (data.reset) {
+                    // a fila do servidor mudou: o que ta no buffer pode ja ter saido dela, recomeca com essa pagina
+                    this.clear();
+                }
+                (data.perfis || [])
+                    .filter(perfil => String(perfil.id) !== String(AppState.currentProfileId))
+                    .forEach(perfil => this.push(perfil));
+                this.cursor = data.cursor || this.cursor;
+            })
+            .finally(() => {
+                this.pending = null;
+            });
+
+        return this.pending;
+    }
+};
+
 const ProfileManager = {
 
     // Atualiza perfil na tela (função mais limpa)
@@ -26,6 +104,18 @@ const ProfileManager = {
             console.error('Bio element não encontrado!');
         }
 
+        // Foto de perfil (se nao tiver, mantem a padrao)
+        if (elements.avatarEl) {
+            elements.avatarEl.src = perfil.foto || elements.avatarEl.dataset.default || elements.avatarEl.src;
+            // miniaturas: o navegador escolhe pelo tamanho do avatar na tela
+            if (perfil.foto_srcset) {
+                elements.avatarEl.srcset = perfil.foto_srcset;
+                elements.avatarEl.sizes = '12vh';
+            } else {
+                elements.avatarEl.removeAttribute('srcset');
+            }
+        }
+
         // Habilidades
         this.updateSkills(perfil.habilidades);
 
@@ -69,7 +159,7 @@ const ProfileManager = {
         }
     },
 
-    // Busca próximo perfil (async/await limpo)
+    // Busca próximo perfil: usa o buffer e so espera a rede se ele estiver vazio
     async fetchNext() {
         if (AppState.isLoading) {
             console.log('Já está carregando...');
@@ -79,31 +169,28 @@ const ProfileManager = {
         AppState.isLoading = true;
 
         try {
-            const response = await fetch('/pegar-proximo-perfil/', {
-                method: 'GET',
-                headers: {
-                    'X-CSRFToken': window.APP_CONFIG.csrfToken
-                }
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}`);
+            if (ProfileBuffer.size === 0 && !ProfileBuffer.exhausted) {
+                await ProfileBuffer.refill();
             }
 
-            const data = await response.json();
+            const perfil = ProfileBuffer.shift();
+
+            // ja pede a proxima pagina em segundo plano quando o buffer esta acabando
+            if (ProfileBuffer.size <= ProfileBuffer.refillThreshold) {
+                const refill = ProfileBuffer.refill();
+                if (refill) refill.catch(error => console.error('Erro ao pré-carregar perfis:', error));
+            }
 
-            if (data.status === 'success' && data.perfil) {
-                this.update(data.perfil);
+            if (perfil) {
+                this.update(perfil);
                 ButtonManager.enable();
                 NotificationSystem.show('Novo perfil carregado!', 'success', 1500);
                 return true;
             }
 
-            if (data.status === 'no_more_profiles') {
-                NotificationSystem.show('Não há mais perfis para mostrar!', 'info');
-                this.handleNoMoreProfiles();
-                return false;
-            }
+            NotificationSystem.show('Não há mais perfis para mostrar!', 'info');
+            this.handleNoMoreProfiles();
+            return false;
 
         } catch (error) {
             console.error('Erro ao carregar próximo perfil:', error);
@@ -17,6 +17,7 @@ const AppState = {
         locationEl: null,
         bioEl: null,
         tagsContainer: null,
+        avatarEl: null,
         buttons: {
             like: null,
             superlike: null,
@@ -30,6 +31,10 @@ const AppState = {
         this.elements.locationEl = document.querySelector('.userCardLocation');
         this.elements.bioEl = document.querySelector('.userCardBio p');
         this.elements.tagsContainer = document.querySelector('.userCardTags');
+        this.elements.avatarEl = document.querySelector('.userCardAvatar img');
+        if (this.elements.avatarEl) {
+            this.elements.avatarEl.dataset.default = this.elements.avatarEl.src;
+        }
 
         console.log('Username element:', this.elements.usernameEl);
         console.log('Location element:', this.elements.locationEl);
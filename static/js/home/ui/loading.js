@@ -114,6 +114,12 @@ document.addEventListener('DOMContentLoaded', function () {
     }
     // ProfileManager.initializeCurrentProfile();
 
+    // Ja pre-carrega os proximos perfis, assim o primeiro swipe nao espera a rede
+    if (AppState.currentProfileId) {
+        const refill = ProfileBuffer.refill();
+        if (refill) refill.catch(error => console.error('Erro ao pré-carregar perfis:', error));
+    }
+
     // Adiciona listeners de teclado (funcionalidade extra)
     document.addEventListener('keydown', function (event) {
         if (AppState.isLoading) return;
@@ -8,24 +8,97 @@ let studyGroups = [];
 let groupsData = {};
 
 // API Functions
+// Fetches one page of /api/linkeds/ (cache: 'no-cache' makes the browser revalidate with If-None-Match)
+async function fetchLinkedPage(params) {
+  const response = await fetch(`/api/linkeds/?${params.toString()}`, { cache: 'no-cache' });
+  const data = await response.json();
+
+  if (data.status !== 'success') {
+    throw new Error(data.message);
+  }
+  return data;
+}
+
+// Links are loaded one page at a time: the first page on load, the next ones when the list is scrolled to the end
+const LINKEDS_PAGE_SIZE = 30;
+let linkedsNextCursor = null;
+let loadingMoreLinkeds = false;
+
+// Walks every page following next_cursor, only used with `since` (links created after the newest we have, usually few)
+async function fetchAllLinkedPages(since) {
+  const linkeds = [];
+  let cursor = null;
+
+  do {
+    const params = new URLSearchParams({ limit: 200, since });
+    if (cursor) params.set('cursor', cursor);
+
+    const data = await fetchLinkedPage(params);
+    linkeds.push(...data.linkeds);
+    cursor = data.next_cursor;
+  } while (cursor);
+
+  return linkeds;
+}
+
 async function fetchLinkedUsers() {
   try {
-    const response = await fetch('/api/linkeds/');
-    const data = await response.json();
-    
-    if (data.status === 'success') {
-      linkedMatches = data.linkeds;
-      return data.linkeds;
+    if (linkedMatches.length > 0) {
+      // If we already have links loaded, only ask for the ones created after the newest we have
+      const linkeds = await fetchAllLinkedPages(linkedMatches[0].data_link);
+      linkedMatches = [...linkeds, ...linkedMatches];
     } else {
-      console.error('Error fetching linked users:', data.message);
-      return [];
+      const data = await fetchLinkedPage(new URLSearchParams({ limit: LINKEDS_PAGE_SIZE }));
+      linkedMatches = data.linkeds;
+      linkedsNextCursor = data.next_cursor;
     }
+    return linkedMatches;
   } catch (error) {
     console.error('Error fetching linked users:', error);
     return [];
   }
 }
 
+// Next page of older links (keyset cursor from the previous page)
+async function fetchMoreLinkedUsers() {
+  if (!linkedsNextCursor || loadingMoreLinkeds) return false;
+
+  loadingMoreLinkeds = true;
+  try {
+    const data = await fetchLinkedPage(new URLSearchParams({ limit: LINKEDS_PAGE_SIZE, cursor: linkedsNextCursor }));
+    linkedMatches = [...linkedMatches, ...data.linkeds];
+    linkedsNextCursor = data.next_cursor;
+    return true;
+  } catch (error) {
+    console.error('Error fetching more linked users:', error);
+    return false;
+  } finally {
+    loadingMoreLinkeds = false;
+  }
+}
+
+// Loads the next page when the sentinel at the end of .linked-list becomes visible
+function setupLinkedsInfiniteScroll() {
+  const linkedList = document.querySelector('.linked-list');
+  if (!linkedList || !window.IntersectionObserver) return;
+
+  const sentinel = document.createElement('div');
+  sentinel.className = 'linked-list-sentinel';
+  linkedList.appendChild(sentinel);
+
+  const observer = new IntersectionObserver(async entries => {
+    if (!entries.some(entry => entry.isIntersecting)) return;
+    if (await fetchMoreLinkedUsers()) {
+      renderLinkedUsers();
+      searchSystem.cacheElements();
+      // observing again checks right away if the sentinel is still visible (page shorter than the list)
+      observer.unobserve(sentinel);
+      observer.observe(sentinel);
+    }
+  }, { root: linkedList, rootMargin: '200px' });
+  observer.observe(sentinel);
+}
+
 async function fetchStudyGroups() {
   try {
     const response = await fetch('/api/grupos-estudo/');
@@ -142,6 +215,52 @@ function createMultiLinkedCard(group) {
   return card;
 }
 
+// Live updates from /api/notificacoes/stream/ (SSE) instead of refetching the lists: a new link only pulls the links
+// newer than the newest we have (since), a group event reloads the groups
+function connectLiveEvents() {
+  const config = window.APP_CONFIG || {};
+  // the server only keeps the stream open under ASGI (or with NOTIFICACOES_STREAM_WSGI), otherwise poll the same APIs
+  if (config.notificacoesStream === false || !window.EventSource) {
+    pollLiveEvents(config.intervaloPollingMs || 30000);
+    return;
+  }
+
+  const source = new EventSource('/api/notificacoes/stream/');
+  let connectedBefore = false;
+
+  source.addEventListener('open', () => {
+    // after a reconnect, catch up on anything sent while the stream was down
+    if (connectedBefore) refreshLinkeds();
+    connectedBefore = true;
+  });
+
+  source.addEventListener('link', () => refreshLinkeds());
+
+  source.addEventListener('grupo', async () => {
+    await fetchStudyGroups();
+    renderStudyGroups();
+    searchSystem.cacheElements();
+  });
+}
+
+// Fallback without the stream: every few seconds ask for the links newer than the newest we have (since, usually an
+// empty page) and reload the groups. Skipped while the tab is hidden
+function pollLiveEvents(intervalMs) {
+  setInterval(async () => {
+    if (document.visibilityState === 'hidden') return;
+    await refreshLinkeds();
+    await fetchStudyGroups();
+    renderStudyGroups();
+    searchSystem.cacheElements();
+  }, intervalMs);
+}
+
+async function refreshLinkeds() {
+  await fetchLinkedUsers();
+  renderLinkedUsers();
+  searchSystem.cacheElements();
+}
+
 // Load and display data from backend
 async function loadData() {
   try {
@@ -201,6 +320,10 @@ function renderLinkedUsers() {
       linkedList.appendChild(article);
     });
   }
+
+  // the infinite scroll sentinel always stays after the last item
+  const sentinel = linkedList.querySelector('.linked-list-sentinel');
+  if (sentinel) linkedList.appendChild(sentinel);
 }
 
 // Render study groups from API data
@@ -930,6 +1053,8 @@ window.onload = async () => {
     // Hide loading and animate items once data is loaded
     animationManager.hideLoading();
     animationManager.animateItemsIn();
+    connectLiveEvents();
+    setupLinkedsInfiniteScroll();
     
     console.log('🚀 Linkeds inicializaram corretamente!');
     console.log('📊 Dados carregados:', { linkedCount: linkedMatches.length, groupsCount: studyGroups.length });
@@ -0,0 +1,35 @@
+// Heartbeat de presenca (/api/presenca/): enquanto a pagina ta aberta o usuario aparece online pros membros dos grupos.
+// Com a aba escondida manda ativo=false (aparece ausente). Parou de mandar, o servidor expira sozinho
+const Presence = {
+    intervalMs: 60000,
+
+    csrfToken() {
+        if (window.APP_CONFIG && window.APP_CONFIG.csrfToken) return window.APP_CONFIG.csrfToken;
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    },
+
+    async beat() {
+        try {
+            await fetch('/api/presenca/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': this.csrfToken(),
+                },
+                body: JSON.stringify({ ativo: document.visibilityState === 'visible' }),
+            });
+        } catch (error) {
+            // sem rede: o proximo heartbeat tenta de novo
+        }
+    },
+
+    start() {
+        this.beat();
+        setInterval(() => this.beat(), this.intervalMs);
+        // troca de aba atualiza na hora (online <-> ausente)
+        document.addEventListener('visibilitychange', () => this.beat());
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => Presence.start());